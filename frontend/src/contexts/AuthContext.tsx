@@ -1,5 +1,5 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
-import axios from 'axios';
+import axios, { AxiosError, InternalAxiosRequestConfig } from 'axios';
 
 interface User {
   id: number;
@@ -13,6 +13,8 @@ interface AuthContextType {
   login: (email: string, password: string) => Promise<void>;
   register: (email: string, password: string, fullName: string) => Promise<void>;
   logout: () => void;
+  // For requests made without axios; pass the access token that was refused
+  refreshAccessToken: (expiredToken: string | null) => Promise<string>;
   isLoading: boolean;
 }
 
@@ -20,6 +22,20 @@ const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
 const AUTH_API_URL = process.env.REACT_APP_AUTH_API_URL || 'http://localhost:8000';
 
+// Requests answered 401 are retried once with a renewed access token, except these
+const NO_REFRESH_PATHS = ['/api/auth/login', '/api/auth/refresh', '/api/auth/logout'];
+
+// Refresh tokens are single use and every tab shares the one in localStorage:
+// concurrent 401s must share one refresh, since presenting the same refresh
+// token twice signs the user out everywhere
+const REFRESH_LOCK = 'auth-refresh';
+let refreshing: Promise<string> | null = null;
+
+function withRefreshLock<T>(task: () => Promise<T>): Promise<T> {
+  // A Web Lock serializes refreshes across tabs; without one, only this tab's are
+  return navigator.locks ? navigator.locks.request(REFRESH_LOCK, task) : task();
+}
+
 export function AuthProvider({ children }: { children: React.ReactNode }) {
   const [user, setUser] = useState<User | null>(null);
   const [token, setToken] = useState<string | null>(null);
@@ -37,6 +53,78 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
     setIsLoading(false);
   }, []);
 
+  const clearSession = () => {
+    setUser(null);
+    setToken(null);
+    localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
+    localStorage.removeItem('user');
+  };
+
+  const saveTokens = (accessToken: string, refreshToken: string) => {
+    setToken(accessToken);
+    localStorage.setItem('token', accessToken);
+    localStorage.setItem('refresh_token', refreshToken);
+  };
+
+  // Renews the access token. Concurrent callers share one refresh, and the Web
+  // Lock extends that to other tabs; a refresh that fails signs the user out
+  const refreshAccessToken = (expiredToken: string | null): Promise<string> => {
+    if (!refreshing) {
+      refreshing = withRefreshLock(async () => {
+        const refreshToken = localStorage.getItem('refresh_token');
+        const stored = localStorage.getItem('token');
+        if (!refreshToken) {
+          throw new Error('Signed out');
+        }
+        // Another tab may have refreshed while this one waited for the lock
+        if (stored && stored !== expiredToken) {
+          setToken(stored);
+          return stored;
+        }
+        const response = await axios.post(`${AUTH_API_URL}/api/auth/refresh`, { refresh_token: refreshToken });
+        saveTokens(response.data.access_token, response.data.refresh_token);
+        return response.data.access_token as string;
+      })
+        .catch((error) => {
+          // Expired or revoked: the user has to log in again
+          clearSession();
+          throw error;
+        })
+        .finally(() => {
+          refreshing = null;
+        });
+    }
+    return refreshing;
+  };
+
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(undefined, async (error: AxiosError) => {
+      const original = error.config as (InternalAxiosRequestConfig & { _retried?: boolean }) | undefined;
+      if (
+        error.response?.status !== 401 ||
+        !original ||
+        original._retried ||
+        !localStorage.getItem('refresh_token') ||
+        NO_REFRESH_PATHS.some((path) => original.url?.endsWith(path))
+      ) {
+        throw error;
+      }
+      original._retried = true;
+
+      const expiredToken = String(original.headers.Authorization ?? '').replace(/^Bearer /, '');
+      let accessToken: string;
+      try {
+        accessToken = await refreshAccessToken(expiredToken);
+      } catch {
+        throw error;
+      }
+      original.headers.Authorization = `Bearer ${accessToken}`;
+      return axios(original);
+    });
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   const login = async (email: string, password: string) => {
     try {
       const response = await axios.post(`${AUTH_API_URL}/api/auth/login`, {
@@ -44,9 +132,8 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
         password,
       });
 
-      const { access_token } = response.data;
-      setToken(access_token);
-      localStorage.setItem('token', access_token);
+      const { access_token, refresh_token } = response.data;
+      saveTokens(access_token, refresh_token);
 
       // Fetch user details
       const userResponse = await axios.get(`${AUTH_API_URL}/api/auth/me`, {
@@ -77,10 +164,18 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
   };
 
   const logout = () => {
-    setUser(null);
-    setToken(null);
-    localStorage.removeItem('token');
-    localStorage.removeItem('user');
+    // Revoke both tokens server side; the local session ends either way
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (token) {
+      axios
+        .post(
+          `${AUTH_API_URL}/api/auth/logout`,
+          refreshToken ? { refresh_token: refreshToken } : undefined,
+          { headers: { Authorization: `Bearer ${token}` } }
+        )
+        .catch((error) => console.error('Logout failed:', error));
+    }
+    clearSession();
   };
 
   const value = {
@@ -89,6 +184,7 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
     login,
     register,
     logout,
+    refreshAccessToken,
     isLoading,
   };
 
@@ -10,36 +10,100 @@ import {
   Alert,
 } from '@mui/material';
 import { Send as SendIcon } from '@mui/icons-material';
-import axios from 'axios';
 import { useAuth } from '../contexts/AuthContext';
 import { Line } from 'react-chartjs-2';
 
-interface ChatResponse {
-  answer: string;
-  data: {
-    stats?: {
-      avg_energy_watts: number;
-      max_energy_watts: number;
-      min_energy_watts: number;
-      total_energy_watt_hours: number;
-    };
-    telemetry?: Array<{
+interface ChatData {
+  error?: string;
+  stats?: {
+    avg_energy_watts: number;
+    max_energy_watts: number;
+    min_energy_watts: number;
+    total_energy_watt_hours: number;
+  };
+  // Downsampled to a bounded number of points over the whole window
+  series?: {
+    resolution: string;
+    points: Array<{
       timestamp: string;
       energy_watts: number;
+      min_energy_watts: number;
+      max_energy_watts: number;
     }>;
   };
+  // Comparisons, rankings and totals: one entry per device, in answer order
+  device_stats?: Array<{
+    device_id: number;
+    device_name?: string;
+    avg_energy_watts: number;
+    total_energy_watt_hours: number;
+  }>;
+  total_energy_watt_hours?: number;
+  // Only present when the query asked for raw readings
+  telemetry?: Array<{
+    timestamp: string;
+    energy_watts: number;
+  }>;
+}
+
+interface ChatResponse {
+  answer: string;
+  data: ChatData;
   device_id?: number;
   time_period?: string;
 }
 
 const CHAT_API_URL = process.env.REACT_APP_CHAT_API_URL || 'http://localhost:8002';
 
+// Calls onEvent for each Server-Sent Event in the response body as it arrives
+const readEventStream = async (
+  response: Response,
+  onEvent: (event: string, payload: any) => void
+) => {
+  const reader = response.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 const Chat: React.FC = () => {
   const [query, setQuery] = useState('');
   const [response, setResponse] = useState<ChatResponse | null>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState('');
-  const { token } = useAuth();
+  const { token, refreshAccessToken } = useAuth();
+
+  const postQuery = (accessToken: string | null) =>
+    fetch(`${CHAT_API_URL}/api/chat/query/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Authorization: `Bearer ${accessToken}`,
+      },
+      body: JSON.stringify({
+        text: query,
+        auth_token: accessToken,
+      }),
+    });
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -47,39 +111,69 @@ const Chat: React.FC = () => {
 
     setIsLoading(true);
     setError('');
+    setResponse(null);
 
     try {
-      const response = await axios.post(
-        `${CHAT_API_URL}/api/chat/query`,
-        {
-          text: query,
-          auth_token: token,
-        },
-        {
-          headers: { Authorization: `Bearer ${token}` },
+      let response = await postQuery(token);
+      if (response.status === 401) {
+        // fetch bypasses the axios interceptor: renew the same way, then retry once
+        const renewed = await refreshAccessToken(token).catch(() => null);
+        if (renewed) {
+          response = await postQuery(renewed);
         }
-      );
+      }
+
+      if (!response.ok) {
+        const body = await response.json().catch(() => null);
+        throw new Error(body?.detail || 'Failed to get response');
+      }
+
+      // Show each part as soon as it arrives: intent, then stats, then the answer as it is written
+      await readEventStream(response, (event, payload) => {
+        switch (event) {
+          case 'intent':
+            setResponse({
+              answer: '',
+              data: {},
+              device_id: payload.device_id,
+              time_period: payload.time_period,
+            });
+            break;
+          case 'stats':
+            setResponse((current) => current && { ...current, data: payload });
+            break;
+          case 'token':
+            setResponse((current) => current && { ...current, answer: current.answer + payload.text });
+            break;
+          case 'done':
+            setResponse((current) => current && { ...current, answer: payload.answer });
+            break;
+          case 'error':
+            throw new Error(payload.detail);
+        }
+      });
 
-      setResponse(response.data);
       setQuery('');
     } catch (err: any) {
-      setError(err.response?.data?.detail || 'Failed to get response');
+      setError(err.message || 'Failed to get response');
     } finally {
       setIsLoading(false);
     }
   };
 
+  const getChartPoints = (): Array<{ timestamp: string; energy_watts: number }> | undefined =>
+    response?.data?.series?.points ?? response?.data?.telemetry;
+
   const getChartData = () => {
-    if (!response?.data?.telemetry) return null;
+    const points = getChartPoints();
+    if (!points) return null;
 
     return {
-      labels: response.data.telemetry.map((d) =>
-        new Date(d.timestamp).toLocaleTimeString()
-      ),
+      labels: points.map((d) => new Date(d.timestamp).toLocaleString()),
       datasets: [
         {
           label: 'Energy Usage (Watts)',
-          data: response.data.telemetry.map((d) => d.energy_watts),
+          data: points.map((d) => d.energy_watts),
           borderColor: 'rgb(75, 192, 192)',
           tension: 0.1,
         },
@@ -130,7 +224,7 @@ const Chat: React.FC = () => {
         </Alert>
       )}
 
-      {isLoading && (
+      {isLoading && !response?.answer && (
         <Box display="flex" justifyContent="center" my={4}>
           <CircularProgress />
         </Box>
@@ -176,7 +270,30 @@ const Chat: React.FC = () => {
             </Box>
           )}
 
-          {response.data.telemetry && (
+          {response.data.device_stats && (
+            <Box sx={{ mt: 3 }}>
+              <Typography variant="h6" gutterBottom>
+                Devices
+              </Typography>
+              {response.data.device_stats.map((device) => (
+                <Box key={device.device_id} display="flex" justifyContent="space-between">
+                  <Typography variant="body2">
+                    {device.device_name ?? `Device ${device.device_id}`}
+                  </Typography>
+                  <Typography variant="body2" color="text.secondary">
+                    {(device.total_energy_watt_hours / 1000).toFixed(2)} kWh
+                  </Typography>
+                </Box>
+              ))}
+              {response.data.total_energy_watt_hours !== undefined && (
+                <Typography variant="subtitle2" sx={{ mt: 1 }}>
+                  Total {(response.data.total_energy_watt_hours / 1000).toFixed(2)} kWh
+                </Typography>
+              )}
+            </Box>
+          )}
+
+          {getChartPoints() && (
             <Box sx={{ mt: 3, height: 300 }}>
               <Typography variant="h6" gutterBottom>
                 Energy Usage Over Time
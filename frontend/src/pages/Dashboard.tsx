@@ -50,8 +50,24 @@ interface DeviceStats {
   total_energy_watt_hours: number;
 }
 
+interface DeviceSummary {
+  device: Device;
+  stats: DeviceStats;
+  series: {
+    points: TelemetryData[];
+  };
+}
+
+interface DashboardSummary {
+  period: string;
+  devices: DeviceSummary[];
+}
+
 const TELEMETRY_API_URL = process.env.REACT_APP_TELEMETRY_API_URL || 'http://localhost:8001';
 
+// Charts are only a few hundred pixels wide; more points than this are not visible
+const CHART_MAX_POINTS = 200;
+
 const Dashboard: React.FC = () => {
   const [devices, setDevices] = useState<Device[]>([]);
   const [deviceStats, setDeviceStats] = useState<{ [key: number]: DeviceStats }>({});
@@ -63,38 +79,21 @@ const Dashboard: React.FC = () => {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        // Fetch devices
-        const devicesResponse = await axios.get(`${TELEMETRY_API_URL}/api/devices`, {
+        // Devices, stats and chart series for the whole home in one request
+        const response = await axios.get<DashboardSummary>(`${TELEMETRY_API_URL}/api/dashboard/summary`, {
           headers: { Authorization: `Bearer ${token}` },
+          params: { period: '24h', max_points: CHART_MAX_POINTS, method: 'lttb' },
         });
-        const fetchedDevices = devicesResponse.data;
-        setDevices(fetchedDevices);
-
-        // Fetch stats and telemetry for each device
-        const statsPromises = fetchedDevices.map((device: Device) =>
-          axios.get(`${TELEMETRY_API_URL}/api/telemetry/${device.id}/stats`, {
-            headers: { Authorization: `Bearer ${token}` },
-            params: { period: '24h' },
-          })
-        );
-
-        const telemetryPromises = fetchedDevices.map((device: Device) =>
-          axios.get(`${TELEMETRY_API_URL}/api/telemetry/${device.id}`, {
-            headers: { Authorization: `Bearer ${token}` },
-          })
-        );
-
-        const statsResponses = await Promise.all(statsPromises);
-        const telemetryResponses = await Promise.all(telemetryPromises);
 
         const newDeviceStats: { [key: number]: DeviceStats } = {};
         const newTelemetryData: { [key: number]: TelemetryData[] } = {};
 
-        fetchedDevices.forEach((device: Device, index: number) => {
-          newDeviceStats[device.id] = statsResponses[index].data;
-          newTelemetryData[device.id] = telemetryResponses[index].data;
+        response.data.devices.forEach((summary) => {
+          newDeviceStats[summary.device.id] = summary.stats;
+          newTelemetryData[summary.device.id] = summary.series.points;
         });
 
+        setDevices(response.data.devices.map((summary) => summary.device));
         setDeviceStats(newDeviceStats);
         setTelemetryData(newTelemetryData);
       } catch (err: any) {
@@ -107,6 +106,24 @@ const Dashboard: React.FC = () => {
     fetchData();
   }, [token]);
 
+  useEffect(() => {
+    if (!token) {
+      return;
+    }
+    // New readings are pushed as they are ingested instead of re-fetching the summary
+    const socket = new WebSocket(
+      `${TELEMETRY_API_URL.replace(/^http/, 'ws')}/api/telemetry/live?token=${encodeURIComponent(token)}`
+    );
+    socket.onmessage = (event) => {
+      const reading: TelemetryData & { device_id: number } = JSON.parse(event.data);
+      setTelemetryData((current) => ({
+        ...current,
+        [reading.device_id]: [...(current[reading.device_id] || []), reading].slice(-CHART_MAX_POINTS),
+      }));
+    };
+    return () => socket.close();
+  }, [token]);
+
   const getChartData = (deviceId: number) => {
     const data = telemetryData[deviceId] || [];
     return {
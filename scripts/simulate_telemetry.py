@@ -1,10 +1,40 @@
-import requests
+"""Generate telemetry and load test the ingest endpoints.
+
+Registers ``--users`` users (the first one is the demo user
+test@example.com), gives each ``--devices`` devices, and sends the last
+``--days`` days of readings, one per device every ``--interval`` seconds.
+Readings go one per request to ``/api/telemetry`` or, with ``--batch-size``
+above 1, in batches to ``/api/telemetry/batch`` (a batch only holds one
+user's readings).
+
+Two ways to apply load:
+
+    closed  ``--concurrency`` clients send back to back (default); measures
+            the throughput the service sustains
+    open    requests start at a constant ``--rate`` per second whether or not
+            earlier ones have finished; latency is measured from when a
+            request was due, so a stalled service shows in the percentiles
+            instead of silently lowering the rate
+
+Reports rows/sec and latency percentiles from a log-linear (HDR-style)
+histogram, which keeps about 1% precision in constant memory however many
+requests are made:
+
+    python scripts/simulate_telemetry.py                       # one day, demo user
+    python scripts/simulate_telemetry.py --users 50 --devices 10 --days 7 --batch-size 500 --concurrency 32
+    python scripts/simulate_telemetry.py --users 20 --mode open --rate 2000 --interval 10
+"""
+import argparse
+import asyncio
+import math
+import os
 import random
 import time
+from collections import Counter
 from datetime import datetime, timedelta
-import os
-import json
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
 
 # Configuration
 TELEMETRY_API_URL = os.getenv("TELEMETRY_API_URL", "http://localhost:8001")
@@ -17,7 +47,7 @@ TEST_USER = {
     "full_name": "Test User"
 }
 
-# Test devices
+# Device profiles, assigned to each user's devices in turn
 TEST_DEVICES = [
     {"name": "Refrigerator", "device_type": "Refrigerator", "base_load": 100, "variance": 20},
     {"name": "Air Conditioner", "device_type": "Air Conditioner", "base_load": 1500, "variance": 500},
@@ -26,123 +56,323 @@ TEST_DEVICES = [
     {"name": "Water Heater", "device_type": "Water Heater", "base_load": 4000, "variance": 1000},
 ]
 
-def setup_test_user() -> str:
-    """Create a test user and return the access token."""
-    try:
-        # Try to register the user
-        response = requests.post(
-            f"{AUTH_API_URL}/api/auth/register",
-            json=TEST_USER
+# Logins hash a password each; more at once only queue in the auth service
+SETUP_CONCURRENCY = 8
+PROGRESS_SECONDS = 5
+
+class LatencyHistogram:
+    """Log-linear histogram of latencies, in the style of HdrHistogram.
+
+    Values are kept in microseconds, in buckets that double in width with
+    each power of two and are split into ``SUB_BUCKETS`` equal parts, so a
+    recorded value is off by at most 1/``SUB_BUCKETS`` of itself.
+    """
+
+    SUB_BUCKETS = 128
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.count = 0
+        self.max = 0
+
+    def record(self, seconds: float) -> None:
+        value = max(1, int(seconds * 1e6))
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction: float) -> float:
+        """Latency in seconds below which ``fraction`` of the recorded values fall."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * fraction))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max) / 1e6
+        return self.max / 1e6
+
+    def _index(self, value: int) -> int:
+        if value < self.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - self.SUB_BUCKETS.bit_length()
+        return (shift + 1) * self.SUB_BUCKETS + (value >> shift) - self.SUB_BUCKETS
+
+    def _upper_bound(self, index: int) -> int:
+        if index < self.SUB_BUCKETS:
+            return index
+        shift = index // self.SUB_BUCKETS - 1
+        return ((index % self.SUB_BUCKETS + self.SUB_BUCKETS + 1) << shift) - 1
+
+class Stats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.rows = 0
+        self.errors: Counter = Counter()
+        # Open loop: requests that waited because too many were unanswered
+        self.stalled = 0
+        self.started = time.perf_counter()
+
+    def report_progress(self, total_rows: int) -> None:
+        elapsed = time.perf_counter() - self.started
+        print(
+            f"  {elapsed:6.0f}s  {self.rows}/{total_rows} rows  {self.rows / elapsed:8.0f} rows/s  "
+            f"p99 {self.latency.percentile(0.99) * 1000:7.1f}ms  errors {sum(self.errors.values())}"
         )
-    except:
-        print("Failed to register user (user might already exist)")
 
-    # Login and get token
-    try:
-        response = requests.post(
-            f"{AUTH_API_URL}/api/auth/login",
-            json={
-                "email": TEST_USER["email"],
-                "password": TEST_USER["password"]
-            }
+class SimulatedUser:
+    def __init__(self, email: str, password: str, full_name: str):
+        self.email = email
+        self.password = password
+        self.full_name = full_name
+        self.access_token: Optional[str] = None
+        self.refresh_token: Optional[str] = None
+        self.devices: List[Dict] = []
+        self._renewing = asyncio.Lock()
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    async def login(self, auth: httpx.AsyncClient) -> None:
+        # Registering an existing user fails with 400, which is fine
+        await auth.post(
+            "/api/auth/register",
+            json={"email": self.email, "password": self.password, "full_name": self.full_name}
         )
-        return response.json()["access_token"]
-    except Exception as e:
-        print(f"Failed to login: {e}")
-        raise
-
-def setup_test_devices(token: str) -> List[Dict]:
-    """Create test devices and return their IDs."""
-    devices = []
-    for device in TEST_DEVICES:
-        try:
-            response = requests.post(
-                f"{TELEMETRY_API_URL}/api/devices",
-                json={
-                    "name": device["name"],
-                    "device_type": device["device_type"]
-                },
-                headers={"Authorization": f"Bearer {token}"}
+        response = await auth.post("/api/auth/login", json={"email": self.email, "password": self.password})
+        response.raise_for_status()
+        self._set_tokens(response.json())
+
+    async def renew(self, auth: httpx.AsyncClient, expired_token: str) -> None:
+        """Replace an access token that expired during a long run."""
+        # Refresh tokens are single use, so requests failing together share one refresh
+        async with self._renewing:
+            if self.access_token != expired_token:
+                return
+            response = await auth.post("/api/auth/refresh", json={"refresh_token": self.refresh_token})
+            if response.status_code != 200:
+                await self.login(auth)
+                return
+            self._set_tokens(response.json())
+
+    async def create_devices(self, telemetry: httpx.AsyncClient, count: int) -> None:
+        for i in range(count):
+            profile = TEST_DEVICES[i % len(TEST_DEVICES)]
+            name = profile["name"] if i < len(TEST_DEVICES) else f"{profile['name']} {i // len(TEST_DEVICES) + 1}"
+            response = await telemetry.post(
+                "/api/devices",
+                json={"name": name, "device_type": profile["device_type"]},
+                headers=self.headers
             )
-            device_data = response.json()
-            devices.append({
-                **device,
-                "id": device_data["id"]
-            })
-        except Exception as e:
-            print(f"Failed to create device {device['name']}: {e}")
-    return devices
+            response.raise_for_status()
+            self.devices.append({**profile, "id": response.json()["id"]})
+
+    def _set_tokens(self, tokens: Dict) -> None:
+        self.access_token = tokens["access_token"]
+        self.refresh_token = tokens.get("refresh_token")
 
 def generate_telemetry(device: Dict, timestamp: datetime) -> float:
     """Generate realistic energy consumption data for a device."""
     # Base load with random variance
     energy = device["base_load"] + random.uniform(-device["variance"], device["variance"])
-    
+
     # Add time-based patterns
     hour = timestamp.hour
-    
+
     # Night-time reduction for most devices
     if hour >= 23 or hour <= 5:
         energy *= 0.5
-    
+
     # Peak hours for AC
     if device["device_type"] == "Air Conditioner" and (hour >= 12 and hour <= 18):
         energy *= 1.5
-    
+
     # Washing machine and dishwasher typically used at specific times
     if device["device_type"] in ["Washing Machine", "Dishwasher"]:
         if hour in [7, 8, 19, 20]:  # Morning and evening usage
             energy *= 2
         else:
             energy *= 0.1  # Minimal standby power
-    
+
     return max(0, energy)  # Ensure non-negative values
 
-def main():
-    print("Setting up test environment...")
-    token = setup_test_user()
-    devices = setup_test_devices(token)
-    
-    print(f"Created {len(devices)} test devices")
-    
-    # Generate 24 hours of data with 1-minute intervals
-    start_time = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    print("Generating telemetry data...")
-    for minute in range(24 * 60):  # 24 hours * 60 minutes
-        timestamp = start_time + timedelta(minutes=minute)
-        
-        for device in devices:
-            try:
-                energy = generate_telemetry(device, timestamp)
-                
-                payload = {
+def generate_requests(
+    users: List[SimulatedUser],
+    start_time: datetime,
+    steps: int,
+    interval: timedelta,
+    batch_size: int
+) -> Iterator[Tuple[SimulatedUser, List[Dict]]]:
+    """Readings in time order, grouped into per-user requests of up to ``batch_size``."""
+    pending: Dict[str, List[Dict]] = {user.email: [] for user in users}
+    for step in range(steps):
+        timestamp = start_time + interval * step
+        for user in users:
+            readings = pending[user.email]
+            for device in user.devices:
+                readings.append({
                     "device_id": device["id"],
                     "timestamp": timestamp.isoformat() + "Z",
-                    "energy_watts": energy
-                }
-                
-                response = requests.post(
-                    f"{TELEMETRY_API_URL}/api/telemetry",
-                    json=payload,
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code != 200 and response.status_code != 201:
-                    print(f"Failed to send telemetry for {device['name']}: {response.text}")
-                
-            except Exception as e:
-                print(f"Error sending telemetry for {device['name']}: {e}")
-        
-        # Progress update
-        if minute % 60 == 0:
-            hour = minute // 60
-            print(f"Generated data for hour {hour}")
-        
-        # Small delay to avoid overwhelming the API
-        time.sleep(0.1)
-    
-    print("Finished generating telemetry data")
+                    "energy_watts": generate_telemetry(device, timestamp)
+                })
+                if len(readings) == batch_size:
+                    yield user, readings
+                    readings = pending[user.email] = []
+    for user in users:
+        if pending[user.email]:
+            yield user, pending[user.email]
+
+async def send(
+    telemetry: httpx.AsyncClient,
+    auth: httpx.AsyncClient,
+    user: SimulatedUser,
+    readings: List[Dict],
+    batch: bool,
+    stats: Stats,
+    due: float
+) -> None:
+    """Post one request; latency counts from ``due``, when it was meant to start."""
+    path, payload = ("/api/telemetry/batch", {"readings": readings}) if batch else ("/api/telemetry", readings[0])
+    try:
+        token = user.access_token
+        response = await telemetry.post(path, json=payload, headers=user.headers)
+        if response.status_code == 401:
+            await user.renew(auth, token)
+            response = await telemetry.post(path, json=payload, headers=user.headers)
+    except httpx.HTTPError as e:
+        stats.errors[type(e).__name__] += 1
+        return
+    stats.latency.record(time.perf_counter() - due)
+    stats.requests += 1
+    # 202 is the write-behind mode's answer
+    if response.status_code not in (200, 201, 202):
+        stats.errors[str(response.status_code)] += 1
+        return
+    rows = len(readings)
+    if batch:
+        rejected = len(response.json()["rejected"])
+        if rejected:
+            stats.errors["rejected_row"] += rejected
+        rows -= rejected
+    stats.rows += rows
+
+async def run_closed(requests, concurrency, send_request) -> None:
+    async def client():
+        # Single threaded: each next() runs to completion before another client resumes
+        for user, readings in requests:
+            await send_request(user, readings, time.perf_counter())
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+async def run_open(requests, rate, max_in_flight, send_request, stats) -> None:
+    in_flight = set()
+    started = time.perf_counter()
+    for number, (user, readings) in enumerate(requests):
+        due = started + number / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            # The service is this far behind; the wait shows in the latency of what follows
+            stats.stalled += 1
+            await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        task = asyncio.create_task(send_request(user, readings, due))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+async def report_progress(stats: Stats, total_rows: int) -> None:
+    while True:
+        await asyncio.sleep(PROGRESS_SECONDS)
+        stats.report_progress(total_rows)
+
+async def setup_users(auth: httpx.AsyncClient, telemetry: httpx.AsyncClient, args) -> List[SimulatedUser]:
+    users = [SimulatedUser(**TEST_USER)] + [
+        SimulatedUser(f"test{i}@example.com", TEST_USER["password"], f"Test User {i}")
+        for i in range(1, args.users)
+    ]
+    semaphore = asyncio.Semaphore(SETUP_CONCURRENCY)
+
+    async def setup(user):
+        async with semaphore:
+            await user.login(auth)
+            await user.create_devices(telemetry, args.devices)
+
+    await asyncio.gather(*(setup(user) for user in users))
+    return users
+
+async def run(args) -> Stats:
+    connections = args.concurrency if args.mode == "closed" else args.max_in_flight
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=args.auth_url, timeout=60) as auth, \
+            httpx.AsyncClient(base_url=args.telemetry_url, limits=limits, timeout=args.timeout) as telemetry:
+        print("Setting up test environment...")
+        users = await setup_users(auth, telemetry, args)
+        print(f"Created {args.devices} test devices for each of {len(users)} users")
+
+        interval = timedelta(seconds=args.interval)
+        steps = int(args.days * 86400 / args.interval)
+        start_time = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(days=args.days)
+        total_rows = steps * len(users) * args.devices
+        requests = generate_requests(users, start_time, steps, interval, args.batch_size)
+        batch = args.batch_size > 1
+
+        stats = Stats()
+
+        async def send_request(user, readings, due):
+            await send(telemetry, auth, user, readings, batch, stats, due)
+
+        print(f"Generating {total_rows} readings from {start_time.isoformat()}Z ({args.mode} loop)...")
+        progress = asyncio.create_task(report_progress(stats, total_rows))
+        try:
+            if args.mode == "closed":
+                await run_closed(requests, args.concurrency, send_request)
+            else:
+                await run_open(requests, args.rate, args.max_in_flight, send_request, stats)
+        finally:
+            progress.cancel()
+        return stats
+
+def print_report(stats: Stats, args) -> None:
+    elapsed = time.perf_counter() - stats.started
+    load = f"concurrency={args.concurrency}" if args.mode == "closed" else f"rate={args.rate}/s"
+    print(f"\nmode={args.mode} {load} batch_size={args.batch_size} duration={elapsed:.1f}s")
+    print(
+        f"requests={stats.requests} ({stats.requests / elapsed:.1f}/s)  "
+        f"rows={stats.rows} ({stats.rows / elapsed:.1f}/s)"
+    )
+    if stats.stalled:
+        print(f"stalled at --max-in-flight: {stats.stalled} requests")
+    if stats.errors:
+        print("errors: " + ", ".join(f"{name}={count}" for name, count in sorted(stats.errors.items())))
+    latency = stats.latency
+    print("latency: " + "  ".join(
+        f"{label} {latency.percentile(fraction) * 1000:.1f}ms"
+        for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p99.9", 0.999))
+    ) + f"  max {latency.max / 1000:.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--telemetry-url", default=TELEMETRY_API_URL)
+    parser.add_argument("--auth-url", default=AUTH_API_URL)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--devices", type=int, default=len(TEST_DEVICES), help="Devices per user")
+    parser.add_argument("--days", type=float, default=1, help="Days of readings, ending now")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between readings of a device")
+    parser.add_argument("--batch-size", type=int, default=1, help="Readings per request; above 1 uses the batch endpoint")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients sending back to back (closed loop)")
+    parser.add_argument("--rate", type=float, default=100, help="Requests started per second (open loop)")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Open-loop cap on unanswered requests")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds before a request counts as failed")
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args))
+    print_report(stats, args)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -8,9 +8,37 @@ CREATE TABLE IF NOT EXISTS users (
     full_name VARCHAR(255),
     hashed_password VARCHAR(255) NOT NULL,
     is_active BOOLEAN DEFAULT true,
+    token_version INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Added after the first release; CREATE TABLE above is skipped for existing tables
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
+
 -- Create index on email
-CREATE INDEX IF NOT EXISTS idx_users_email ON users(email); 
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+
+-- Single-use refresh tokens, stored as SHA-256 hashes
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    token_hash VARCHAR(64) UNIQUE NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);
+
+-- Revoked access tokens (token_id) and per-user version floors, published to the other services
+CREATE TABLE IF NOT EXISTS token_revocations (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    token_id VARCHAR(32),
+    min_version INTEGER,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_token_revocations_expires_at ON token_revocations(expires_at); 
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""Password hashing off the request path, in a bounded pool.
+
+A bcrypt hash or verify takes 100-300ms of CPU. Run inline, every login
+holds a request worker for that long, and a burst of logins leaves nothing
+free to serve cheap requests such as ``/api/auth/me``. ``password_hasher``
+runs them instead on ``PASSWORD_HASH_WORKERS`` dedicated threads (or
+processes, with ``PASSWORD_HASH_POOL=process``) while the request awaits.
+At most ``PASSWORD_HASH_MAX_PENDING`` operations may be queued or running;
+past that, requests fail fast with 503 rather than queueing for seconds.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from shared.metrics import Counter, Gauge, Histogram
+
+from .security import pwd_context
+
+# bcrypt releases the GIL, so threads run hashes in parallel; processes are an option
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "256"))
+
+OPERATIONS = ("hash", "verify")
+
+# Seconds; a bcrypt call at the default cost is around 0.1-0.3s
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+WAIT_SECONDS = {
+    operation: Histogram(
+        "auth_password_hash_wait_seconds",
+        "Time a password operation waited for a free hashing worker",
+        {"operation": operation},
+        buckets=(0.0005, 0.001, 0.005) + HASH_BUCKETS
+    )
+    for operation in OPERATIONS
+}
+RUN_SECONDS = {
+    operation: Histogram(
+        "auth_password_hash_seconds",
+        "Time a password operation spent hashing",
+        {"operation": operation},
+        buckets=HASH_BUCKETS
+    )
+    for operation in OPERATIONS
+}
+PENDING = Gauge("auth_password_hash_pending", "Password operations queued or running")
+REJECTED = Counter("auth_password_hash_rejected_total", "Password operations refused because the pool was full")
+REHASHED = Counter("auth_password_rehash_total", "Stored hashes upgraded to the current cost at login")
+
+def _timed(operation: str, *args: Any) -> Tuple[float, float, Any]:
+    # Runs in the worker; the monotonic clock is shared with the parent on Linux
+    started = time.monotonic()
+    if operation == "hash":
+        result = pwd_context.hash(*args)
+    else:
+        result = pwd_context.verify_and_update(*args)
+    return started, time.monotonic(), result
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        pool: str = PASSWORD_HASH_POOL
+    ):
+        if pool not in ("thread", "process"):
+            raise ValueError(f"Unknown PASSWORD_HASH_POOL {pool!r}; expected thread or process")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pool = pool
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Whether the password matches, and a new hash if the stored one uses outdated settings."""
+        return await self._run("verify", password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _run(self, operation: str, *args: Any) -> Any:
+        # Only touched from the event loop, so no lock is needed
+        if self.pending >= self.max_pending:
+            REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many logins in progress, retry later",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        PENDING.inc()
+        submitted = time.monotonic()
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _timed, operation, *args
+            )
+        finally:
+            self.pending -= 1
+            PENDING.dec()
+        WAIT_SECONDS[operation].observe(max(started - submitted, 0.0))
+        RUN_SECONDS[operation].observe(finished - started)
+        return result
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+password_hasher = PasswordHasher()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -10,5 +10,32 @@ class User(Base):
     full_name = Column(String)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
+    # Carried in tokens as "ver"; bumping it revokes the user's outstanding tokens
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # SHA-256 of the token; the token itself is only ever held by the client
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    # Naive UTC, like the access token's exp claim
+    expires_at = Column(DateTime, nullable=False)
+    # Set when the token is used (rotated) or revoked; presenting it again revokes everything
+    revoked_at = Column(DateTime)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class TokenRevocation(Base):
+    """A revoked access token (token_id) or all of a user's tokens below min_version."""
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    token_id = Column(String(32))
+    min_version = Column(Integer)
+    # Once every token it covers has expired the entry can go
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""The revocation list published to the other services.
+
+Logging out records the access token's ``jti`` in ``token_revocations``;
+revoking all of a user's tokens records a version floor. ``revocation_list``
+keeps those rows as a ``RevocationSnapshot`` (see ``shared.revocation``),
+served on ``GET /api/auth/revocations`` and checked by ``get_current_user``
+here without a database round trip.
+
+A background task looks for new rows every ``REVOCATION_REFRESH_SECONDS``
+and adds them to a copy of the filter, which is sized with room to grow.
+The snapshot is rebuilt from scratch, dropping expired rows, every
+``REVOCATION_REBUILD_SECONDS`` or once it runs out of room. Revocations made
+by this process are applied at once; other auth workers pick them up on
+their next refresh.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from shared.metrics import Histogram
+from shared.revocation import RevocationSnapshot
+
+from .database import SessionLocal
+from .models import TokenRevocation
+
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "1"))
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "300"))
+# New rows are looked for from this many ids below the last one seen, since
+# concurrent transactions can commit in a different order than they took ids
+REVOCATION_ID_OVERLAP = 1000
+# Entries a rebuilt filter has room for at least, so a short list is not rebuilt on every revocation
+MIN_CAPACITY = 1000
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = {
+    kind: Histogram(
+        "auth_revocation_snapshot_refresh_seconds",
+        "Time to bring the revocation snapshot up to date",
+        {"kind": kind}
+    )
+    for kind in ("extend", "rebuild")
+}
+
+class RevocationList:
+    def __init__(
+        self,
+        refresh_seconds: float = REVOCATION_REFRESH_SECONDS,
+        rebuild_seconds: float = REVOCATION_REBUILD_SECONDS,
+        session_factory: Callable = SessionLocal
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.session_factory = session_factory
+        self.snapshot: Optional[RevocationSnapshot] = None
+        # Row count and highest id the snapshot reflects, to spot new rows cheaply
+        self._seen = (0, 0)
+        self._capacity = 0
+        self._rebuilt_at = 0.0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, token_id: Optional[str], user_id: int, version: Optional[int]) -> bool:
+        # Nothing is refused before the first refresh
+        return self.snapshot is not None and self.snapshot.is_revoked(token_id, user_id, version)
+
+    def revoke_token(self, db: Session, token_id: str, user_id: int, expires_at: datetime) -> None:
+        """Revoke one access token until it expires on its own; the caller commits, then refreshes."""
+        db.add(TokenRevocation(user_id=user_id, token_id=token_id, expires_at=expires_at))
+
+    def revoke_below(self, db: Session, user_id: int, min_version: int, expires_at: datetime) -> None:
+        """Revoke the user's tokens older than ``min_version``; the caller commits, then refreshes."""
+        db.add(TokenRevocation(user_id=user_id, min_version=min_version, expires_at=expires_at))
+
+    def refresh(self, db: Session) -> RevocationSnapshot:
+        """Bring the snapshot up to date with the table and return it."""
+        with self._lock:
+            count, max_id = db.query(func.count(TokenRevocation.id), func.max(TokenRevocation.id)).one()
+            max_id = max_id or 0
+            due = time.monotonic() - self._rebuilt_at >= self.rebuild_seconds
+            if self.snapshot is None or due or count > self._capacity:
+                self._rebuild(db)
+            elif (count, max_id) != self._seen:
+                self._extend(db, count, max_id)
+            db.commit()
+            return self.snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self.snapshot = None
+            self._seen = (0, 0)
+            self._capacity = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _rebuild(self, db: Session) -> None:
+        started = time.perf_counter()
+        db.query(TokenRevocation).filter(
+            TokenRevocation.expires_at <= datetime.utcnow()
+        ).delete(synchronize_session=False)
+        count, max_id = db.query(func.count(TokenRevocation.id), func.max(TokenRevocation.id)).one()
+        token_ids = [
+            token_id for (token_id,) in db.query(TokenRevocation.token_id)
+            .filter(TokenRevocation.token_id.isnot(None))
+        ]
+        floors = dict(
+            db.query(TokenRevocation.user_id, func.max(TokenRevocation.min_version))
+            .filter(TokenRevocation.min_version.isnot(None))
+            .group_by(TokenRevocation.user_id)
+            .all()
+        )
+        # Room for the list to double before the next rebuild
+        self._capacity = max(2 * count, MIN_CAPACITY)
+        self.snapshot = RevocationSnapshot.build(token_ids, floors, self._capacity)
+        self._seen = (count, max_id or 0)
+        self._rebuilt_at = time.monotonic()
+        REFRESH_SECONDS["rebuild"].observe(time.perf_counter() - started)
+
+    def _extend(self, db: Session, count: int, max_id: int) -> None:
+        started = time.perf_counter()
+        rows = db.query(
+            TokenRevocation.token_id, TokenRevocation.user_id, TokenRevocation.min_version
+        ).filter(TokenRevocation.id > self._seen[1] - REVOCATION_ID_OVERLAP).all()
+        token_ids = [token_id for token_id, _, _ in rows if token_id is not None]
+        floors = {}
+        for _, user_id, min_version in rows:
+            if min_version is not None:
+                floors[user_id] = max(floors.get(user_id, min_version), min_version)
+        self.snapshot = self.snapshot.extend(token_ids, floors)
+        self._seen = (count, max_id)
+        REFRESH_SECONDS["extend"].observe(time.perf_counter() - started)
+
+    def _refresh_in_session(self) -> None:
+        db = self.session_factory()
+        try:
+            self.refresh(db)
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # The queries and hashing block, so they run off the event loop
+                await asyncio.to_thread(self._refresh_in_session)
+            except Exception:
+                logger.exception("Failed to refresh the revocation snapshot")
+            await asyncio.sleep(self.refresh_seconds)
+
+revocation_list = RevocationList()
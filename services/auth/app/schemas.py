@@ -23,6 +23,12 @@ class UserResponse(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    # Seconds until the access token expires
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None 
\ No newline at end of file
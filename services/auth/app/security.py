@@ -1,21 +1,29 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+import hashlib
 import os
+import secrets
 
 from .database import get_db
-from .models import User
+from .models import RefreshToken, User
+from .revocations import revocation_list
+from .user_cache import CachedUser, user_cache
 
 # Security configuration
 SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", "60"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Raising this upgrades existing hashes as their users next log in
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -24,6 +32,15 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def token_claims(user: Union[User, CachedUser]) -> dict:
+    """Claims that let services authorize a request without looking the user up."""
+    return {
+        "sub": user.email,
+        "user_id": user.id,
+        "full_name": user.full_name,
+        "ver": user.token_version
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -31,14 +48,42 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # jti identifies the token in the revocation list when it is logged out
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(12)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def create_refresh_token(db: Session, user_id: int) -> str:
+    """A new single-use refresh token; only its hash is stored. The caller commits."""
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+def load_user(db: Session, user_id: int) -> Optional[CachedUser]:
+    """The user as tokens are checked against, from the cache or else the database."""
+    user = user_cache.get(user_id)
+    if user is None:
+        db_user = db.query(User).filter(User.id == user_id).first()
+        if db_user is None:
+            return None
+        user = CachedUser(
+            id=db_user.id,
+            email=db_user.email,
+            full_name=db_user.full_name,
+            token_version=db_user.token_version
+        )
+        user_cache.put(user)
+    return user
+
+def authenticate(token: str, db: Session) -> Tuple[CachedUser, dict]:
+    """The user a valid, unrevoked access token belongs to, and its claims."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -47,14 +92,41 @@ async def get_current_user(
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        user_id = payload.get("user_id")
+        version = payload.get("ver")
+        # Tokens from before user claims existed carry neither; their owners log in again
+        if user_id is None or version is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    user = load_user(db, user_id)
+    # A bumped token version revokes every token issued before it
+    if user is None or user.token_version != version:
+        raise credentials_exception
+    # Logged out tokens, from the same snapshot the other services check
+    if revocation_list.is_revoked(payload.get("jti"), user_id, version):
         raise credentials_exception
     
-    return user 
\ No newline at end of file
+    return user, payload
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> CachedUser:
+    return authenticate(token, db)[0]
+
+def revoke_tokens(db: Session, user_id: int) -> None:
+    """Invalidate every token issued to the user so far, refresh tokens included."""
+    now = datetime.utcnow()
+    db.query(User).filter(User.id == user_id).update({User.token_version: User.token_version + 1})
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: now})
+    # Other services hold no user rows; they learn of the new version from the snapshot.
+    # Tokens below it are all expired once a full access token lifetime has passed.
+    version = db.query(User.token_version).filter(User.id == user_id).scalar()
+    revocation_list.revoke_below(db, user_id, version, now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    db.commit()
+    user_cache.invalidate(user_id)
+    revocation_list.refresh(db)
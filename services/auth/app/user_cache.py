@@ -0,0 +1,72 @@
+"""Short-lived cache of users behind token validation.
+
+Tokens carry ``user_id``, ``full_name`` and the user's token version
+(``ver``). A token is valid while its version matches the user's current
+``token_version``; bumping that column revokes every token issued before.
+``get_current_user`` checks the version against this cache and only reads
+the ``users`` row on a miss, so an authenticated request normally costs no
+database round trip.
+
+Entries live for ``AUTH_USER_CACHE_TTL_SECONDS``. A bump made by this
+process evicts its entry at once; other workers notice within the TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from shared.metrics import Counter
+
+USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+
+HITS = Counter("auth_user_cache_hits_total", "Token checks answered from the user cache")
+MISSES = Counter("auth_user_cache_misses_total", "Token checks that read the user from the database")
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    email: str
+    full_name: Optional[str]
+    token_version: int
+
+class UserCache:
+    def __init__(self, max_entries: int = USER_CACHE_SIZE, ttl_seconds: float = USER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, CachedUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[CachedUser]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if entry is None:
+                MISSES.inc()
+                return None
+            self._entries.move_to_end(user_id)
+        HITS.inc()
+        return entry[1]
+
+    def put(self, user: CachedUser) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache()
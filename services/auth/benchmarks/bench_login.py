@@ -0,0 +1,115 @@
+"""Logins/sec and /api/auth/me latency during a login burst.
+
+Drives a running auth service: registers ``--users`` accounts, then for
+``--duration`` seconds keeps ``--concurrency`` clients logging in back to
+back while ``--me-clients`` clients poll ``/api/auth/me`` with a valid
+token, and reports throughput and latency percentiles for both:
+
+    uvicorn main:app --port 8000
+    python -m benchmarks.bench_login --url http://localhost:8000 --concurrency 64
+
+Compare runs with different PASSWORD_HASH_WORKERS / PASSWORD_HASH_POOL
+settings on the service. Refused logins (503 when the hashing pool is
+full) are counted separately from other errors.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+PASSWORD = "bench-password"
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def register(client, email, semaphore):
+    async with semaphore:
+        response = await client.post(
+            "/api/auth/register", json={"email": email, "password": PASSWORD, "full_name": "Bench"}
+        )
+    response.raise_for_status()
+
+async def login(client, email):
+    response = await client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def run_logins(client, emails, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await login(client, random.choice(emails))
+        except httpx.HTTPStatusError as e:
+            errors["login_503" if e.response.status_code == 503 else "login"] += 1
+            continue
+        except httpx.HTTPError:
+            errors["login"] += 1
+            continue
+        latencies["login"].append((time.perf_counter() - started) * 1000)
+
+async def run_me(client, token, deadline, latencies, errors, interval):
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get("/api/auth/me", headers=headers)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            errors["me"] += 1
+            continue
+        latencies["me"].append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency + args.me_clients)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=120) as client:
+        # Setup is not part of the measurement
+        prefix = f"bench{random.randint(100000, 10000000)}"
+        emails = [f"{prefix}-{i}@example.com" for i in range(args.users)]
+        semaphore = asyncio.Semaphore(8)
+        await asyncio.gather(*(register(client, email, semaphore) for email in emails))
+        token = await login(client, emails[0])
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(run_logins(client, emails, deadline, latencies, errors) for _ in range(args.concurrency)),
+            *(run_me(client, token, deadline, latencies, errors, args.me_interval) for _ in range(args.me_clients))
+        )
+        elapsed = time.perf_counter() - started
+
+    print(
+        f"url={args.url} login_concurrency={args.concurrency} me_clients={args.me_clients} "
+        f"duration={elapsed:.1f}s"
+    )
+    print(f"{'endpoint':>8} {'requests':>9} {'errors':>7} {'503':>5} {'req/s':>7} {'p50':>9} {'p99':>9}")
+    for name in ("login", "me"):
+        samples = latencies[name]
+        refused = errors["login_503"] if name == "login" else 0
+        if not samples:
+            print(f"{name:>8} {0:>9} {errors[name]:>7} {refused:>5}")
+            continue
+        print(
+            f"{name:>8} {len(samples):>9} {errors[name]:>7} {refused:>5} {len(samples) / elapsed:>7.1f} "
+            f"{statistics.median(samples):>7.1f}ms {percentile(samples, 0.99):>7.1f}ms"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=64, help="Clients logging in back to back")
+    parser.add_argument("--me-clients", type=int, default=4)
+    parser.add_argument("--me-interval", type=float, default=0.05, help="Seconds between /me calls per client")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
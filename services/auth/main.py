@@ -1,19 +1,31 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 import os
 
 from app.database import get_db, init_db
-from app.models import User
-from app.schemas import UserCreate, UserLogin, Token, UserResponse
+from app.models import RefreshToken, User
+from app.schemas import UserCreate, UserLogin, RefreshRequest, Token, UserResponse
 from app.security import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    authenticate,
     create_access_token,
-    get_password_hash,
-    verify_password,
-    get_current_user
+    create_refresh_token,
+    get_current_user,
+    hash_refresh_token,
+    load_user,
+    oauth2_scheme,
+    revoke_tokens,
+    token_claims
 )
+from app.revocations import revocation_list
+from app.user_cache import CachedUser
+from app.hashing import REHASHED, password_hasher
+from shared.metrics import render_metrics
 
 app = FastAPI(
     title="Smart Home Auth Service",
@@ -33,6 +45,12 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    revocation_list.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await revocation_list.close()
+    password_hasher.shutdown()
 
 @app.get("/health")
 def health_check(db: Session = Depends(get_db)):
@@ -46,18 +64,22 @@ def health_check(db: Session = Depends(get_db)):
             detail=f"Service unhealthy: {str(e)}"
         )
 
-@app.post("/api/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    # Check if user exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text format: connection pool checkout wait, in use, overflow
+    return render_metrics()
+
+# The handlers below are async so they can await the password pool without holding a
+# threadpool worker; their database steps go to the threadpool instead, so waiting
+# for a pooled connection never blocks the event loop
+
+def email_registered(db: Session, email: str) -> bool:
+    registered = db.query(User.id).filter(User.email == email).first() is not None
+    # End the read so the connection is back in the pool while the password is hashed
+    db.rollback()
+    return registered
+
+def add_user(db: Session, user: UserCreate, hashed_password: str) -> UserResponse:
     db_user = User(
         email=user.email,
         hashed_password=hashed_password,
@@ -73,40 +95,148 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         full_name=db_user.full_name
     )
 
+@app.post("/api/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+    # Check if user exists
+    if await run_in_threadpool(email_registered, db, user.email):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    
+    # Create new user; hashing runs in the password pool while this request waits
+    hashed_password = await password_hasher.hash(user.password)
+    return await run_in_threadpool(add_user, db, user, hashed_password)
+
+def find_login(db: Session, email: str) -> Optional[Tuple[dict, str]]:
+    """Token claims and password hash of the user with ``email``, if any."""
+    user = db.query(User).filter(User.email == email).first()
+    found = (token_claims(user), user.hashed_password) if user else None
+    # End the read so the connection is back in the pool while the password is verified
+    db.rollback()
+    return found
+
+def complete_login(db: Session, claims: dict, new_hash: Optional[str]) -> Token:
+    # Stored with an older cost or scheme: keep the hash current while we have the password
+    if new_hash is not None:
+        db.query(User).filter(User.id == claims["user_id"]).update({User.hashed_password: new_hash})
+        db.commit()
+        REHASHED.inc()
+    return issue_tokens(db, claims)
+
 @app.post("/api/auth/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     # Verify user exists
-    user = db.query(User).filter(User.email == user_credentials.email).first()
-    if not user:
+    found = await run_in_threadpool(find_login, db, user_credentials.email)
+    if not found:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    claims, hashed_password = found
     
     # Verify password
-    if not verify_password(user_credentials.password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify_and_update(
+        user_credentials.password, hashed_password
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Generate access token
-    access_token = create_access_token(
-        data={"sub": user.email}
+    return await run_in_threadpool(complete_login, db, claims, new_hash)
+
+def issue_tokens(db: Session, claims: dict) -> Token:
+    # The claims spare other services a user lookup; the refresh token renews them
+    access_token = create_access_token(data=claims)
+    refresh_token = create_refresh_token(db, claims["user_id"])
+    db.commit()
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=refresh_token,
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60
     )
+
+@app.post("/api/auth/refresh", response_model=Token)
+def refresh_tokens(request: RefreshRequest, db: Session = Depends(get_db)):
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    now = datetime.utcnow()
+    stored = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == hash_refresh_token(request.refresh_token)
+    ).first()
+    if stored is None or stored.expires_at <= now:
+        raise invalid_token
+    if stored.revoked_at is not None:
+        # Refresh tokens are single use: a replayed one may be stolen, so sign the user out everywhere
+        revoke_tokens(db, stored.user_id)
+        raise invalid_token
     
-    return Token(access_token=access_token, token_type="bearer")
+    user = load_user(db, stored.user_id)
+    # Rotate; the condition makes sure only one of two concurrent refreshes wins
+    rotated = db.query(RefreshToken).filter(
+        RefreshToken.id == stored.id, RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: now})
+    if user is None or not rotated:
+        db.rollback()
+        raise invalid_token
+    
+    return issue_tokens(db, token_claims(user))
 
 @app.get("/api/auth/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_user)):
+def read_users_me(current_user: CachedUser = Depends(get_current_user)):
     return UserResponse(
         id=current_user.id,
         email=current_user.email,
         full_name=current_user.full_name
     )
 
+@app.post("/api/auth/revoke", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_user_tokens(
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Signs the user out everywhere, this token included
+    revoke_tokens(db, current_user.id)
+
+@app.post("/api/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(
+    request: Optional[RefreshRequest] = None,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    current_user, claims = authenticate(token, db)
+    # Tokens issued before they had a jti can only be revoked all at once
+    if "jti" in claims:
+        revocation_list.revoke_token(
+            db, claims["jti"], current_user.id, datetime.utcfromtimestamp(claims["exp"])
+        )
+    if request is not None:
+        # Deleted rather than marked used, so presenting it later is not taken for theft
+        db.query(RefreshToken).filter(
+            RefreshToken.token_hash == hash_refresh_token(request.refresh_token),
+            RefreshToken.user_id == current_user.id
+        ).delete(synchronize_session=False)
+    db.commit()
+    # Refused by this process from now on, by the others after their next refresh
+    revocation_list.refresh(db)
+
+@app.get("/api/auth/revocations")
+def get_revocations(request: Request, db: Session = Depends(get_db)):
+    # Polled by the other services; only hashes of token ids leave this service
+    snapshot = revocation_list.snapshot or revocation_list.refresh(db)
+    etag = f'"{snapshot.etag}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return JSONResponse(snapshot.to_dict(), headers={"ETag": etag})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
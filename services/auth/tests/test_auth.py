@@ -1,9 +1,17 @@
 import pytest
+from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from ..app.database import Base, get_db
-from ..main import app
+from app.database import Base, get_db
+from app.hashing import REHASHED
+from app.models import User
+from app.revocations import revocation_list
+from app.security import SECRET_KEY, ALGORITHM, pwd_context
+from app.user_cache import HITS, MISSES, user_cache
+from jose import jwt
+from main import app
+from shared.revocation import RevocationSnapshot
 
 # Create test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -22,6 +30,9 @@ app.dependency_overrides[get_db] = override_get_db
 @pytest.fixture
 def client():
     Base.metadata.create_all(bind=engine)
+    # User ids restart with every test database
+    user_cache.clear()
+    revocation_list.reset()
     yield TestClient(app)
     Base.metadata.drop_all(bind=engine)
 
@@ -124,4 +135,135 @@ def test_get_current_user(client):
     assert response.status_code == 200
     data = response.json()
     assert data["email"] == "test@example.com"
-    assert data["full_name"] == "Test User" 
\ No newline at end of file
+    assert data["full_name"] == "Test User"
+
+def test_login_upgrades_outdated_hash(client):
+    # Stored before the cost was raised to the current setting
+    db = TestingSessionLocal()
+    db.add(User(
+        email="old@example.com",
+        hashed_password=pwd_context.handler("bcrypt").using(rounds=4).hash("testpassword"),
+        full_name="Old User"
+    ))
+    db.commit()
+    db.close()
+
+    rehashed = REHASHED.value
+    response = client.post(
+        "/api/auth/login",
+        json={"email": "old@example.com", "password": "testpassword"}
+    )
+    assert response.status_code == 200
+    assert REHASHED.value == rehashed + 1
+
+    db = TestingSessionLocal()
+    stored = db.query(User).filter(User.email == "old@example.com").one().hashed_password
+    db.close()
+    assert not pwd_context.needs_update(stored)
+    assert pwd_context.verify("testpassword", stored)
+
+def register_and_login(client, email="test@example.com"):
+    client.post(
+        "/api/auth/register",
+        json={"email": email, "password": "testpassword", "full_name": "Test User"}
+    )
+    response = client.post("/api/auth/login", json={"email": email, "password": "testpassword"})
+    return response.json()["access_token"]
+
+def test_token_carries_user_claims(client):
+    token = register_and_login(client)
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    assert claims["sub"] == "test@example.com"
+    assert claims["user_id"] == 1
+    assert claims["full_name"] == "Test User"
+    assert claims["ver"] == 0
+
+def test_me_served_from_user_cache(client):
+    headers = {"Authorization": f"Bearer {register_and_login(client)}"}
+    client.get("/api/auth/me", headers=headers)
+
+    hits, misses = HITS.value, MISSES.value
+    response = client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["full_name"] == "Test User"
+    assert (HITS.value, MISSES.value) == (hits + 1, misses)
+
+def test_revoke_invalidates_issued_tokens(client):
+    old_headers = {"Authorization": f"Bearer {register_and_login(client)}"}
+    assert client.get("/api/auth/me", headers=old_headers).status_code == 200
+
+    assert client.post("/api/auth/revoke", headers=old_headers).status_code == 204
+    assert client.get("/api/auth/me", headers=old_headers).status_code == 401
+
+    response = client.post("/api/auth/login", json={"email": "test@example.com", "password": "testpassword"})
+    new_token = response.json()["access_token"]
+    assert jwt.decode(new_token, SECRET_KEY, algorithms=[ALGORITHM])["ver"] == 1
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {new_token}"}).status_code == 200
+
+def test_token_without_user_claims_rejected(client):
+    register_and_login(client)
+    legacy = jwt.encode(
+        {"sub": "test@example.com", "exp": datetime.utcnow() + timedelta(hours=1)},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {legacy}"}).status_code == 401
+
+def login_tokens(client, email="test@example.com"):
+    register_and_login(client, email)
+    response = client.post("/api/auth/login", json={"email": email, "password": "testpassword"})
+    return response.json()
+
+def test_refresh_rotates_tokens(client):
+    tokens = login_tokens(client)
+    assert tokens["expires_in"] == 3600
+
+    response = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    renewed = response.json()
+    assert renewed["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {renewed['access_token']}"}
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+def test_refresh_token_reuse_revokes_everything(client):
+    tokens = login_tokens(client)
+    renewed = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    # Replaying the rotated token signs the user out of every session
+    response = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+    assert client.post("/api/auth/refresh", json={"refresh_token": renewed["refresh_token"]}).status_code == 401
+    headers = {"Authorization": f"Bearer {renewed['access_token']}"}
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+def test_logout_revokes_access_and_refresh_token(client):
+    tokens = login_tokens(client)
+    other = client.post("/api/auth/login", json={"email": "test@example.com", "password": "testpassword"}).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    response = client.post("/api/auth/logout", headers=headers, json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 204
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+    assert client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    # Other sessions stay signed in
+    other_headers = {"Authorization": f"Bearer {other['access_token']}"}
+    assert client.get("/api/auth/me", headers=other_headers).status_code == 200
+
+def test_revocations_snapshot(client):
+    tokens = login_tokens(client)
+    jti = jwt.decode(tokens["access_token"], SECRET_KEY, algorithms=[ALGORITHM])["jti"]
+
+    response = client.get("/api/auth/revocations")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert client.get("/api/auth/revocations", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/api/auth/logout", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    client.post("/api/auth/revoke", headers={"Authorization": f"Bearer {register_and_login(client, 'b@example.com')}"})
+    response = client.get("/api/auth/revocations", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    snapshot = RevocationSnapshot.from_dict(response.json())
+    assert snapshot.is_revoked(jti, 1, 0)
+    assert snapshot.floors == {2: 1}
+    assert snapshot.is_revoked(None, 2, 0)
+    assert not snapshot.is_revoked(None, 2, 1)
@@ -0,0 +1,51 @@
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from pydantic import BaseModel
+import os
+from typing import Optional
+
+from shared.revocation import RevocationPoller
+
+# JWT configuration
+SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
+ALGORITHM = "HS256"
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+
+# Latest revocation snapshot from the auth service, polled in the background
+revocations = RevocationPoller("chat")
+
+class User(BaseModel):
+    id: int
+    email: str
+    full_name: Optional[str] = None
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        email: str = payload.get("sub")
+        if email is None:
+            raise credentials_exception
+        
+        # The auth service puts the user's id and name in the token, so no lookup is needed;
+        # tokens from before it did have no user_id and must be renewed by logging in again
+        user_id = payload.get("user_id")
+        if user_id is None:
+            raise credentials_exception
+        full_name = payload.get("full_name")
+        
+        # Logged out or revoked since it was issued; the check is in memory
+        if revocations.is_revoked(payload.get("jti"), user_id, payload.get("ver")):
+            raise credentials_exception
+        
+        return User(id=user_id, email=email, full_name=full_name)
+        
+    except JWTError:
+        raise credentials_exception
@@ -0,0 +1,16 @@
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from shared.database import DATABASE_URL, create_db_engine, session_dependency
+
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+Base = declarative_base()
+
+get_db = session_dependency(SessionLocal)
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
@@ -0,0 +1,273 @@
+"""Rule-based intent extraction for the common chat queries.
+
+Questions like "how much did the fridge use yesterday" name one of the
+user's devices, a time expression ``parse_time_period`` understands and a
+metric keyword. Those are answered locally in microseconds; anything the
+rules are unsure about (no or ambiguous device, comparisons) is left to the
+LLM extractor.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Pattern, Sequence, Set, Tuple
+
+# Matches scoring below this are handed to the LLM; above 1 disables the fast path
+INTENT_MIN_CONFIDENCE = float(os.getenv("CHAT_INTENT_MIN_CONFIDENCE", "0.8"))
+# Best device must beat the runner-up by this much to count as unambiguous
+DEVICE_MARGIN = 0.1
+# A match on the device type counts for less than one on the name the user gave it
+TYPE_WEIGHT = 0.85
+# Score for a query word found in exactly one device's name
+DISTINCTIVE_WORD_SCORE = 0.9
+# Query words at least this similar to a device-name word count as (misspelt) mentions of it
+FUZZY_WORD_CUTOFF = 0.8
+FUZZY_WORD_CACHE_SIZE = 4096
+
+# Everyday names for appliances (and spellings of them), mapped onto words likely to
+# appear in device names; applied to whole phrases, longest first
+SYNONYMS = {
+    "fridge": "refrigerator",
+    "freezer": "refrigerator",
+    "ac": "air conditioner",
+    "a/c": "air conditioner",
+    "aircon": "air conditioner",
+    "tv": "television",
+    "telly": "television",
+    "dish washer": "dishwasher",
+    "washer": "washing machine",
+    "laundry": "washing machine",
+    "dryer": "clothes dryer",
+    "stove": "oven",
+    "cooker": "oven",
+    "boiler": "water heater",
+    "pc": "computer",
+    "lights": "lighting",
+    "lamp": "lighting",
+    "ev": "electric vehicle",
+    "car": "electric vehicle",
+}
+_SYNONYM_PATTERN = re.compile(
+    r"(?<![a-z0-9/])(" + "|".join(
+        re.escape(phrase) for phrase in sorted(SYNONYMS, key=len, reverse=True)
+    ) + r")(?![a-z0-9/])"
+)
+
+# (pattern, period) in priority order; periods are the ones parse_time_period knows
+TIME_PATTERNS = [
+    (re.compile(r"\byesterday\b|\blast night\b"), "yesterday"),
+    (re.compile(r"\btoday\b|\bthis (?:morning|afternoon|evening)\b|\bso far\b"), "today"),
+    (re.compile(r"\b(?:last|past|previous|this) (?:7 days|seven days|week)\b|\bweekly\b"), "last week"),
+    (re.compile(r"\b(?:last|past|previous|this) (?:30 days|thirty days|month)\b|\bmonthly\b"), "last month"),
+    (re.compile(r"\b(?:last|past) (?:24 ?h(?:ours|rs)?|day)\b"), "24h"),
+]
+
+METRIC_PATTERNS = [
+    (re.compile(r"\b(?:compare|comparison|versus|vs\.?|more than|less than|than the)\b"), "comparison"),
+    (re.compile(r"\b(?:peak|max(?:imum)?|highest|most)\b"), "peak"),
+    (re.compile(r"\b(?:min(?:imum)?|lowest|least)\b"), "minimum"),
+    (re.compile(r"\b(?:average|avg|mean|typical(?:ly)?)\b"), "average"),
+    (re.compile(r"\b(?:use|used|using|usage|consum\w*|energy|kwh|wh|power|draw|cost|spend|spent)\b"), "consumption"),
+]
+
+# Questions about every device (or several) rather than one
+RANKING_PATTERN = re.compile(
+    r"\bwhich (?:device|appliance|one|thing)s?\b|\bwhat (?:device|appliance)s?\b"
+    r"|\b(?:rank|ranking|ranked|top \d+|biggest|worst)\b"
+)
+ASCENDING_PATTERN = re.compile(r"\b(?:least|lowest|smallest|min(?:imum)?|fewest)\b")
+TOTAL_PATTERN = re.compile(
+    r"\b(?:total|overall|altogether|in total|whole|entire|house|home|household)\b"
+    r"|\ball (?:of )?(?:my |the )?(?:devices|appliances)\b"
+)
+
+# Words that carry no device information and should not be fuzzy-matched
+STOPWORDS = {
+    "a", "an", "the", "my", "our", "how", "much", "did", "does", "do", "was", "is", "what",
+    "whats", "of", "in", "on", "for", "by", "to", "me", "show", "tell", "and",
+    "i", "it", "its", "at", "from", "with", "this", "that", "last", "past", "day", "week",
+    "month", "today", "yesterday", "hours", "hour", "night", "so", "far", "has", "have",
+}
+
+@dataclass
+class IntentMatch:
+    intent: Dict[str, Any]
+    confidence: float
+    # Why confidence is low, for logging and the benchmark
+    reasons: List[str] = field(default_factory=list)
+
+def normalize(text: str) -> str:
+    text = re.sub(r"['\u2019]s\b", "", text.lower())  # "the fridge's peak"
+    text = re.sub(r"[^a-z0-9/ ]+", " ", text.replace("'", ""))
+    return re.sub(r"\s+", " ", text).strip()
+
+def _expand_synonyms(text: str) -> str:
+    return _SYNONYM_PATTERN.sub(lambda m: SYNONYMS[m.group(1)], text)
+
+class DeviceIndex:
+    """Normalized device labels for one device list, built once per list."""
+
+    def __init__(self, devices: Sequence[Dict[str, Any]]):
+        self.devices = list(devices)
+        self.labels = []  # (device position, label words, weight)
+        name_words: Dict[str, Set[int]] = {}
+        for position, device in enumerate(self.devices):
+            name = _expand_synonyms(normalize(device.get("name", ""))).split()
+            device_type = _expand_synonyms(normalize(device.get("device_type", ""))).split()
+            self.labels.append((position, name, 1.0))
+            if device_type != name:
+                self.labels.append((position, device_type, TYPE_WEIGHT))
+            for word in name:
+                name_words.setdefault(word, set()).add(position)
+        self.names = [set(words) for _, words, weight in self.labels if weight == 1.0]
+        self.vocabulary = sorted({word for _, words, _ in self.labels for word in words})
+        # Words of a name that no other device's name shares ("heater" for "Water Heater")
+        self.distinctive = {
+            word: positions.pop() for word, positions in name_words.items()
+            if len(positions) == 1 and len(word) > 3
+        }
+        # Query word -> (label word, similarity) or None; query wording repeats a lot
+        self._closest: Dict[str, Optional[Tuple[str, float]]] = {}
+
+    def closest(self, word: str) -> Optional[Tuple[str, float]]:
+        """The label word ``word`` is (a misspelling of), with its similarity."""
+        if word in self._closest:
+            return self._closest[word]
+        match = None
+        if word in self.vocabulary:
+            match = (word, 1.0)
+        elif len(word) > 3:
+            matcher = SequenceMatcher(autojunk=False)
+            matcher.set_seq2(word)
+            for candidate in self.vocabulary:
+                matcher.set_seq1(candidate)
+                best = match[1] if match else FUZZY_WORD_CUTOFF
+                if matcher.real_quick_ratio() >= best and matcher.quick_ratio() >= best:
+                    ratio = matcher.ratio()
+                    if ratio >= best:
+                        match = (candidate, ratio)
+        if len(self._closest) >= FUZZY_WORD_CACHE_SIZE:
+            self._closest.clear()
+        self._closest[word] = match
+        return match
+
+    def scores(self, query_words: List[str]) -> Tuple[List[float], List[Set[str]]]:
+        """How much of each device's name or type the query covers (0..1), and by which words."""
+        found: Dict[str, float] = {}
+        for word in query_words:
+            match = self.closest(word)
+            if match is not None:
+                found[match[0]] = max(found.get(match[0], 0.0), match[1])
+
+        scores = [0.0] * len(self.devices)
+        support: List[Set[str]] = [set() for _ in self.devices]
+        for word in found:
+            if word in self.distinctive:
+                position = self.distinctive[word]
+                scores[position] = max(scores[position], DISTINCTIVE_WORD_SCORE * found[word])
+        for position, words, weight in self.labels:
+            if words:
+                coverage = sum(found.get(word, 0.0) for word in words) / len(words)
+                scores[position] = max(scores[position], weight * coverage)
+                support[position].update(word for word in words if word in found)
+        return scores, support
+
+@lru_cache(maxsize=1024)
+def _device_index(key: Tuple[Tuple[Any, str, str], ...]) -> DeviceIndex:
+    return DeviceIndex([
+        {"id": device_id, "name": name, "device_type": device_type} for device_id, name, device_type in key
+    ])
+
+def device_index(devices: Sequence[Dict[str, Any]]) -> DeviceIndex:
+    # Device lists repeat from query to query (per user), so their index is cached
+    return _device_index(tuple(
+        (device["id"], device.get("name", ""), device.get("device_type", "")) for device in devices
+    ))
+
+def _best_device(index: DeviceIndex, scores: List[float]) -> Tuple[Optional[int], float, float]:
+    """Position of the best matching device, its score and the best score of a competing device."""
+    if not index.devices:
+        return None, 0.0, 0.0
+    # Prefer the longer name on ties: "bedroom ac" fully matches "Air Conditioner" too
+    ranked = sorted(range(len(scores)), key=lambda i: (scores[i], len(index.names[i])), reverse=True)
+    best = ranked[0]
+    rivals = [scores[i] for i in ranked[1:] if not index.names[i] < index.names[best]]
+    return best, scores[best], max(rivals, default=0.0)
+
+def _named_devices(index: DeviceIndex, scores: List[float], support: List[Set[str]]) -> List[int]:
+    """Positions of every device the query names with confidence, best first.
+
+    A device only counts if words of its own name match it: in "the bedroom ac"
+    the Air Conditioner is matched by words that already picked Bedroom AC.
+    """
+    ranked = sorted(range(len(scores)), key=lambda i: (scores[i], len(index.names[i])), reverse=True)
+    picked: List[int] = []
+    for i in ranked:
+        if scores[i] < INTENT_MIN_CONFIDENCE:
+            break
+        if not any(support[i] <= support[j] for j in picked):
+            picked.append(i)
+    return picked
+
+def _first_match(patterns: Sequence[Tuple[Pattern, str]], text: str) -> Optional[str]:
+    for pattern, value in patterns:
+        if pattern.search(text):
+            return value
+    return None
+
+def parse_intent(query: str, devices: Sequence[Dict[str, Any]]) -> IntentMatch:
+    """Device(s), time period and metric from ``query`` with a confidence in 0..1.
+
+    The intent carries the same keys the LLM extractor produces; the caller
+    adds the resolved start/end times. Questions about several devices, or
+    all of them, set ``device_ids`` (None meaning every device) instead of
+    ``device_id``.
+    """
+    text = normalize(query)
+    tokens = [token for token in _expand_synonyms(text).split() if token not in STOPWORDS]
+    reasons = []
+
+    time_period = _first_match(TIME_PATTERNS, text)
+    metric = _first_match(METRIC_PATTERNS, text)
+    intent = {
+        "device_id": None,
+        "device_ids": None,
+        "time_period": time_period or "24h",
+        "metric": metric or "consumption",
+        "source": "rules",
+    }
+    index = device_index(devices)
+    scores, support = index.scores(tokens)
+    named = [index.devices[i]["id"] for i in _named_devices(index, scores, support)]
+
+    if RANKING_PATTERN.search(text):
+        # "Which appliance used the most last week?", optionally among named devices
+        intent["metric"] = "ranking"
+        intent["order"] = "asc" if ASCENDING_PATTERN.search(text) else "desc"
+        if len(named) > 1:
+            intent["device_ids"] = sorted(named)
+        confidence = 1.0
+    elif len(named) > 1:
+        intent["metric"] = "comparison"
+        intent["device_ids"] = sorted(named)
+        confidence = 1.0
+    elif not named and TOTAL_PATTERN.search(text):
+        intent["metric"] = "total"
+        confidence = 1.0 if metric or time_period else 0.0
+    else:
+        if metric == "comparison":
+            reasons.append("comparison")
+        best, confidence, runner_up = _best_device(index, scores)
+        if best is None or confidence < INTENT_MIN_CONFIDENCE:
+            reasons.append("no device")
+        elif confidence - runner_up < DEVICE_MARGIN:
+            reasons.append("ambiguous device")
+        else:
+            intent["device_id"] = index.devices[best]["id"]
+        if metric is None and time_period is None:
+            reasons.append("no metric or time")
+        if reasons:
+            confidence = min(confidence, INTENT_MIN_CONFIDENCE - 0.01)
+
+    return IntentMatch(intent=intent, confidence=confidence, reasons=reasons)
@@ -1,45 +1,106 @@
 from datetime import datetime, timedelta
-import httpx
+import asyncio
 import json
 import os
-from typing import List, Dict, Any, Optional
-import openai
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from dateutil import parser
 import re
 
+from .intent import INTENT_MIN_CONFIDENCE, parse_intent
+from .llm_providers import get_provider
+from .response_cache import response_cache
 from .schemas import QueryResult
+from .telemetry_client import telemetry_get
 
-# Configure OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Upper bound on chart points sent along with an answer
+SERIES_MAX_POINTS = int(os.getenv("CHAT_SERIES_MAX_POINTS", "200"))
+# Upper bound on raw readings, which are only fetched when a query asks for them
+RAW_MAX_ROWS = int(os.getenv("CHAT_RAW_MAX_ROWS", "1000"))
+
+# Metrics answered from every device (or the listed ones) when no single device is named
+MULTI_DEVICE_METRICS = ("comparison", "ranking", "total")
 
 async def process_query(
     query: str,
     devices: List[Dict[str, Any]],
     user: Any,
     auth_token: str,
-    telemetry_service_url: str
+    include_raw: bool = False
 ) -> QueryResult:
     # Extract intent and parameters from the query
     intent_data = await extract_intent(query, devices)
     
     # Fetch relevant data based on intent
-    data = await fetch_telemetry_data(
-        intent_data,
-        auth_token,
-        telemetry_service_url
-    )
+    data = await fetch_telemetry_data(intent_data, auth_token, include_raw, devices)
     
-    # Generate natural language response
-    response = await generate_response(intent_data, data)
+    # Generate natural language response, reusing an earlier answer over the same numbers
+    if "error" in data:
+        answer = (await generate_response(intent_data, data))["answer"]
+    else:
+        cache_key = response_cache.key(intent_data, answer_data(data))
+        answer = response_cache.get(cache_key)
+        if answer is None:
+            answer = (await generate_response(intent_data, data))["answer"]
+            response_cache.put(cache_key, answer)
     
     return QueryResult(
-        answer=response["answer"],
+        answer=answer,
         data=data,
         device_id=intent_data.get("device_id"),
         time_period=intent_data.get("time_period")
     )
 
+async def process_query_stream(
+    query: str,
+    devices: List[Dict[str, Any]],
+    user: Any,
+    auth_token: str,
+    include_raw: bool = False
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """``process_query`` as a series of ``(event, payload)`` pairs.
+
+    Emits the resolved ``intent``, then ``stats`` with the telemetry data,
+    then the answer in ``token`` pieces as the LLM produces them, and
+    finally ``done`` with the complete answer.
+    """
+    intent_data = await extract_intent(query, devices)
+    yield "intent", intent_data
+
+    data = await fetch_telemetry_data(intent_data, auth_token, include_raw, devices)
+    yield "stats", data
+
+    if "error" in data:
+        answer = (await generate_response(intent_data, data))["answer"]
+        yield "token", {"text": answer}
+    else:
+        cache_key = response_cache.key(intent_data, answer_data(data))
+        answer = response_cache.get(cache_key)
+        if answer is not None:
+            yield "token", {"text": answer}
+        else:
+            pieces = []
+            async for piece in generate_response_stream(intent_data, data):
+                pieces.append(piece)
+                yield "token", {"text": piece}
+            answer = "".join(pieces)
+            response_cache.put(cache_key, answer)
+
+    yield "done", {
+        "answer": answer,
+        "device_id": intent_data.get("device_id"),
+        "time_period": intent_data.get("time_period")
+    }
+
 async def extract_intent(query: str, devices: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Most queries name a device and a period plainly; only ask the LLM when the rules are unsure
+    match = parse_intent(query, devices)
+    if match.confidence >= INTENT_MIN_CONFIDENCE:
+        intent_data = match.intent
+        time_range = parse_time_period(intent_data["time_period"])
+        intent_data["start_time"] = time_range["start"].isoformat()
+        intent_data["end_time"] = time_range["end"].isoformat()
+        return intent_data
+
     # Create a system prompt that includes device information
     devices_info = "\n".join([
         f"- {d['name']} (ID: {d['id']}, Type: {d['device_type']})"
@@ -51,23 +112,25 @@ Available devices:
 {devices_info}
 
 Extract the following information from the user's query:
-1. Device ID (if mentioned)
-2. Time period (e.g., "yesterday", "last week", "today")
-3. Type of information requested (e.g., consumption, comparison, peak usage)
+1. Device ID (if mentioned), as "device_id"
+2. Device IDs, as "device_ids", if several devices are compared (null for all devices)
+3. Time period (e.g., "yesterday", "last week", "today")
+4. Type of information requested (e.g., consumption, peak usage, comparison, ranking, total)
+5. For a ranking, "order": "desc" for the biggest consumers first, "asc" for the smallest
 
 Format your response as a JSON object."""
 
-    # Call OpenAI API to extract intent
-    response = await openai.ChatCompletion.acreate(
-        model="gpt-4",
-        messages=[
+    # Ask the LLM to extract intent
+    completion = await get_provider().complete(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": query}
-        ]
+        ],
+        operation="intent"
     )
     
     try:
-        intent_data = json.loads(response.choices[0].message.content)
+        intent_data = json.loads(completion.text)
         
         # Convert time period to actual datetime range
         time_range = parse_time_period(intent_data.get("time_period", "24h"))
@@ -105,59 +168,112 @@ def parse_time_period(period: str) -> Dict[str, datetime]:
         start = now - timedelta(hours=24)
         return {"start": start, "end": now}
 
+def time_window(intent_data: Dict[str, Any]) -> Dict[str, str]:
+    """The window ``parse_time_period`` resolved, so stats, series and raw rows cover the same range."""
+    return {
+        key: intent_data[key]
+        for key in ("start_time", "end_time")
+        if intent_data.get(key)
+    }
+
+def is_multi_device(intent_data: Dict[str, Any]) -> bool:
+    if intent_data.get("device_ids"):
+        return True
+    # A comparison about one device is over time, which its own stats answer
+    return not intent_data.get("device_id") and intent_data.get("metric") in MULTI_DEVICE_METRICS
+
 async def fetch_telemetry_data(
     intent_data: Dict[str, Any],
     auth_token: str,
-    telemetry_service_url: str
+    include_raw: bool = False,
+    devices: Optional[List[Dict[str, Any]]] = None
 ) -> Dict[str, Any]:
+    if is_multi_device(intent_data):
+        return await fetch_device_stats(intent_data, auth_token, devices or [])
+    
     device_id = intent_data.get("device_id")
     if not device_id:
         return {"error": "No device specified"}
     
-    async with httpx.AsyncClient() as client:
-        # Get device stats
-        response = await client.get(
-            f"{telemetry_service_url}/api/telemetry/{device_id}/stats",
-            params={"period": intent_data.get("time_period", "24h")},
-            headers={"Authorization": f"Bearer {auth_token}"}
-        )
-        
-        if response.status_code != 200:
-            return {"error": "Failed to fetch device statistics"}
-        
-        stats = response.json()
-        
-        # Get detailed telemetry data
-        response = await client.get(
-            f"{telemetry_service_url}/api/telemetry/{device_id}",
-            params={
-                "start_time": intent_data.get("start_time"),
-                "end_time": intent_data.get("end_time")
-            },
-            headers={"Authorization": f"Bearer {auth_token}"}
+    window = time_window(intent_data)
+    # Stats and the chart series are independent, so fetch them concurrently.
+    # The series comes from rollups, downsampled to a bounded number of points
+    requests = [
+        telemetry_get(
+            f"/api/telemetry/{device_id}/stats",
+            auth_token,
+            params=window
+        ),
+        telemetry_get(
+            f"/api/telemetry/{device_id}/series",
+            auth_token,
+            params={**window, "max_points": SERIES_MAX_POINTS, "method": "bucket"}
         )
-        
-        if response.status_code != 200:
-            return {"error": "Failed to fetch telemetry data"}
-        
-        telemetry = response.json()
-        
-        return {
-            "stats": stats,
-            "telemetry": telemetry
-        }
+    ]
+    if include_raw:
+        # Newest readings first, capped; the rest of the window is left out
+        requests.append(telemetry_get(
+            f"/api/telemetry/{device_id}",
+            auth_token,
+            params={**window, "limit": RAW_MAX_ROWS}
+        ))
+    responses = await asyncio.gather(*requests)
+    
+    if responses[0].status_code != 200:
+        return {"error": "Failed to fetch device statistics"}
+    
+    if any(response.status_code != 200 for response in responses[1:]):
+        return {"error": "Failed to fetch telemetry data"}
+    
+    data = {
+        "stats": responses[0].json(),
+        "series": responses[1].json()
+    }
+    if include_raw:
+        data["telemetry"] = responses[2].json()
+    return data
 
-async def generate_response(
+async def fetch_device_stats(
     intent_data: Dict[str, Any],
-    data: Dict[str, Any]
-) -> Dict[str, str]:
-    if "error" in data:
+    auth_token: str,
+    devices: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    # Comparisons, rankings and totals need the same aggregates for several devices;
+    # the telemetry service computes them all in one grouped query
+    params = time_window(intent_data)
+    if intent_data.get("device_ids"):
+        params["device_ids"] = intent_data["device_ids"]
+    response = await telemetry_get("/api/telemetry/stats", auth_token, params=params)
+    
+    if response.status_code != 200:
+        return {"error": "Failed to fetch device statistics"}
+    
+    names = {device["id"]: device["name"] for device in devices}
+    device_stats = [
+        {**stats, "device_name": names.get(stats["device_id"])}
+        for stats in response.json()
+    ]
+    # Biggest consumers first unless the question asks for the smallest
+    device_stats.sort(
+        key=lambda stats: stats["total_energy_watt_hours"],
+        reverse=intent_data.get("order") != "asc"
+    )
+    return {
+        "device_stats": device_stats,
+        "total_energy_watt_hours": sum(stats["total_energy_watt_hours"] for stats in device_stats)
+    }
+
+def answer_data(data: Dict[str, Any]) -> Any:
+    """The part of the telemetry data the answer is written from."""
+    if "device_stats" in data:
         return {
-            "answer": f"I encountered an error: {data['error']}",
-            "data": data
+            "devices": data["device_stats"],
+            "total_energy_watt_hours": data["total_energy_watt_hours"]
         }
-    
-    stats = data.get("stats", {})
+    return data.get("stats", {})
+
+def answer_messages(intent_data: Dict[str, Any], data: Dict[str, Any]) -> List[Dict[str, str]]:
+    stats = answer_data(data)
     
     # Create a natural language response based on the data
     system_prompt = """You are an AI assistant that helps users understand their smart home energy consumption data.
@@ -168,16 +284,32 @@ Include relevant statistics and insights from the provided data."""
 Intent: {json.dumps(intent_data, indent=2)}
 Data: {json.dumps(stats, indent=2)}
 """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": context}
+    ]
 
-    response = await openai.ChatCompletion.acreate(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": context}
-        ]
-    )
+async def generate_response(
+    intent_data: Dict[str, Any],
+    data: Dict[str, Any]
+) -> Dict[str, str]:
+    if "error" in data:
+        return {
+            "answer": f"I encountered an error: {data['error']}",
+            "data": data
+        }
+    
+    completion = await get_provider().complete(answer_messages(intent_data, data), operation="answer")
     
     return {
-        "answer": response.choices[0].message.content,
+        "answer": completion.text,
         "data": data
-    } 
\ No newline at end of file
+    }
+
+async def generate_response_stream(
+    intent_data: Dict[str, Any],
+    data: Dict[str, Any]
+) -> AsyncIterator[str]:
+    """The answer text in pieces as the model generates it."""
+    async for piece in get_provider().stream(answer_messages(intent_data, data), operation="answer"):
+        yield piece
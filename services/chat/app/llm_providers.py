@@ -0,0 +1,407 @@
+"""LLM backends for the chat service.
+
+``get_provider()`` returns the backend selected by ``LLM_PROVIDER``:
+
+    openai  the OpenAI chat completions API (default)
+    stub    deterministic canned replies after a configurable delay, for offline load tests
+    replay  responses recorded earlier (see ``LLM_RECORD_PATH``), matched by prompt
+
+Callers go through ``LLMProvider.complete`` and ``LLMProvider.stream``,
+which hold one of ``LLM_MAX_CONCURRENCY`` slots for the duration of the
+call, so bursts queue here instead of tripping provider rate limits, and
+record latency, token counts and concurrency on ``/metrics``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import openai
+
+from shared.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Calls in flight at once; the rest wait for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Stub timings: delay before the first token, then per token
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "300"))
+LLM_STUB_TOKEN_MS = float(os.getenv("LLM_STUB_TOKEN_MS", "20"))
+# JSON lines of recorded responses read by the replay backend
+LLM_REPLAY_PATH = os.getenv("LLM_REPLAY_PATH", "llm_recording.jsonl")
+# When set, every response from any backend is appended here for later replay
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH")
+
+# Latencies run from hundreds of milliseconds to tens of seconds
+LLM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0)
+
+Message = Dict[str, str]
+
+@dataclass
+class Completion:
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English; used where the API reports no usage
+    return math.ceil(len(text) / 4)
+
+def prompt_key(operation: str, messages: List[Message]) -> str:
+    """Identifies a prompt across runs: timestamps in it (resolved time windows) are ignored."""
+    normalized = [
+        {**message, "content": re.sub(r"\d{4}-\d\d-\d\dT[\d:.+]+", "<time>", message["content"])}
+        for message in messages
+    ]
+    encoded = json.dumps([operation, normalized], sort_keys=True)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class LLMMetrics:
+    """Metrics for one provider; per-operation series are created on first use."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.in_flight = Gauge(
+            "chat_llm_in_flight",
+            "LLM calls currently holding a concurrency slot",
+            {"provider": provider}
+        )
+        self.waiting = Gauge(
+            "chat_llm_waiting",
+            "LLM calls waiting for a concurrency slot",
+            {"provider": provider}
+        )
+        self._series: Dict[str, Dict[str, object]] = {}
+        self._lock = threading.Lock()
+
+    def series(self, operation: str) -> Dict[str, object]:
+        with self._lock:
+            if operation not in self._series:
+                labels = {"provider": self.provider, "operation": operation}
+                self._series[operation] = {
+                    "seconds": Histogram(
+                        "chat_llm_request_seconds",
+                        "LLM call time, from holding a slot to the last token",
+                        labels,
+                        buckets=LLM_BUCKETS
+                    ),
+                    "first_token_seconds": Histogram(
+                        "chat_llm_first_token_seconds",
+                        "Time to the first streamed token",
+                        labels,
+                        buckets=LLM_BUCKETS
+                    ),
+                    "wait_seconds": Histogram(
+                        "chat_llm_wait_seconds",
+                        "Time spent waiting for a concurrency slot",
+                        labels
+                    ),
+                    "errors": Counter("chat_llm_errors_total", "LLM calls that raised", labels),
+                    "prompt_tokens": Counter(
+                        "chat_llm_tokens_total",
+                        "Tokens sent to and received from the LLM",
+                        {**labels, "type": "prompt"}
+                    ),
+                    "completion_tokens": Counter(
+                        "chat_llm_tokens_total",
+                        "Tokens sent to and received from the LLM",
+                        {**labels, "type": "completion"}
+                    ),
+                }
+            return self._series[operation]
+
+_metrics: Dict[str, LLMMetrics] = {}
+
+def _metrics_for(provider: str) -> LLMMetrics:
+    # Metrics register globally, so providers with the same name share them
+    if provider not in _metrics:
+        _metrics[provider] = LLMMetrics(provider)
+    return _metrics[provider]
+
+class LLMProvider:
+    """Base class: concurrency limit, instrumentation and recording around ``_complete``/``_stream``."""
+    name = "base"
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, record_path: Optional[str] = LLM_RECORD_PATH):
+        self.max_concurrency = max_concurrency
+        self.record_path = record_path
+        self.metrics = _metrics_for(self.name)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self._record_lock = threading.Lock()
+
+    async def complete(self, messages: List[Message], operation: str) -> Completion:
+        series = self.metrics.series(operation)
+        async with self._slot(series):
+            started = time.perf_counter()
+            try:
+                completion = await self._complete(messages, operation)
+            except Exception:
+                series["errors"].inc()
+                raise
+            series["seconds"].observe(time.perf_counter() - started)
+        self._count_tokens(series, completion)
+        self._record(operation, messages, completion)
+        return completion
+
+    async def stream(self, messages: List[Message], operation: str) -> AsyncIterator[str]:
+        """The reply in pieces as it is generated; the slot is held until the last one."""
+        series = self.metrics.series(operation)
+        pieces = []
+        async with self._slot(series):
+            started = time.perf_counter()
+            try:
+                async for piece in self._stream(messages, operation):
+                    if not pieces:
+                        series["first_token_seconds"].observe(time.perf_counter() - started)
+                    pieces.append(piece)
+                    yield piece
+            except Exception:
+                series["errors"].inc()
+                raise
+            series["seconds"].observe(time.perf_counter() - started)
+        # Streamed responses carry no usage; each content delta is about one token
+        completion = Completion(
+            text="".join(pieces),
+            prompt_tokens=sum(estimate_tokens(message["content"]) for message in messages),
+            completion_tokens=len(pieces)
+        )
+        self._count_tokens(series, completion)
+        self._record(operation, messages, completion)
+
+    async def close(self) -> None:
+        pass
+
+    async def _complete(self, messages: List[Message], operation: str) -> Completion:
+        raise NotImplementedError
+
+    async def _stream(self, messages: List[Message], operation: str) -> AsyncIterator[str]:
+        # Backends without native streaming deliver the whole reply as one piece
+        yield (await self._complete(messages, operation)).text
+
+    @asynccontextmanager
+    async def _slot(self, series):
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            # A semaphore belongs to one event loop (tests and scripts run several)
+            self._semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+            self._semaphore_loop = loop
+        started = time.perf_counter()
+        self.metrics.waiting.inc()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.metrics.waiting.dec()
+        series["wait_seconds"].observe(time.perf_counter() - started)
+        self.metrics.in_flight.inc()
+        try:
+            yield
+        finally:
+            self.metrics.in_flight.dec()
+            self._semaphore.release()
+
+    def _count_tokens(self, series, completion: Completion) -> None:
+        series["prompt_tokens"].inc(completion.prompt_tokens)
+        series["completion_tokens"].inc(completion.completion_tokens)
+
+    def _record(self, operation: str, messages: List[Message], completion: Completion) -> None:
+        if not self.record_path:
+            return
+        record = {"key": prompt_key(operation, messages), "operation": operation, **asdict(completion)}
+        with self._record_lock, open(self.record_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, model: str = LLM_MODEL, api_key: Optional[str] = OPENAI_API_KEY, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+        self.api_key = api_key
+        self._client: Optional[openai.AsyncOpenAI] = None
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        # Created on first use: the constructor refuses to run without an API key
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(api_key=self.api_key)
+        return self._client
+
+    async def _complete(self, messages: List[Message], operation: str) -> Completion:
+        response = await self.client.chat.completions.create(model=self.model, messages=messages)
+        text = response.choices[0].message.content or ""
+        usage = response.usage
+        return Completion(
+            text=text,
+            prompt_tokens=usage.prompt_tokens if usage else sum(estimate_tokens(m["content"]) for m in messages),
+            completion_tokens=usage.completion_tokens if usage else estimate_tokens(text)
+        )
+
+    async def _stream(self, messages: List[Message], operation: str) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+class StubProvider(LLMProvider):
+    """Deterministic replies shaped like the real ones, after a fixed delay.
+
+    The intent reply names the first listed device that appears in the
+    question; the answer reply restates the stats (or the per-device
+    totals) in the prompt.
+    """
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_ms: float = LLM_STUB_LATENCY_MS,
+        token_ms: float = LLM_STUB_TOKEN_MS,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.latency = latency_ms / 1000
+        self.token_delay = token_ms / 1000
+
+    def reply(self, messages: List[Message], operation: str) -> str:
+        system, question = messages[0]["content"], messages[-1]["content"]
+        if operation == "intent":
+            return self._intent(system, question)
+        return self._answer(question)
+
+    @staticmethod
+    def _intent(system: str, question: str) -> str:
+        device_id = None
+        for name, id_ in re.findall(r"^- (.+) \(ID: (\d+), Type: .*\)$", system, re.MULTILINE):
+            if name.lower() in question.lower():
+                device_id = int(id_)
+                break
+        return json.dumps({"device_id": device_id, "time_period": "24h", "metric": "consumption"})
+
+    @staticmethod
+    def _answer(question: str) -> str:
+        try:
+            stats = json.loads(question.split("Data:", 1)[1])
+        except (IndexError, ValueError):
+            stats = {}
+        if not stats:
+            return "There is no data for that period."
+        if "devices" in stats:
+            ranking = ", ".join(
+                f"{device.get('device_name') or device['device_id']} {device['total_energy_watt_hours'] / 1000:.2f} kWh"
+                for device in stats["devices"]
+            )
+            return f"Together they used {stats['total_energy_watt_hours'] / 1000:.2f} kWh: {ranking}."
+        return (
+            f"Over the {stats.get('period', 'selected period')} the device averaged "
+            f"{stats.get('avg_energy_watts', 0):.1f} W, peaking at {stats.get('max_energy_watts', 0):.1f} W, "
+            f"for a total of {stats.get('total_energy_watt_hours', 0) / 1000:.2f} kWh."
+        )
+
+    async def _complete(self, messages: List[Message], operation: str) -> Completion:
+        text = self.reply(messages, operation)
+        pieces = _split_pieces(text)
+        await asyncio.sleep(self.latency + self.token_delay * len(pieces))
+        return Completion(
+            text=text,
+            prompt_tokens=sum(estimate_tokens(message["content"]) for message in messages),
+            completion_tokens=len(pieces)
+        )
+
+    async def _stream(self, messages: List[Message], operation: str) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency)
+        for piece in _split_pieces(self.reply(messages, operation)):
+            await asyncio.sleep(self.token_delay)
+            yield piece
+
+class ReplayProvider(LLMProvider):
+    """Serves responses recorded by any backend run with ``LLM_RECORD_PATH``."""
+    name = "replay"
+
+    def __init__(self, path: str = LLM_REPLAY_PATH, **kwargs):
+        kwargs.setdefault("record_path", None)
+        super().__init__(**kwargs)
+        self.path = path
+        self.recorded: Dict[str, List[Completion]] = defaultdict(list)
+        self._served: Dict[str, int] = defaultdict(int)
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.recorded[record["key"]].append(Completion(
+                        text=record["text"],
+                        prompt_tokens=record["prompt_tokens"],
+                        completion_tokens=record["completion_tokens"]
+                    ))
+
+    async def _complete(self, messages: List[Message], operation: str) -> Completion:
+        return self._lookup(messages, operation)
+
+    async def _stream(self, messages: List[Message], operation: str) -> AsyncIterator[str]:
+        for piece in _split_pieces(self._lookup(messages, operation).text):
+            yield piece
+
+    def _lookup(self, messages: List[Message], operation: str) -> Completion:
+        key = prompt_key(operation, messages)
+        if key not in self.recorded:
+            raise LookupError(f"No recorded {operation} response for this prompt in {self.path}")
+        # Repeated prompts get their recorded responses in turn
+        responses = self.recorded[key]
+        completion = responses[self._served[key] % len(responses)]
+        self._served[key] += 1
+        return completion
+
+def _split_pieces(text: str) -> List[str]:
+    # Word-sized pieces that join back to the exact text
+    return re.findall(r"\s*\S+", text) or [text]
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "stub": StubProvider,
+    "replay": ReplayProvider,
+}
+
+_provider: Optional[LLMProvider] = None
+
+def create_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r}; expected one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+def get_provider() -> LLMProvider:
+    global _provider
+    if _provider is None:
+        _provider = create_provider()
+        logger.info("Using LLM provider %s", _provider.name)
+    return _provider
+
+def set_provider(provider: Optional[LLMProvider]) -> None:
+    """Replace the app-wide provider (tests, benchmarks); None goes back to LLM_PROVIDER."""
+    global _provider
+    _provider = provider
+
+async def close_provider() -> None:
+    global _provider
+    if _provider is not None:
+        await _provider.close()
+        _provider = None
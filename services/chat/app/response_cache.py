@@ -0,0 +1,100 @@
+"""Cache of generated chat answers.
+
+The answer LLM only sees the intent and the stats returned by the telemetry
+service, so an answer can be reused for any query that resolves to the same
+device (or devices), metric and period over the same numbers. Entries are
+keyed by that normalized intent, with the resolved time window rounded to
+``CHAT_RESPONSE_CACHE_BUCKET_SECONDS``, plus a fingerprint of the stats
+payload: new readings change the stats and so miss the cache rather than
+serving a stale answer.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from shared.metrics import Counter
+
+# 0 disables the cache
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("CHAT_RESPONSE_CACHE_TTL_SECONDS", "600"))
+RESPONSE_CACHE_BUCKET_SECONDS = int(os.getenv("CHAT_RESPONSE_CACHE_BUCKET_SECONDS", "300"))
+
+HITS = Counter("chat_response_cache_hits_total", "Answers served from the response cache")
+MISSES = Counter("chat_response_cache_misses_total", "Answers generated because no cached one matched")
+
+def _bucket(value: Optional[str], bucket_seconds: int) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return int(timestamp // bucket_seconds) if bucket_seconds > 0 else int(timestamp)
+
+def _normalized(value: Any) -> Any:
+    return value.strip().lower() if isinstance(value, str) else value
+
+class ResponseCache:
+    """Bounded LRU of answers with a fixed time to live."""
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        bucket_seconds: int = RESPONSE_CACHE_BUCKET_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bucket_seconds = bucket_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, intent: Dict[str, Any], stats: Dict[str, Any]) -> str:
+        normalized = {
+            "device_id": intent.get("device_id"),
+            "device_ids": sorted(intent.get("device_ids") or []),
+            "order": _normalized(intent.get("order")),
+            "metric": _normalized(intent.get("metric")),
+            "time_period": _normalized(intent.get("time_period")),
+            "start": _bucket(intent.get("start_time"), self.bucket_seconds),
+            "end": _bucket(intent.get("end_time"), self.bucket_seconds),
+            "stats": stats,
+        }
+        encoded = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                MISSES.inc()
+                return None
+            self._entries.move_to_end(key)
+        HITS.inc()
+        return entry[1]
+
+    def put(self, key: str, answer: str) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+response_cache = ResponseCache()
@@ -4,6 +4,8 @@ from typing import Optional, Dict, Any
 class ChatQuery(BaseModel):
     text: str
     auth_token: str
+    # Raw readings (bounded) in addition to the downsampled series
+    include_raw: bool = False
 
 class ChatResponse(BaseModel):
     answer: str
@@ -0,0 +1,79 @@
+"""Shared HTTP client for calls from the chat service to the telemetry service.
+
+One ``httpx.AsyncClient`` lives for the lifetime of the app (opened and
+closed by the startup/shutdown hooks in ``main.py``), so requests reuse
+keep-alive connections instead of paying a TCP handshake each time.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_SERVICE_URL = os.getenv("TELEMETRY_SERVICE_URL", "http://localhost:8001")
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("TELEMETRY_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("TELEMETRY_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("TELEMETRY_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("TELEMETRY_HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("TELEMETRY_HTTP_CONNECT_TIMEOUT", "2"))
+# Retries of idempotent GETs on connection errors, timeouts and 502/503/504
+HTTP_RETRIES = int(os.getenv("TELEMETRY_HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("TELEMETRY_HTTP_RETRY_BACKOFF", "0.1"))
+# Needs the h2 package (pip install httpx[http2])
+HTTP2 = os.getenv("TELEMETRY_HTTP2", "false").lower() == "true"
+
+RETRY_STATUS_CODES = {502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+
+def create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=TELEMETRY_SERVICE_URL,
+        http2=HTTP2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    )
+
+def get_client() -> httpx.AsyncClient:
+    """The app-wide client; created on first use outside the app (scripts, tests)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def telemetry_get(
+    path: str,
+    auth_token: str,
+    params: Optional[Dict[str, Any]] = None
+) -> httpx.Response:
+    """GET ``path`` on the telemetry service as the user, retrying transient failures.
+
+    Parameters set to None are left out rather than sent empty.
+    """
+    params = {key: value for key, value in (params or {}).items() if value is not None}
+    headers = {"Authorization": f"Bearer {auth_token}"}
+
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            response = await get_client().get(path, params=params, headers=headers)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == HTTP_RETRIES:
+                return response
+        except httpx.TransportError:  # Includes connect and read timeouts
+            if attempt == HTTP_RETRIES:
+                raise
+        logger.warning("Retrying telemetry request %s (attempt %d)", path, attempt + 1)
+        await asyncio.sleep(HTTP_RETRY_BACKOFF * 2 ** attempt)
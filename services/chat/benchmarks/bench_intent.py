@@ -0,0 +1,106 @@
+"""Hit rate, accuracy and latency of the rule-based intent extractor.
+
+Runs every query in the labeled corpus (benchmarks/intent_corpus.json)
+through ``app.intent.parse_intent`` and reports:
+
+    hit rate:      queries answered locally (confidence at or above the threshold)
+    accuracy:      hits whose device(s), period, metric and order all match the label
+    false accepts: hits on queries labeled for the LLM ("llm": true)
+    latency:       per-query parse time, warm and with the device index rebuilt
+
+Misses would each have cost an LLM round trip instead.
+
+    python -m benchmarks.bench_intent --iterations 200 --verbose
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from app.intent import INTENT_MIN_CONFIDENCE, _device_index, parse_intent
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_corpus.json")
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+def is_correct(intent, label):
+    return (
+        intent["device_id"] == label["device_id"]
+        and intent["device_ids"] == label.get("device_ids")
+        and intent["time_period"] == label["time_period"]
+        and intent["metric"] == label["metric"]
+        and intent.get("order") == label.get("order")
+    )
+
+def evaluate(corpus):
+    """(hits, correct hits, false accepts, rows of (label, match)) for one pass."""
+    hits = correct = false_accepts = 0
+    rows = []
+    for label in corpus["queries"]:
+        match = parse_intent(label["query"], corpus["devices"])
+        rows.append((label, match))
+        if match.confidence < INTENT_MIN_CONFIDENCE:
+            continue
+        hits += 1
+        if label.get("llm"):
+            false_accepts += 1
+        elif is_correct(match.intent, label):
+            correct += 1
+    return hits, correct, false_accepts, rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--iterations", type=int, default=200, help="Timed passes over the corpus")
+    parser.add_argument("--verbose", action="store_true", help="Print every query and its outcome")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    queries = corpus["queries"]
+    hits, correct, false_accepts, rows = evaluate(corpus)
+    answerable = sum(1 for label in queries if not label.get("llm"))
+
+    def measure(cold):
+        samples = []
+        for _ in range(args.iterations):
+            for label in queries:
+                if cold:
+                    _device_index.cache_clear()
+                started = time.perf_counter()
+                parse_intent(label["query"], corpus["devices"])
+                samples.append((time.perf_counter() - started) * 1e6)
+        return samples
+
+    latencies = (("warm", measure(cold=False)), ("cold", measure(cold=True)))
+
+    if args.verbose:
+        for label, match in rows:
+            outcome = "miss" if match.confidence < INTENT_MIN_CONFIDENCE else (
+                "ok" if is_correct(match.intent, label) else "WRONG"
+            )
+            print(f"{outcome:>5} {match.confidence:.2f} {label['query']!r} -> {match.intent} {match.reasons}")
+        print()
+
+    print(
+        f"queries={len(queries)} answerable={answerable} devices={len(corpus['devices'])} "
+        f"threshold={INTENT_MIN_CONFIDENCE:g}"
+    )
+    print(f"hit rate       {hits / len(queries):>6.1%} ({hits}/{len(queries)})")
+    print(f"answerable hit {(hits - false_accepts) / answerable:>6.1%} ({hits - false_accepts}/{answerable})")
+    print(f"accuracy       {correct / hits if hits else 0:>6.1%} ({correct}/{hits})")
+    print(f"false accepts  {false_accepts:>6}")
+    for name, samples in latencies:
+        print(
+            f"latency {name:<6} mean {statistics.mean(samples):.1f}us p50 {statistics.median(samples):.1f}us "
+            f"p99 {percentile(samples, 0.99):.1f}us"
+        )
+
+if __name__ == "__main__":
+    main()
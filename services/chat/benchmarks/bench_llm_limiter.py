@@ -0,0 +1,93 @@
+"""Offline chat load test: where the time goes with the stub LLM backend.
+
+Runs ``process_query`` against the stub telemetry service from
+bench_telemetry_client and the stub LLM backend (no network, no API key),
+fires a burst of queries at once, and splits each LLM call into time
+spent waiting for a concurrency slot and time in the call itself, from the
+same metrics the service exports on /metrics:
+
+    python -m benchmarks.bench_llm_limiter --queries 100 --max-concurrency 8
+
+Questions the rule-based intent parser cannot answer go to the LLM twice
+(intent and answer), so half the queries here are of that kind.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.bench_telemetry_client import AUTH_TOKEN, STUB_HOST, free_port, percentile, start_stub
+
+QUESTIONS = (
+    "How much did the refrigerator use today?",
+    "Is the refrigerator costing me a lot?",
+)
+
+async def run(args):
+    from app.llm import process_query
+    from app.llm_providers import StubProvider, set_provider
+    from app.telemetry_client import close_client, telemetry_get
+
+    provider = StubProvider(
+        latency_ms=args.llm_latency_ms,
+        token_ms=args.llm_token_ms,
+        max_concurrency=args.max_concurrency,
+        record_path=None
+    )
+    set_provider(provider)
+    devices = (await telemetry_get("/api/devices", AUTH_TOKEN)).json()
+
+    async def one(i):
+        started = time.perf_counter()
+        await process_query(QUESTIONS[i % len(QUESTIONS)], devices, None, AUTH_TOKEN)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(args.queries)))
+    elapsed = time.perf_counter() - started
+    await close_client()
+    set_provider(None)
+    return provider, latencies, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100, help="Queries fired at once")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="LLM calls in flight at once")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-token-ms", type=float, default=5)
+    parser.add_argument("--telemetry-latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    port = free_port()
+    # Read at import time by the app modules; the response cache would absorb repeated questions
+    os.environ["TELEMETRY_SERVICE_URL"] = f"http://{STUB_HOST}:{port}"
+    os.environ["CHAT_RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+    server, thread = start_stub(port, args.telemetry_latency_ms / 1000, readings=60)
+    try:
+        provider, latencies, elapsed = asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    print(
+        f"queries={args.queries} max_concurrency={args.max_concurrency} "
+        f"llm={args.llm_latency_ms:g}ms+{args.llm_token_ms:g}ms/token telemetry={args.telemetry_latency_ms:g}ms"
+    )
+    print(
+        f"query latency  mean {statistics.mean(latencies):.0f}ms p50 {statistics.median(latencies):.0f}ms "
+        f"p99 {percentile(latencies, 0.99):.0f}ms  throughput {args.queries / elapsed:.1f} q/s"
+    )
+    for operation in ("intent", "answer"):
+        series = provider.metrics.series(operation)
+        calls = series["seconds"].count
+        if not calls:
+            continue
+        print(
+            f"llm {operation:<6} calls {calls:>4}  wait mean {series['wait_seconds'].sum / calls * 1000:>6.0f}ms  "
+            f"call mean {series['seconds'].sum / calls * 1000:>5.0f}ms  "
+            f"tokens {series['prompt_tokens'].value:.0f} in / {series['completion_tokens'].value:.0f} out"
+        )
+
+if __name__ == "__main__":
+    main()
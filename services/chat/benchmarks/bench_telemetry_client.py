@@ -0,0 +1,192 @@
+"""Latency of the chat service's telemetry calls against a local stub server.
+
+Starts a stub telemetry service that answers the device list, stats,
+series and raw telemetry endpoints after a fixed delay, then times the
+telemetry part of one chat query (device list, then stats and readings):
+
+    before: a new AsyncClient per call site, stats and raw readings one after the other
+    after:  the shared keep-alive client, stats and the downsampled series concurrently
+
+    python -m benchmarks.bench_telemetry_client --latency-ms 20 --queries 200 --concurrency 10
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+STUB_HOST = "127.0.0.1"
+DEVICE_ID = 1
+AUTH_TOKEN = "bench-token"
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((STUB_HOST, 0))
+        return sock.getsockname()[1]
+
+def create_stub_app(latency, readings):
+    stub = FastAPI()
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": i,
+            "device_id": DEVICE_ID,
+            "timestamp": (now - timedelta(minutes=i)).isoformat(),
+            "energy_watts": 100.0 + i % 50,
+            "created_at": now.isoformat(),
+        }
+        for i in range(readings)
+    ]
+
+    @stub.get("/api/devices")
+    async def devices():
+        await asyncio.sleep(latency)
+        return [{"id": DEVICE_ID, "name": "Refrigerator", "device_type": "Refrigerator"}]
+
+    @stub.get("/api/telemetry/{device_id}/stats")
+    async def stats(device_id: int, period: str = "24h"):
+        await asyncio.sleep(latency)
+        return {
+            "device_id": device_id,
+            "period": period,
+            "avg_energy_watts": 124.5,
+            "max_energy_watts": 149.0,
+            "min_energy_watts": 100.0,
+            "total_energy_watt_hours": 2988.0,
+        }
+
+    @stub.get("/api/telemetry/{device_id}/series")
+    async def series(device_id: int, max_points: int = 200):
+        await asyncio.sleep(latency)
+        points = [
+            {
+                "timestamp": row["timestamp"],
+                "energy_watts": row["energy_watts"],
+                "min_energy_watts": row["energy_watts"],
+                "max_energy_watts": row["energy_watts"],
+                "count": 1,
+            }
+            for row in rows[:max_points]
+        ]
+        return {"device_id": device_id, "resolution": "1m", "method": "bucket", "points": points}
+
+    @stub.get("/api/telemetry/{device_id}")
+    async def telemetry(device_id: int):
+        await asyncio.sleep(latency)
+        return rows
+
+    return stub
+
+def start_stub(port, latency, readings):
+    config = uvicorn.Config(
+        create_stub_app(latency, readings), host=STUB_HOST, port=port, log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+async def chat_path_before(base_url, intent):
+    # Previous implementation: fresh client per call site, sequential requests
+    headers = {"Authorization": f"Bearer {AUTH_TOKEN}"}
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{base_url}/api/devices", headers=headers)
+        response.json()
+
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            f"{base_url}/api/telemetry/{DEVICE_ID}/stats",
+            params={"period": intent["time_period"]},
+            headers=headers
+        )
+        response.json()
+        response = await client.get(
+            f"{base_url}/api/telemetry/{DEVICE_ID}",
+            params={"start_time": intent["start_time"], "end_time": intent["end_time"]},
+            headers=headers
+        )
+        response.json()
+
+async def chat_path_after(intent):
+    from app.llm import fetch_telemetry_data
+    from app.telemetry_client import telemetry_get
+
+    response = await telemetry_get("/api/devices", AUTH_TOKEN)
+    response.json()
+    data = await fetch_telemetry_data(intent, AUTH_TOKEN)
+    assert "error" not in data
+
+async def run_queries(path, queries, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await path()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await path()  # Warm up
+    await asyncio.gather(*(one() for _ in range(queries)))
+    return latencies
+
+async def run(args, base_url):
+    from app.telemetry_client import close_client
+
+    now = datetime.utcnow()
+    intent = {
+        "device_id": DEVICE_ID,
+        "time_period": "24h",
+        "start_time": (now - timedelta(hours=24)).isoformat(),
+        "end_time": now.isoformat(),
+    }
+    before = await run_queries(lambda: chat_path_before(base_url, intent), args.queries, args.concurrency)
+    after = await run_queries(lambda: chat_path_after(intent), args.queries, args.concurrency)
+    await close_client()
+    return before, after
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=20, help="Stub delay per request")
+    parser.add_argument("--readings", type=int, default=1440, help="Rows returned for raw telemetry")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    port = free_port()
+    base_url = f"http://{STUB_HOST}:{port}"
+    # Read by app.telemetry_client at import time
+    os.environ["TELEMETRY_SERVICE_URL"] = base_url
+    server, thread = start_stub(port, args.latency_ms / 1000, args.readings)
+    try:
+        before, after = asyncio.run(run(args, base_url))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    print(
+        f"stub latency={args.latency_ms:g}ms readings={args.readings} "
+        f"queries={args.queries} concurrency={args.concurrency}"
+    )
+    print(f"{'':>8} {'mean':>9} {'p50':>9} {'p99':>9}")
+    for name, samples in (("before", before), ("after", after)):
+        print(
+            f"{name:>8} {statistics.mean(samples):>7.1f}ms {statistics.median(samples):>7.1f}ms "
+            f"{percentile(samples, 0.99):>7.1f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
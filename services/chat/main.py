@@ -1,16 +1,22 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-import httpx
 import os
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 import json
+import logging
 
 from app.database import get_db, init_db
 from app.schemas import ChatQuery, ChatResponse
-from app.auth import get_current_user, User
-from app.llm import process_query, QueryResult
+from app.auth import get_current_user, revocations, User
+from app.llm import process_query, process_query_stream, QueryResult
+from app.llm_providers import close_provider, get_provider
+from app.telemetry_client import close_client, get_client, telemetry_get
+from shared.metrics import render_metrics
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Smart Home Chat Service",
@@ -27,32 +33,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Service URLs
-TELEMETRY_SERVICE_URL = os.getenv("TELEMETRY_SERVICE_URL", "http://localhost:8001")
-
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    # Open the shared telemetry client up front; it is reused by every request
+    get_client()
+    # Fail at startup on a misconfigured LLM backend (unknown name, missing recording)
+    get_provider()
+    revocations.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_client()
+    await close_provider()
+    await revocations.close()
+
+async def get_user_devices(auth_token: str) -> List[Dict[str, Any]]:
+    # Get user's devices from telemetry service
+    response = await telemetry_get("/api/devices", auth_token)
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to fetch devices"
+        )
+    
+    return response.json()
+
+def sse_event(event: str, payload: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
 
 @app.post("/api/chat/query", response_model=ChatResponse)
 async def query_energy_data(
     query: ChatQuery,
     current_user: User = Depends(get_current_user)
 ):
-    # Get user's devices from telemetry service
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{TELEMETRY_SERVICE_URL}/api/devices",
-            headers={"Authorization": f"Bearer {query.auth_token}"}
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to fetch devices"
-            )
-        
-        devices = response.json()
+    devices = await get_user_devices(query.auth_token)
     
     # Process the natural language query
     query_result = await process_query(
@@ -60,7 +76,7 @@ async def query_energy_data(
         devices,
         current_user,
         query.auth_token,
-        TELEMETRY_SERVICE_URL
+        query.include_raw
     )
     
     return ChatResponse(
@@ -70,19 +86,55 @@ async def query_energy_data(
         time_period=query_result.time_period
     )
 
+@app.post("/api/chat/query/stream")
+async def stream_energy_query(
+    query: ChatQuery,
+    current_user: User = Depends(get_current_user)
+):
+    # Fails with a normal error response; everything after this is streamed
+    devices = await get_user_devices(query.auth_token)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event, payload in process_query_stream(
+                query.text,
+                devices,
+                current_user,
+                query.auth_token,
+                query.include_raw
+            ):
+                yield sse_event(event, payload)
+        except Exception:
+            # Headers are already sent, so report the failure in the stream
+            logger.exception("Streaming chat query failed")
+            yield sse_event("error", {"detail": "Failed to answer the question"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/health")
 def health_check():
     try:
-        # Check if OpenAI API key is configured
-        if not os.getenv("OPENAI_API_KEY"):
+        provider = get_provider()
+        # Check if OpenAI API key is configured; the offline backends need none
+        if provider.name == "openai" and not os.getenv("OPENAI_API_KEY"):
             raise ValueError("OpenAI API key not configured")
-        return {"status": "healthy", "openai": "configured"}
+        return {"status": "healthy", "llm": provider.name}
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Service unhealthy: {str(e)}"
         )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text format: connection pool checkout wait, in use, overflow
+    return render_metrics()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002) 
\ No newline at end of file
@@ -0,0 +1,86 @@
+import json
+import httpx
+import pytest
+from app import llm
+from app.llm_providers import Completion, LLMProvider, set_provider
+from app.response_cache import response_cache
+
+class FakeLLM(LLMProvider):
+    """Stands in for the LLM backend; records the prompts it was sent.
+
+    ``content`` is the reply, or a function of the messages returning it.
+    """
+    name = "fake"
+
+    def __init__(self, content="{}"):
+        super().__init__(record_path=None)
+        self.content = content
+        self.calls = []
+
+    def reply(self, messages):
+        self.calls.append(messages)
+        return self.content(messages) if callable(self.content) else self.content
+
+    async def _complete(self, messages, operation):
+        text = self.reply(messages)
+        return Completion(text=text, prompt_tokens=10, completion_tokens=len(text.split()))
+
+    async def _stream(self, messages, operation):
+        # Word by word, like the API's content deltas
+        for i, word in enumerate(self.reply(messages).split(" ")):
+            yield word if i == 0 else " " + word
+
+    @property
+    def queries(self):
+        return [messages[-1]["content"] for messages in self.calls]
+
+class FakeTelemetry:
+    """Answers the chat service's telemetry requests from fixed payloads."""
+
+    def __init__(self):
+        self.stats = {
+            "device_id": 1,
+            "period": "24h",
+            "avg_energy_watts": 120.0,
+            "max_energy_watts": 150.0,
+            "min_energy_watts": 100.0,
+            "total_energy_watt_hours": 2880.0,
+        }
+        self.series = {"device_id": 1, "resolution": "1h", "method": "bucket", "points": []}
+        self.readings = []
+        self.device_stats = [
+            {**self.stats, "device_id": 1, "total_energy_watt_hours": 2880.0},
+            {**self.stats, "device_id": 2, "total_energy_watt_hours": 5400.0},
+            {**self.stats, "device_id": 3, "total_energy_watt_hours": 960.0},
+        ]
+        self.requests = []
+
+    async def get(self, path, auth_token, params=None):
+        self.requests.append((path, params))
+        if path == "/api/telemetry/stats":
+            ids = (params or {}).get("device_ids")
+            return httpx.Response(200, json=[s for s in self.device_stats if not ids or s["device_id"] in ids])
+        if path.endswith("/stats"):
+            return httpx.Response(200, json=self.stats)
+        if path.endswith("/series"):
+            return httpx.Response(200, json=self.series)
+        return httpx.Response(200, json=self.readings)
+
+@pytest.fixture
+def fake_llm():
+    fake = FakeLLM()
+    set_provider(fake)
+    yield fake
+    set_provider(None)
+
+@pytest.fixture
+def fake_telemetry(monkeypatch):
+    fake = FakeTelemetry()
+    monkeypatch.setattr(llm, "telemetry_get", fake.get)
+    return fake
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    response_cache.clear()
+    yield
+    response_cache.clear()
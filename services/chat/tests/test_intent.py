@@ -0,0 +1,61 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime, timedelta
+from app import llm
+from app.intent import INTENT_MIN_CONFIDENCE, parse_intent
+from benchmarks.bench_intent import is_correct, load_corpus
+
+CORPUS = load_corpus()
+
+DEVICES = CORPUS["devices"]
+
+@pytest.mark.parametrize("label", CORPUS["queries"], ids=lambda label: label["query"])
+def test_corpus_never_accepts_wrong_intent(label):
+    match = parse_intent(label["query"], DEVICES)
+    if label.get("llm"):
+        assert match.confidence < INTENT_MIN_CONFIDENCE
+    elif match.confidence >= INTENT_MIN_CONFIDENCE:
+        assert is_correct(match.intent, label)
+
+def test_corpus_hit_rate():
+    answerable = [label for label in CORPUS["queries"] if not label.get("llm")]
+    hits = [
+        label for label in answerable
+        if parse_intent(label["query"], DEVICES).confidence >= INTENT_MIN_CONFIDENCE
+    ]
+    assert len(hits) / len(answerable) >= 0.9
+
+def test_longer_device_name_wins():
+    match = parse_intent("how much did the bedroom ac use today", DEVICES)
+    assert match.intent["device_id"] == 6
+    assert match.confidence >= INTENT_MIN_CONFIDENCE
+
+def test_extract_intent_skips_llm_when_confident(fake_llm):
+    intent = asyncio.run(llm.extract_intent("How much did the fridge use yesterday?", DEVICES))
+    assert fake_llm.queries == []
+    assert intent["device_id"] == 1
+    assert intent["time_period"] == "yesterday"
+    assert intent["source"] == "rules"
+    assert intent["start_time"] < intent["end_time"]
+
+def test_extract_intent_falls_back_to_llm(fake_llm):
+    fake_llm.content = json.dumps({"device_id": 2, "time_period": "last week"})
+
+    query = "Is anything wasting power at night?"
+    intent = asyncio.run(llm.extract_intent(query, DEVICES))
+    assert fake_llm.queries == [query]
+    assert intent["device_id"] == 2
+    assert "start_time" in intent
+
+def test_time_window_is_the_calendar_window(fake_telemetry):
+    intent = asyncio.run(llm.extract_intent("How much did the refrigerator use yesterday?", DEVICES))
+    window = llm.time_window(intent)
+    start = datetime.fromisoformat(window["start_time"])
+    end = datetime.fromisoformat(window["end_time"])
+    assert end - start == timedelta(days=1)
+    assert end == datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    asyncio.run(llm.fetch_telemetry_data(intent, "token"))
+    requests = dict(fake_telemetry.requests)
+    assert requests["/api/telemetry/1/stats"] == window
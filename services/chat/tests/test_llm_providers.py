@@ -0,0 +1,117 @@
+import asyncio
+import json
+import pytest
+from app import llm
+from app.llm_providers import Completion, LLMProvider, ReplayProvider, StubProvider, set_provider
+from shared.metrics import render_metrics
+
+DEVICES = [
+    {"id": 1, "name": "Refrigerator", "device_type": "Refrigerator"},
+    {"id": 2, "name": "Dishwasher", "device_type": "Dishwasher"},
+]
+
+INTENT = {
+    "device_id": 1,
+    "time_period": "today",
+    "start_time": "2024-01-01T00:00:00",
+    "end_time": "2024-01-01T12:00:00",
+}
+
+STATS = {
+    "period": "24h",
+    "avg_energy_watts": 120.0,
+    "max_energy_watts": 150.0,
+    "min_energy_watts": 100.0,
+    "total_energy_watt_hours": 2880.0,
+}
+
+def intent_messages(question):
+    devices_info = "\n".join(f"- {d['name']} (ID: {d['id']}, Type: {d['device_type']})" for d in DEVICES)
+    return [
+        {"role": "system", "content": f"Available devices:\n{devices_info}\n"},
+        {"role": "user", "content": question},
+    ]
+
+async def collect(provider, messages, operation):
+    return "".join([piece async for piece in provider.stream(messages, operation)])
+
+def test_stub_replies_deterministically():
+    stub = StubProvider(latency_ms=0, token_ms=0, record_path=None)
+
+    intent = asyncio.run(stub.complete(intent_messages("Is the dishwasher on?"), "intent"))
+    assert json.loads(intent.text)["device_id"] == 2
+
+    messages = llm.answer_messages(INTENT, {"stats": STATS})
+    first = asyncio.run(stub.complete(messages, "answer"))
+    streamed = asyncio.run(collect(stub, messages, "answer"))
+    assert first.text == streamed
+    assert "2.88 kWh" in first.text
+    assert first.completion_tokens > 1
+
+def test_replay_serves_recorded_responses(tmp_path):
+    path = tmp_path / "recording.jsonl"
+    stub = StubProvider(latency_ms=0, token_ms=0, record_path=str(path))
+    messages = llm.answer_messages(INTENT, {"stats": STATS})
+    recorded = asyncio.run(stub.complete(messages, "answer")).text
+
+    replay = ReplayProvider(str(path))
+    # The resolved window moves between runs; recordings still match
+    later = dict(INTENT, start_time="2024-02-01T00:00:00", end_time="2024-02-01T12:00:00")
+    replayed = llm.answer_messages(later, {"stats": STATS})
+    assert asyncio.run(replay.complete(replayed, "answer")).text == recorded
+    assert asyncio.run(collect(replay, replayed, "answer")) == recorded
+
+    with pytest.raises(LookupError):
+        asyncio.run(replay.complete(intent_messages("hello"), "intent"))
+
+def test_concurrency_limit_queues_bursts():
+    class Slow(LLMProvider):
+        name = "slow"
+
+        def __init__(self):
+            super().__init__(max_concurrency=2, record_path=None)
+            self.active = self.peak = 0
+
+        async def _complete(self, messages, operation):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            return Completion(text="ok", prompt_tokens=3, completion_tokens=1)
+
+    provider = Slow()
+    wait = provider.metrics.series("answer")["wait_seconds"]
+    waits_before = wait.count
+
+    async def burst():
+        await asyncio.gather(*(provider.complete([{"role": "user", "content": "hi"}], "answer") for _ in range(6)))
+
+    asyncio.run(burst())
+    assert provider.peak == 2
+    assert wait.count - waits_before == 6
+    assert wait.sum > 0
+
+def test_calls_are_instrumented():
+    stub = StubProvider(latency_ms=0, token_ms=0, record_path=None)
+    series = stub.metrics.series("answer")
+    calls, completion_tokens = series["seconds"].count, series["completion_tokens"].value
+
+    messages = llm.answer_messages(INTENT, {"stats": STATS})
+    asyncio.run(stub.complete(messages, "answer"))
+    asyncio.run(collect(stub, messages, "answer"))
+
+    assert series["seconds"].count - calls == 2
+    assert series["first_token_seconds"].count >= 1
+    assert series["completion_tokens"].value > completion_tokens
+    rendered = render_metrics()
+    assert 'chat_llm_request_seconds_count{provider="stub",operation="answer"}' in rendered
+    assert 'chat_llm_tokens_total{provider="stub",operation="answer",type="prompt"}' in rendered
+
+def test_process_query_runs_offline_with_stub(fake_telemetry):
+    set_provider(StubProvider(latency_ms=0, token_ms=0, record_path=None))
+    try:
+        result = asyncio.run(llm.process_query("Is the dishwasher costing me a lot?", DEVICES, None, "token"))
+    finally:
+        set_provider(None)
+    assert result.device_id == 2
+    assert "kWh" in result.answer
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from app import llm
+from app.response_cache import HITS, MISSES, ResponseCache, response_cache
+
+DEVICES = [
+    {"id": 1, "name": "Refrigerator", "device_type": "Refrigerator"},
+    {"id": 2, "name": "Dishwasher", "device_type": "Dishwasher"},
+]
+
+def ask(text):
+    return asyncio.run(llm.process_query(text, DEVICES, None, "token"))
+
+def answer_calls(fake_llm):
+    return [messages for messages in fake_llm.calls if messages[-1]["content"].startswith("\nIntent:")]
+
+def test_repeated_question_reuses_answer(fake_llm, fake_telemetry):
+    fake_llm.content = "The fridge used 2.9 kWh."
+    hits, misses = HITS.value, MISSES.value
+
+    first = ask("How much did the fridge use today?")
+    # Different wording, same device, period and metric
+    second = ask("fridge energy usage today")
+    assert first.answer == second.answer == "The fridge used 2.9 kWh."
+    assert len(answer_calls(fake_llm)) == 1
+    assert (HITS.value - hits, MISSES.value - misses) == (1, 1)
+
+def test_changed_stats_miss_the_cache(fake_llm, fake_telemetry):
+    fake_llm.content = lambda messages: f"answer {len(fake_llm.calls)}"
+
+    first = ask("How much did the fridge use today?")
+    fake_telemetry.stats = dict(fake_telemetry.stats, total_energy_watt_hours=3000.0)
+    second = ask("How much did the fridge use today?")
+    assert first.answer != second.answer
+    assert len(answer_calls(fake_llm)) == 2
+
+def test_different_intents_do_not_share_answers(fake_llm, fake_telemetry):
+    ask("How much did the fridge use today?")
+    ask("How much did the dishwasher use today?")
+    ask("What was the fridge's peak today?")
+    ask("How much did the fridge use yesterday?")
+    assert len(answer_calls(fake_llm)) == 4
+
+def test_errors_are_not_cached(fake_llm, fake_telemetry):
+    ask("How much did the microwave use yesterday?")
+    assert len(response_cache) == 0
+
+def test_entries_expire():
+    cache = ResponseCache(max_entries=10, ttl_seconds=0.05)
+    key = cache.key({"device_id": 1, "time_period": "today"}, {"total": 1})
+    cache.put(key, "answer")
+    assert cache.get(key) == "answer"
+    time.sleep(0.06)
+    assert cache.get(key) is None
+
+def test_size_bound_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    keys = [cache.key({"device_id": device_id}, {}) for device_id in (1, 2, 3)]
+    cache.put(keys[0], "one")
+    cache.put(keys[1], "two")
+    cache.get(keys[0])
+    cache.put(keys[2], "three")
+    assert len(cache) == 2
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == "one"
+
+def test_window_bucket_groups_nearby_times():
+    cache = ResponseCache(bucket_seconds=300)
+    intent = {"device_id": 1, "time_period": "today", "metric": "consumption"}
+    at = lambda end: dict(intent, start_time="2024-01-01T00:00:00", end_time=end)
+    assert cache.key(at("2024-01-01T10:01:00"), {}) == cache.key(at("2024-01-01T10:04:59"), {})
+    assert cache.key(at("2024-01-01T10:04:59"), {}) != cache.key(at("2024-01-01T10:05:00"), {})
+
+def test_key_distinguishes_device_sets_and_order():
+    cache = ResponseCache()
+    stats = {"devices": []}
+    ranking = {"device_ids": None, "metric": "ranking", "time_period": "today"}
+    assert cache.key({**ranking, "order": "desc"}, stats) != cache.key({**ranking, "order": "asc"}, stats)
+    comparison = {"metric": "comparison", "time_period": "today"}
+    assert cache.key({**comparison, "device_ids": [1, 2]}, stats) == cache.key({**comparison, "device_ids": [2, 1]}, stats)
+    assert cache.key({**comparison, "device_ids": [1, 2]}, stats) != cache.key({**comparison, "device_ids": [1, 3]}, stats)
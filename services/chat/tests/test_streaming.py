@@ -0,0 +1,70 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+import httpx
+from fastapi.testclient import TestClient
+from jose import jwt
+import main
+from app.auth import ALGORITHM, SECRET_KEY
+
+DEVICES = [{"id": 1, "name": "Refrigerator", "device_type": "Refrigerator"}]
+
+TOKEN = jwt.encode(
+    {"sub": "test@example.com", "user_id": 1, "exp": datetime.utcnow() + timedelta(hours=1)},
+    SECRET_KEY,
+    algorithm=ALGORITHM
+)
+
+@pytest.fixture
+def client(monkeypatch, fake_telemetry):
+    async def get_devices(path, auth_token, params=None):
+        return httpx.Response(200, json=DEVICES)
+
+    monkeypatch.setattr(main, "telemetry_get", get_devices)
+    return TestClient(main.app)
+
+def stream_events(client, text):
+    response = client.post(
+        "/api/chat/query/stream",
+        json={"text": text, "auth_token": TOKEN},
+        headers={"Authorization": f"Bearer {TOKEN}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+def test_stream_emits_intent_stats_then_tokens(client, fake_llm):
+    fake_llm.content = "The fridge used 2.9 kWh today."
+    events = stream_events(client, "How much did the fridge use today?")
+
+    names = [name for name, _ in events]
+    assert names[:2] == ["intent", "stats"]
+    assert names[-1] == "done"
+    assert set(names[2:-1]) == {"token"}
+    assert len(names[2:-1]) > 1
+
+    assert events[0][1]["device_id"] == 1
+    assert events[1][1]["stats"]["total_energy_watt_hours"] == 2880.0
+    streamed = "".join(payload["text"] for name, payload in events if name == "token")
+    assert streamed == events[-1][1]["answer"] == "The fridge used 2.9 kWh today."
+
+def test_stream_serves_cached_answer_in_one_piece(client, fake_llm):
+    fake_llm.content = "The fridge used 2.9 kWh today."
+    stream_events(client, "How much did the fridge use today?")
+    events = stream_events(client, "fridge usage today")
+
+    tokens = [payload["text"] for name, payload in events if name == "token"]
+    assert tokens == ["The fridge used 2.9 kWh today."]
+    assert len(fake_llm.calls) == 1
+
+def test_stream_reports_failures_as_events(client, fake_llm):
+    def fail(messages):
+        raise RuntimeError("provider down")
+
+    fake_llm.content = fail
+    events = stream_events(client, "How much did the fridge use today?")
+    assert [name for name, _ in events] == ["intent", "stats", "error"]
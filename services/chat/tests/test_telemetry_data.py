@@ -0,0 +1,59 @@
+import asyncio
+from app import llm
+
+INTENT = {
+    "device_id": 1,
+    "time_period": "last month",
+    "start_time": "2024-01-01T00:00:00",
+    "end_time": "2024-01-31T00:00:00",
+}
+WINDOW = {"start_time": INTENT["start_time"], "end_time": INTENT["end_time"]}
+
+def test_fetches_bounded_series_instead_of_raw_rows(fake_telemetry):
+    data = asyncio.run(llm.fetch_telemetry_data(INTENT, "token"))
+
+    assert set(data) == {"stats", "series"}
+    requests = dict(fake_telemetry.requests)
+    assert set(requests) == {"/api/telemetry/1/stats", "/api/telemetry/1/series"}
+    assert requests["/api/telemetry/1/stats"] == WINDOW
+    series_params = requests["/api/telemetry/1/series"]
+    assert series_params["max_points"] == llm.SERIES_MAX_POINTS
+    assert series_params["start_time"] == INTENT["start_time"]
+
+def test_raw_rows_only_when_asked_and_capped(fake_telemetry):
+    fake_telemetry.readings = [{"timestamp": "2024-01-30T23:59:00", "energy_watts": 100.0}]
+    data = asyncio.run(llm.fetch_telemetry_data(INTENT, "token", include_raw=True))
+
+    assert data["telemetry"] == fake_telemetry.readings
+    requests = dict(fake_telemetry.requests)
+    assert requests["/api/telemetry/1"]["limit"] == llm.RAW_MAX_ROWS
+
+DEVICES = [
+    {"id": 1, "name": "Refrigerator"},
+    {"id": 2, "name": "Air Conditioner"},
+    {"id": 3, "name": "Washing Machine"},
+]
+
+def test_comparison_fetches_all_devices_in_one_call(fake_telemetry):
+    intent = {**INTENT, "device_id": None, "device_ids": [1, 3], "metric": "comparison"}
+    data = asyncio.run(llm.fetch_telemetry_data(intent, "token", devices=DEVICES))
+
+    assert fake_telemetry.requests == [("/api/telemetry/stats", {**WINDOW, "device_ids": [1, 3]})]
+    assert [(s["device_id"], s["device_name"]) for s in data["device_stats"]] == [
+        (1, "Refrigerator"), (3, "Washing Machine")
+    ]
+    assert data["total_energy_watt_hours"] == 3840.0
+
+def test_ranking_covers_every_device_in_requested_order(fake_telemetry):
+    intent = {**INTENT, "device_id": None, "device_ids": None, "metric": "ranking", "order": "asc"}
+    data = asyncio.run(llm.fetch_telemetry_data(intent, "token", devices=DEVICES))
+
+    assert fake_telemetry.requests == [("/api/telemetry/stats", WINDOW)]
+    assert [s["device_id"] for s in data["device_stats"]] == [3, 1, 2]
+
+def test_single_device_comparison_uses_device_stats(fake_telemetry):
+    intent = {**INTENT, "metric": "comparison"}
+    data = asyncio.run(llm.fetch_telemetry_data(intent, "token", devices=DEVICES))
+
+    assert "device_stats" not in data
+    assert "/api/telemetry/1/stats" in dict(fake_telemetry.requests)
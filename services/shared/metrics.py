@@ -0,0 +1,146 @@
+"""Minimal in-process metrics rendered in the Prometheus text format.
+
+Each service exposes ``render_metrics()`` on ``GET /metrics``. Metrics are
+registered once at import time and identified by name plus a fixed set of
+labels, so the same histogram can be created per pool, per endpoint, etc.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; tuned for request and connection-checkout latencies
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+_registry: List["Metric"] = []
+_registry_lock = threading.Lock()
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = dict(labels or {})
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Optional[Dict[str, str]] = None):
+        super().__init__(name, documentation, labels)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+class Gauge(Metric):
+    """A value that is set directly, or read from ``function`` at render time."""
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Dict[str, str]] = None,
+        function: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, documentation, labels)
+        self.value = 0.0
+        self.function = function
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def samples(self):
+        value = self.function() if self.function else self.value
+        return [(self.name, self.labels, value)]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given quantile (inf if past the last bucket)."""
+        with self._lock:
+            target = fraction * self.count
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+                cumulative += count
+                if cumulative >= target and cumulative:
+                    return bound
+        return 0.0
+
+    def samples(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            samples.append((f"{self.name}_bucket", {**self.labels, "le": le}, cumulative))
+        samples.append((f"{self.name}_sum", self.labels, total))
+        samples.append((f"{self.name}_count", self.labels, count))
+        return samples
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+
+    lines = []
+    described = set()
+    for metric in sorted(metrics, key=lambda metric: metric.name):
+        if metric.name not in described:
+            described.add(metric.name)
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
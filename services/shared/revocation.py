@@ -0,0 +1,202 @@
+"""Revoked access tokens, as a snapshot every service checks in memory.
+
+The auth service publishes the current revocations on
+``GET /api/auth/revocations``; telemetry and chat poll it every
+``REVOCATION_POLL_SECONDS`` with ``If-None-Match`` and keep the latest
+snapshot, so a request is checked against it without any network call.
+
+A snapshot has two parts:
+
+    filter:  a bloom filter of the ``jti`` of every access token revoked
+             one by one (logout) and not yet expired
+    floors:  for users who revoked all their tokens, the lowest token
+             version (``ver`` claim) still valid
+
+Bloom filters have no false negatives: a revoked token is always refused.
+A valid token is refused with probability ``REVOCATION_FALSE_POSITIVE_RATE``
+(sized per snapshot); its client then refreshes and gets a new ``jti``.
+Floors are exact, since a false positive there would lock a user out until
+their next version bump. Revocations take effect downstream within one
+poll interval; until the first snapshot arrives no token is refused.
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+
+from .metrics import Counter, Gauge
+
+AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://localhost:8000")
+REVOCATION_POLL_SECONDS = float(os.getenv("REVOCATION_POLL_SECONDS", "5"))
+REVOCATION_FALSE_POSITIVE_RATE = float(os.getenv("REVOCATION_FALSE_POSITIVE_RATE", "0.0001"))
+# Smallest filter published, so an almost empty list still hides how many entries it has
+MIN_FILTER_BITS = 1024
+
+REVOCATIONS_PATH = "/api/auth/revocations"
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings, using double hashing of one BLAKE2b digest."""
+
+    def __init__(self, size_bits: int, hashes: int, bits: Optional[bytearray] = None):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((size_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float = REVOCATION_FALSE_POSITIVE_RATE) -> "BloomFilter":
+        capacity = max(capacity, 1)
+        size_bits = max(
+            MIN_FILTER_BITS,
+            math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        )
+        hashes = max(1, round(size_bits / capacity * math.log(2)))
+        return cls(size_bits, hashes)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size_bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class RevocationSnapshot:
+    def __init__(self, filter: BloomFilter, floors: Dict[int, int], count: int = 0):
+        self.filter = filter
+        self.floors = floors
+        self.count = count
+        self.etag = self._etag()
+
+    @classmethod
+    def build(
+        cls,
+        token_ids: Iterable[str],
+        floors: Dict[int, int],
+        capacity: int = 0
+    ) -> "RevocationSnapshot":
+        """A snapshot whose filter keeps its false positive rate up to ``capacity`` entries."""
+        token_ids = list(token_ids)
+        bloom = BloomFilter.for_capacity(max(len(token_ids), capacity))
+        for token_id in token_ids:
+            bloom.add(token_id)
+        return cls(bloom, dict(floors), len(token_ids))
+
+    def extend(self, token_ids: Iterable[str], floors: Dict[int, int]) -> "RevocationSnapshot":
+        """A new snapshot with more entries, in a copy of this filter; entries already in it are skipped."""
+        bloom = BloomFilter(self.filter.size_bits, self.filter.hashes, bytearray(self.filter.bits))
+        count = self.count
+        for token_id in token_ids:
+            if token_id not in bloom:
+                bloom.add(token_id)
+                count += 1
+        merged = dict(self.floors)
+        for user_id, floor in floors.items():
+            merged[user_id] = max(merged.get(user_id, floor), floor)
+        return RevocationSnapshot(bloom, merged, count)
+
+    def is_revoked(self, token_id: Optional[str], user_id: int, version: Optional[int]) -> bool:
+        floor = self.floors.get(user_id)
+        if floor is not None and (version or 0) < floor:
+            return True
+        return token_id is not None and token_id in self.filter
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "etag": self.etag,
+            "count": self.count,
+            "size_bits": self.filter.size_bits,
+            "hashes": self.filter.hashes,
+            "bits": base64.b64encode(bytes(self.filter.bits)).decode(),
+            # JSON object keys are strings
+            "floors": {str(user_id): floor for user_id, floor in self.floors.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RevocationSnapshot":
+        bloom = BloomFilter(data["size_bits"], data["hashes"], bytearray(base64.b64decode(data["bits"])))
+        floors = {int(user_id): floor for user_id, floor in data["floors"].items()}
+        return cls(bloom, floors, data.get("count", 0))
+
+    def _etag(self) -> str:
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(f"{self.filter.size_bits}:{self.filter.hashes}:".encode())
+        digest.update(self.filter.bits)
+        digest.update(repr(sorted(self.floors.items())).encode())
+        return digest.hexdigest()
+
+EMPTY_SNAPSHOT = RevocationSnapshot.build([], {})
+
+class RevocationPoller:
+    """Keeps the latest snapshot from the auth service in memory."""
+
+    def __init__(
+        self,
+        service: str,
+        url: str = AUTH_SERVICE_URL,
+        interval_seconds: float = REVOCATION_POLL_SECONDS
+    ):
+        self.url = url.rstrip("/") + REVOCATIONS_PATH
+        self.interval_seconds = interval_seconds
+        self.snapshot = EMPTY_SNAPSHOT
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        labels = {"service": service}
+        self._errors = Counter("revocation_poll_errors_total", "Failed revocation snapshot polls", labels)
+        self._entries = Gauge(
+            "revocation_snapshot_entries", "Revoked token ids in the current snapshot", labels,
+            function=lambda: self.snapshot.count
+        )
+        self._age = Gauge(
+            "revocation_snapshot_age_seconds", "Seconds since the snapshot was last confirmed current", labels,
+            function=lambda: time.monotonic() - self.loaded_at if self.loaded_at is not None else -1
+        )
+
+    def is_revoked(self, token_id: Optional[str], user_id: int, version: Optional[int]) -> bool:
+        return self.snapshot.is_revoked(token_id, user_id, version)
+
+    async def poll(self, client: httpx.AsyncClient) -> bool:
+        """Fetch the snapshot if it changed; True when the current one is confirmed."""
+        try:
+            response = await client.get(self.url, headers={"If-None-Match": f'"{self.snapshot.etag}"'})
+            if response.status_code == 200:
+                self.snapshot = RevocationSnapshot.from_dict(response.json())
+            elif response.status_code != 304:
+                raise ValueError(f"unexpected status {response.status_code}")
+        except Exception as e:
+            # Keep enforcing the last snapshot; its age shows on /metrics
+            self._errors.inc()
+            logger.warning("Revocation snapshot poll failed: %s", e)
+            return False
+        self.loaded_at = time.monotonic()
+        return True
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        async with httpx.AsyncClient(timeout=self.interval_seconds) as client:
+            while True:
+                await self.poll(client)
+                await asyncio.sleep(self.interval_seconds)
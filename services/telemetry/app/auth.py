@@ -2,39 +2,124 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel
+from collections import OrderedDict
+import hashlib
 import os
-from typing import Optional
+import threading
+import time
+from typing import Optional, Tuple
+
+from shared.revocation import RevocationPoller
 
 # JWT configuration
 SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
 ALGORITHM = "HS256"
 
+# Verified tokens kept in memory; entries expire with the token's own exp claim
+TOKEN_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+# Upper bound for tokens issued without an exp claim
+TOKEN_CACHE_MAX_TTL_SECONDS = float(os.getenv("JWT_CACHE_MAX_TTL_SECONDS", "300"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# Latest revocation snapshot from the auth service, polled in the background
+revocations = RevocationPoller("telemetry")
+
 class User(BaseModel):
     id: int
     email: str
     full_name: Optional[str] = None
+    # jti and ver claims, checked against the revocation snapshot
+    token_id: Optional[str] = None
+    token_version: Optional[int] = None
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    credentials_exception = HTTPException(
+class TokenCache:
+    """Bounded LRU of verified tokens, keyed by a hash so raw tokens are not kept."""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[float, User]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[User]:
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def put(self, token: str, user: User, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[self.key(token)] = (expires_at, user)
+            self._entries.move_to_end(self.key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache()
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def decode_token(token: str) -> Tuple[User, float]:
+    """Verify the token signature and claims; returns the user and when to stop trusting it."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        
-        # For simplicity, we're extracting user info from the token
-        # In a production environment, you might want to validate against the auth service
-        user_id = payload.get("user_id", 0)  # Default to 0 if not found
-        full_name = payload.get("full_name")
-        
-        return User(id=user_id, email=email, full_name=full_name)
-        
     except JWTError:
-        raise credentials_exception 
\ No newline at end of file
+        raise _credentials_exception()
+
+    email: str = payload.get("sub")
+    if email is None:
+        raise _credentials_exception()
+
+    # The auth service puts the user's id and name in the token, so no lookup is needed;
+    # tokens from before it did have no user_id and must be renewed by logging in again
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise _credentials_exception()
+    full_name = payload.get("full_name")
+
+    expires_at = time.time() + TOKEN_CACHE_MAX_TTL_SECONDS
+    if "exp" in payload:
+        expires_at = min(expires_at, float(payload["exp"]))
+    user = User(
+        id=user_id,
+        email=email,
+        full_name=full_name,
+        token_id=payload.get("jti"),
+        token_version=payload.get("ver")
+    )
+    return user, expires_at
+
+def verify_token(token: str) -> User:
+    """``decode_token`` behind the verified-token cache; failures are never cached."""
+    user = token_cache.get(token)
+    if user is None:
+        user, expires_at = decode_token(token)
+        token_cache.put(token, user, expires_at)
+    # Cached or not, a token revoked since is refused; the check is in memory
+    if revocations.is_revoked(user.token_id, user.id, user.token_version):
+        raise _credentials_exception()
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    return verify_token(token)
@@ -0,0 +1,28 @@
+-- Create devices table
+CREATE TABLE IF NOT EXISTS devices (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    device_type VARCHAR NOT NULL,
+    user_id INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS ix_devices_id ON devices(id);
+
+-- Create telemetry table, range-partitioned by month on timestamp.
+-- The primary key has to include the partition key.
+CREATE TABLE IF NOT EXISTS telemetry (
+    id SERIAL,
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+    energy_watts DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Create composite index used by every per-device range query
+CREATE INDEX IF NOT EXISTS ix_telemetry_device_timestamp ON telemetry(device_id, timestamp);
+
+-- Catch readings outside the monthly partitions created by app/partitions.py
+CREATE TABLE IF NOT EXISTS telemetry_default PARTITION OF telemetry DEFAULT;
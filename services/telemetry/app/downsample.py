@@ -0,0 +1,174 @@
+"""Downsampling of chart series to a bounded number of points.
+
+Series are reduced from the coarsest rollup that still has at least
+``max_points`` buckets in the range, or from the minute rollup when none
+does, so the work and payload depend on ``max_points`` and the range rather
+than the sampling rate. Only sub-minute ranges read raw readings.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .models import Telemetry
+from .rollups import GRANULARITIES, Granularity, rollup_series
+from .stats import to_utc_naive
+
+METHODS = ("lttb", "bucket")
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of the points to keep.
+
+    Buckets are chosen sequentially (each depends on the previous pick), but
+    the triangle areas within a bucket are computed in one vectorized step.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Interior points 1..n-2 split into threshold-2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    anchor = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i == threshold - 3:
+            next_x, next_y = x[n - 1], y[n - 1]
+        else:
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+
+        areas = np.abs(
+            (x[anchor] - next_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (next_y - y[anchor])
+        )
+        anchor = start + int(np.argmax(areas))
+        selected[i + 1] = anchor
+    return selected
+
+def bucket_aggregate(
+    x: np.ndarray,
+    count: np.ndarray,
+    total: np.ndarray,
+    minimum: np.ndarray,
+    maximum: np.ndarray,
+    start: float,
+    end: float,
+    n_buckets: int
+) -> Dict[str, np.ndarray]:
+    """Fold sorted (x, count, sum, min, max) rows into ``n_buckets`` equal-width buckets.
+
+    Empty buckets are omitted from the result.
+    """
+    width = max((end - start) / n_buckets, 1e-9)
+    index = np.clip(((x - start) // width).astype(np.int64), 0, n_buckets - 1)
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+
+    counts = np.add.reduceat(count, starts)
+    return {
+        "x": start + index[starts] * width,
+        "count": counts,
+        "avg": np.add.reduceat(total, starts) / counts,
+        "min": np.minimum.reduceat(minimum, starts),
+        "max": np.maximum.reduceat(maximum, starts),
+    }
+
+def pick_source(start_time: datetime, end_time: datetime, max_points: int) -> Optional[Granularity]:
+    """Coarsest rollup with at least ``max_points`` buckets in the range.
+
+    Falls back to the finest rollup, and to None (raw readings) only for
+    ranges shorter than one of its buckets.
+    """
+    span = end_time - start_time
+    for granularity in reversed(GRANULARITIES):
+        if span / granularity.width >= max_points:
+            return granularity
+    if span >= GRANULARITIES[0].width:
+        return GRANULARITIES[0]
+    return None
+
+def downsample_series(
+    db: Session,
+    device_ids: Sequence[int],
+    start_time: datetime,
+    end_time: datetime,
+    max_points: int,
+    method: str = "lttb",
+    source: Optional[Granularity] = None
+) -> Dict[int, List[Dict[str, Any]]]:
+    """Series points per device, at most ``max_points`` each, fetched in one query."""
+    if source is None:
+        columns = _raw_columns(db, device_ids, start_time, end_time)
+    else:
+        columns = _rollup_columns(db, device_ids, source, start_time, end_time)
+
+    start = _seconds(to_utc_naive(start_time))
+    end = _seconds(to_utc_naive(end_time))
+    series = {}
+    for device_id, (x, count, total, minimum, maximum) in columns.items():
+        if method == "lttb":
+            avg = total / count
+            keep = lttb_indices(x, avg, max_points)
+            points = {
+                "x": x[keep], "count": count[keep], "avg": avg[keep],
+                "min": minimum[keep], "max": maximum[keep],
+            }
+        else:
+            points = bucket_aggregate(x, count, total, minimum, maximum, start, end, max_points)
+
+        series[device_id] = [
+            {
+                "timestamp": datetime(1970, 1, 1) + timedelta(seconds=float(timestamp)),
+                "energy_watts": float(avg),
+                "min_energy_watts": float(low),
+                "max_energy_watts": float(high),
+                "count": int(n),
+            }
+            for timestamp, avg, low, high, n in zip(
+                points["x"], points["avg"], points["min"], points["max"], points["count"]
+            )
+        ]
+    return series
+
+def _seconds(value: datetime) -> float:
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+def _raw_columns(db: Session, device_ids: Sequence[int], start_time: datetime, end_time: datetime):
+    rows = db.query(Telemetry.device_id, Telemetry.timestamp, Telemetry.energy_watts).filter(
+        Telemetry.device_id.in_(device_ids),
+        Telemetry.timestamp >= start_time,
+        Telemetry.timestamp <= end_time
+    ).order_by(Telemetry.device_id, Telemetry.timestamp, Telemetry.id).all()
+
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row.device_id].append((_seconds(to_utc_naive(row.timestamp)), row.energy_watts))
+
+    columns = {}
+    for device_id, points in grouped.items():
+        x, y = (np.array(values, dtype=float) for values in zip(*points))
+        columns[device_id] = (x, np.ones_like(y), y, y, y)
+    return columns
+
+def _rollup_columns(
+    db: Session,
+    device_ids: Sequence[int],
+    source: Granularity,
+    start_time: datetime,
+    end_time: datetime
+):
+    columns = {}
+    for device_id, rows in rollup_series(db, device_ids, source, start_time, end_time).items():
+        columns[device_id] = (
+            np.array([_seconds(to_utc_naive(row.bucket_start)) for row in rows]),
+            np.array([row.count for row in rows], dtype=float),
+            np.array([row.sum_energy_watts for row in rows]),
+            np.array([row.min_energy_watts for row in rows]),
+            np.array([row.max_energy_watts for row in rows]),
+        )
+    return columns
@@ -0,0 +1,75 @@
+import csv
+import io
+import os
+from datetime import timezone
+from typing import Any, Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import Telemetry
+
+# Upper bound on readings accepted by a single batch request
+BATCH_MAX_ROWS = int(os.getenv("TELEMETRY_BATCH_MAX_ROWS", "10000"))
+
+COPY_TELEMETRY_SQL = (
+    "COPY telemetry (device_id, timestamp, energy_watts) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+def insert_telemetry_rows(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Write telemetry rows in a single statement inside the caller's transaction.
+
+    PostgreSQL gets a COPY; other dialects fall back to one multi-row INSERT.
+    The caller is responsible for committing.
+    """
+    if not rows:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        _copy_rows(db, rows)
+    else:
+        db.execute(insert(Telemetry), rows)
+
+async def insert_telemetry_rows_async(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Async counterpart of ``insert_telemetry_rows`` (asyncpg binary COPY on PostgreSQL)."""
+    if not rows:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        # Naive timestamps are UTC by convention; asyncpg would read them as local time
+        await raw_connection.driver_connection.copy_records_to_table(
+            "telemetry",
+            records=[
+                (
+                    row["device_id"],
+                    row["timestamp"] if row["timestamp"].tzinfo else row["timestamp"].replace(tzinfo=timezone.utc),
+                    float(row["energy_watts"])
+                )
+                for row in rows
+            ],
+            columns=["device_id", "timestamp", "energy_watts"]
+        )
+    else:
+        await db.execute(insert(Telemetry), rows)
+
+def _copy_rows(db: Session, rows: List[Dict[str, Any]]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((
+            row["device_id"],
+            row["timestamp"].isoformat(),
+            repr(float(row["energy_watts"]))
+        ))
+    buffer.seek(0)
+
+    # Reuse the session's connection so the COPY joins its transaction
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(COPY_TELEMETRY_SQL, buffer)
+    finally:
+        cursor.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -14,9 +14,37 @@ class Device(Base):
 
 class Telemetry(Base):
     __tablename__ = "telemetry"
+    __table_args__ = (
+        # Serves every per-device time range query; on PostgreSQL the table is
+        # also range-partitioned by month (see app/database/init.sql)
+        Index("ix_telemetry_device_timestamp", "device_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
     timestamp = Column(DateTime(timezone=True), nullable=False)
     energy_watts = Column(Float, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now()) 
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class TelemetryRollupMixin:
+    device_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    count = Column(Integer, nullable=False)
+    sum_energy_watts = Column(Float, nullable=False)
+    min_energy_watts = Column(Float, nullable=False)
+    max_energy_watts = Column(Float, nullable=False)
+    first_timestamp = Column(DateTime(timezone=True), nullable=False)
+    first_energy_watts = Column(Float, nullable=False)
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+    last_energy_watts = Column(Float, nullable=False)
+    # Trapezoidal energy between consecutive readings inside the bucket
+    energy_watt_hours = Column(Float, nullable=False)
+
+class TelemetryRollupMinute(TelemetryRollupMixin, Base):
+    __tablename__ = "telemetry_rollup_1m"
+
+class TelemetryRollupHour(TelemetryRollupMixin, Base):
+    __tablename__ = "telemetry_rollup_1h"
+
+class TelemetryRollupDay(TelemetryRollupMixin, Base):
+    __tablename__ = "telemetry_rollup_1d"
@@ -0,0 +1,92 @@
+"""Per-user cache of owned device ids for the ownership checks in every handler.
+
+Devices are never deleted or handed to another user, so a cached "owned"
+answer stays correct; only the set can grow. A device id that is not in a
+user's cached set (created since, possibly by another worker, or simply not
+theirs) reloads the set from the database before answering.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import FrozenSet, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import Device
+
+OWNERSHIP_CACHE_USERS = int(os.getenv("TELEMETRY_OWNERSHIP_CACHE_USERS", "10000"))
+OWNERSHIP_CACHE_TTL_SECONDS = float(os.getenv("TELEMETRY_OWNERSHIP_CACHE_TTL_SECONDS", "300"))
+
+def _user_devices_statement(user_id: int):
+    return select(Device.id).where(Device.user_id == user_id)
+
+class DeviceOwnershipCache:
+    def __init__(
+        self,
+        max_users: int = OWNERSHIP_CACHE_USERS,
+        ttl_seconds: float = OWNERSHIP_CACHE_TTL_SECONDS
+    ):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._users: "OrderedDict[int, Tuple[float, FrozenSet[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def owned(self, db: Session, user_id: int, device_ids: Iterable[int]) -> Set[int]:
+        """The subset of ``device_ids`` owned by the user; queries only on a cache miss."""
+        device_ids = set(device_ids)
+        cached = self._get(user_id)
+        if cached is not None and device_ids <= cached:
+            return device_ids
+        owned = frozenset(db.execute(_user_devices_statement(user_id)).scalars())
+        self._put(user_id, owned)
+        return device_ids & owned
+
+    async def owned_async(self, db: AsyncSession, user_id: int, device_ids: Iterable[int]) -> Set[int]:
+        device_ids = set(device_ids)
+        cached = self._get(user_id)
+        if cached is not None and device_ids <= cached:
+            return device_ids
+        owned = frozenset((await db.scalars(_user_devices_statement(user_id))).all())
+        self._put(user_id, owned)
+        return device_ids & owned
+
+    def is_owned(self, db: Session, user_id: int, device_id: int) -> bool:
+        return bool(self.owned(db, user_id, {device_id}))
+
+    async def is_owned_async(self, db: AsyncSession, user_id: int, device_id: int) -> bool:
+        return bool(await self.owned_async(db, user_id, {device_id}))
+
+    def device_created(self, user_id: int) -> None:
+        # Reload on next use rather than patching, so the set always comes from one query
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+    def _get(self, user_id: int) -> Optional[FrozenSet[int]]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            expires_at, device_ids = entry
+            if expires_at <= time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return device_ids
+
+    def _put(self, user_id: int, device_ids: FrozenSet[int]) -> None:
+        if self.max_users <= 0:
+            return
+        with self._lock:
+            self._users[user_id] = (time.monotonic() + self.ttl_seconds, device_ids)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+device_ownership = DeviceOwnershipCache()
@@ -0,0 +1,38 @@
+import base64
+import os
+from datetime import datetime
+from typing import Tuple
+
+from sqlalchemy import and_, or_
+
+from .models import Telemetry
+
+DEFAULT_PAGE_SIZE = int(os.getenv("TELEMETRY_DEFAULT_PAGE_SIZE", "1000"))
+MAX_PAGE_SIZE = int(os.getenv("TELEMETRY_MAX_PAGE_SIZE", "10000"))
+
+# Rows fetched per server-side cursor round trip when streaming
+STREAM_CHUNK_SIZE = int(os.getenv("TELEMETRY_STREAM_CHUNK_SIZE", "2000"))
+
+def encode_cursor(timestamp: datetime, telemetry_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{telemetry_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of ``encode_cursor``; raises ValueError on malformed input."""
+    try:
+        timestamp, telemetry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(telemetry_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def before_cursor(cursor: str):
+    """Filter for rows after ``cursor`` in (timestamp, id) descending order.
+
+    The leading ``timestamp <= ...`` term keeps the condition usable as an
+    index range on (device_id, timestamp).
+    """
+    timestamp, telemetry_id = decode_cursor(cursor)
+    return and_(
+        Telemetry.timestamp <= timestamp,
+        or_(Telemetry.timestamp < timestamp, Telemetry.id < telemetry_id)
+    )
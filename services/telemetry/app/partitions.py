@@ -0,0 +1,215 @@
+"""Monthly range partitions for the telemetry table on PostgreSQL.
+
+Partitions are created a few months ahead of time and old ones are dropped
+whole once they fall out of the retention window, so neither inserts nor
+retention ever have to touch more than one month of data.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_SQL_PATH = os.path.join(os.path.dirname(__file__), "database", "init.sql")
+
+# Number of future monthly partitions kept ready for incoming readings
+PARTITIONS_AHEAD = int(os.getenv("TELEMETRY_PARTITIONS_AHEAD", "3"))
+# Full months of raw telemetry kept before the current one; 0 keeps everything
+RETENTION_MONTHS = int(os.getenv("TELEMETRY_RETENTION_MONTHS", "0"))
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("TELEMETRY_PARTITION_MAINTENANCE_HOURS", "6"))
+
+# Advisory lock key so only one worker runs maintenance at a time
+MAINTENANCE_LOCK_KEY = 7402
+
+PARTITION_PREFIX = "telemetry_p"
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+def _month_bound(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+def create_schema(conn: Connection) -> bool:
+    """Create the partitioned telemetry schema unless the table already exists."""
+    if inspect(conn).has_table("telemetry"):
+        return False
+    with open(SCHEMA_SQL_PATH) as schema_file:
+        conn.exec_driver_sql(schema_file.read())
+    return True
+
+def is_partitioned(conn: Connection) -> bool:
+    relkind = conn.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('telemetry')"
+    )).scalar()
+    return relkind == "p"
+
+def list_partitions(conn: Connection) -> List[date]:
+    names = conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass('telemetry')
+    """)).scalars()
+
+    months = []
+    for name in names:
+        if name.startswith(PARTITION_PREFIX):
+            months.append(datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m").date())
+    return sorted(months)
+
+def create_partition(conn: Connection, month: date) -> None:
+    name = partition_name(month)
+    bounds = {"start": _month_bound(month), "end": _month_bound(add_months(month, 1))}
+
+    conn.exec_driver_sql(
+        f"CREATE TABLE {name} (LIKE telemetry INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    # Move readings that landed in the default partition before this one existed
+    conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM telemetry_default
+            WHERE timestamp >= :start AND timestamp < :end
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), bounds)
+    conn.exec_driver_sql(
+        f"ALTER TABLE telemetry ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+    )
+
+def ensure_partitions(
+    conn: Connection,
+    months_ahead: int = PARTITIONS_AHEAD,
+    now: Optional[datetime] = None
+) -> List[str]:
+    """Create any missing partitions from the current month to ``months_ahead``."""
+    if not is_partitioned(conn):
+        logger.warning(
+            "telemetry is not partitioned; run `python -m app.partitions migrate` to convert it"
+        )
+        return []
+
+    current = month_start(now or datetime.utcnow())
+    existing = set(list_partitions(conn))
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            create_partition(conn, month)
+            created.append(partition_name(month))
+    return created
+
+def drop_expired_partitions(
+    conn: Connection,
+    retention_months: int = RETENTION_MONTHS,
+    now: Optional[datetime] = None
+) -> List[str]:
+    """Drop whole partitions older than the retention window instead of DELETEing rows."""
+    if retention_months <= 0 or not is_partitioned(conn):
+        return []
+
+    cutoff = add_months(month_start(now or datetime.utcnow()), -retention_months)
+    dropped = []
+    for month in list_partitions(conn):
+        if add_months(month, 1) <= cutoff:
+            name = partition_name(month)
+            conn.exec_driver_sql(f"DROP TABLE {name}")
+            dropped.append(name)
+
+    # Stragglers in the default partition are rare, a DELETE is fine there
+    conn.execute(
+        text("DELETE FROM telemetry_default WHERE timestamp < :cutoff"),
+        {"cutoff": _month_bound(cutoff)}
+    )
+    return dropped
+
+def run_maintenance(engine: Engine) -> None:
+    with engine.begin() as conn:
+        acquired = conn.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+        ).scalar()
+        if not acquired:
+            return
+        created = ensure_partitions(conn)
+        dropped = drop_expired_partitions(conn)
+
+    if created or dropped:
+        logger.info("Telemetry partitions created: %s, dropped: %s", created, dropped)
+
+async def maintenance_loop(engine: Engine) -> None:
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL_HOURS * 3600)
+        try:
+            await asyncio.to_thread(run_maintenance, engine)
+        except Exception:
+            logger.exception("Telemetry partition maintenance failed")
+
+def migrate_to_partitioned(conn: Connection) -> None:
+    """Convert a plain telemetry table into the partitioned layout in one transaction.
+
+    The table is locked for the duration of the copy, so run this during a
+    maintenance window on large installations.
+    """
+    if create_schema(conn) or is_partitioned(conn):
+        return
+
+    conn.exec_driver_sql("LOCK TABLE telemetry IN ACCESS EXCLUSIVE MODE")
+    conn.exec_driver_sql("ALTER TABLE telemetry RENAME TO telemetry_unpartitioned")
+    conn.exec_driver_sql(
+        "ALTER TABLE telemetry_unpartitioned RENAME CONSTRAINT telemetry_pkey TO telemetry_unpartitioned_pkey"
+    )
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_telemetry_id")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_telemetry_device_timestamp")
+    create_schema(conn)
+
+    oldest, newest = conn.execute(text(
+        "SELECT min(timestamp), max(timestamp) FROM telemetry_unpartitioned"
+    )).one()
+    if oldest is not None:
+        month = month_start(oldest.astimezone(timezone.utc))
+        while month <= month_start(newest.astimezone(timezone.utc)):
+            create_partition(conn, month)
+            month = add_months(month, 1)
+    ensure_partitions(conn)
+
+    conn.exec_driver_sql("""
+        INSERT INTO telemetry (id, device_id, timestamp, energy_watts, created_at)
+        SELECT id, device_id, timestamp, energy_watts, created_at FROM telemetry_unpartitioned
+    """)
+    conn.exec_driver_sql(
+        "SELECT setval(pg_get_serial_sequence('telemetry', 'id'), "
+        "COALESCE((SELECT max(id) FROM telemetry), 0) + 1, false)"
+    )
+    conn.exec_driver_sql("DROP TABLE telemetry_unpartitioned")
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Telemetry partition maintenance")
+    parser.add_argument(
+        "command",
+        choices=["maintain", "migrate"],
+        help="maintain: create upcoming and drop expired partitions; "
+             "migrate: convert an existing unpartitioned table"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "migrate":
+        with engine.begin() as conn:
+            migrate_to_partitioned(conn)
+    run_maintenance(engine)
@@ -0,0 +1,210 @@
+"""Live fan-out of newly ingested readings to WebSocket subscribers.
+
+Write paths call ``realtime.publish`` after commit. Readings go through a
+broker, which hands them back to every process's ``Hub``; the hub delivers
+each reading to the subscribers of its device. The in-memory broker is a
+direct call and only reaches subscribers connected to the same process; the
+Redis broker (``TELEMETRY_REALTIME_BROKER=redis``, using ``REDIS_URL``)
+relays over a pub/sub channel so every worker and replica sees every write.
+
+Publishing never waits on a subscriber. Each subscription has a bounded
+queue of ``TELEMETRY_REALTIME_QUEUE_SIZE`` readings, and a client that does
+not keep up loses its oldest undelivered readings rather than holding up
+ingestion or growing memory without bound.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from shared.metrics import Counter, Gauge
+
+from .stats_cache import REDIS_URL
+
+# memory: same process only; redis: across workers, needs REDIS_URL
+REALTIME_BROKER = os.getenv("TELEMETRY_REALTIME_BROKER", "redis" if REDIS_URL else "memory")
+REALTIME_QUEUE_SIZE = int(os.getenv("TELEMETRY_REALTIME_QUEUE_SIZE", "256"))
+REALTIME_CHANNEL = "telemetry:readings"
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBERS = Gauge("telemetry_realtime_subscribers", "Open live telemetry subscriptions")
+DELIVERED = Counter("telemetry_realtime_delivered_total", "Readings queued for live subscribers")
+DROPPED = Counter(
+    "telemetry_realtime_dropped_total",
+    "Readings discarded because a live subscriber's queue was full"
+)
+
+Message = Dict[str, Any]
+Deliver = Callable[[Message], None]
+
+def reading_message(device_id: int, timestamp: datetime, energy_watts: float) -> Message:
+    return {"device_id": device_id, "timestamp": timestamp.isoformat(), "energy_watts": energy_watts}
+
+class Subscription:
+    """Readings for a set of devices, buffered up to ``max_size`` (oldest dropped first)."""
+
+    def __init__(self, device_ids: Iterable[int], max_size: int = REALTIME_QUEUE_SIZE):
+        self.device_ids = frozenset(device_ids)
+        self.dropped = 0
+        self._queue: "asyncio.Queue[Message]" = asyncio.Queue(maxsize=max(max_size, 1))
+        # Created by the connection's handler; the queue belongs to its loop
+        self._loop = asyncio.get_running_loop()
+
+    def offer(self, message: Message) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not self._loop:
+            # Published from another thread (sync handlers, other loops)
+            self._loop.call_soon_threadsafe(self._offer, message)
+        else:
+            self._offer(message)
+
+    def _offer(self, message: Message) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+            DROPPED.inc()
+        self._queue.put_nowait(message)
+        DELIVERED.inc()
+
+    async def get(self) -> Message:
+        return await self._queue.get()
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+class Hub:
+    """Subscribers of this process, indexed by device."""
+
+    def __init__(self, queue_size: int = REALTIME_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, device_ids: Iterable[int]) -> Subscription:
+        subscription = Subscription(device_ids, self.queue_size)
+        for device_id in subscription.device_ids:
+            self._subscribers[device_id].add(subscription)
+        SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for device_id in subscription.device_ids:
+            subscribers = self._subscribers.get(device_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[device_id]
+        SUBSCRIBERS.dec()
+
+    def deliver(self, message: Message) -> None:
+        for subscription in tuple(self._subscribers.get(message["device_id"], ())):
+            subscription.offer(message)
+
+class Broker:
+    """Carries published readings to the hub of every process."""
+
+    name = "base"
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, messages: Iterable[Message]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class MemoryBroker(Broker):
+    """Single process: publishing is delivering."""
+
+    name = "memory"
+
+    async def publish(self, messages: Iterable[Message]) -> None:
+        for message in messages:
+            self._deliver(message)
+
+class RedisBroker(Broker):
+    """Relays readings over a Redis pub/sub channel shared by all workers."""
+
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL, channel: str = REALTIME_CHANNEL):
+        import redis.asyncio
+
+        self.channel = channel
+        self._redis = redis.asyncio.Redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        await super().start(deliver)
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub: Any) -> None:
+        async for raw in pubsub.listen():
+            try:
+                for message in json.loads(raw["data"]):
+                    self._deliver(message)
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Ignoring malformed realtime message %r", raw)
+
+    async def publish(self, messages: Iterable[Message]) -> None:
+        # One pub/sub message per write, however many readings it carried
+        await self._redis.publish(self.channel, json.dumps(list(messages)))
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self._redis.aclose()
+
+BROKERS: Dict[str, Callable[[], Broker]] = {
+    "memory": MemoryBroker,
+    "redis": RedisBroker,
+}
+
+class Realtime:
+    """The process's hub plus the broker feeding it."""
+
+    def __init__(self, broker: Optional[Broker] = None, hub: Optional[Hub] = None):
+        self.broker = broker
+        self.hub = hub or Hub()
+        self._started = False
+
+    async def start(self) -> None:
+        if self._started:
+            return
+        if self.broker is None:
+            self.broker = create_broker()
+        await self.broker.start(self.hub.deliver)
+        self._started = True
+
+    async def close(self) -> None:
+        if self._started:
+            await self.broker.close()
+            self._started = False
+
+    async def publish(self, readings: Iterable[Tuple[int, datetime, float]]) -> None:
+        messages = [reading_message(*reading) for reading in readings]
+        if not messages:
+            return
+        await self.start()
+        try:
+            await self.broker.publish(messages)
+        except Exception:
+            # Live updates are best effort; the readings are already committed
+            logger.exception("Failed to publish %d readings", len(messages))
+
+def create_broker(name: str = REALTIME_BROKER) -> Broker:
+    if name not in BROKERS:
+        raise ValueError(f"Unknown TELEMETRY_REALTIME_BROKER {name!r}; expected one of {', '.join(BROKERS)}")
+    return BROKERS[name]()
+
+realtime = Realtime()
@@ -0,0 +1,349 @@
+"""Minute/hour/day rollups of raw telemetry.
+
+Every write path folds its new readings into the rollup tables inside the
+same transaction (``apply_readings``), so range statistics can be answered
+from a handful of pre-aggregated rows instead of rescanning raw telemetry.
+"""
+import argparse
+import os
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import (
+    Device,
+    Telemetry,
+    TelemetryRollupDay,
+    TelemetryRollupHour,
+    TelemetryRollupMinute,
+)
+from .stats import to_utc_naive
+
+# "rollup" answers stats from the rollup tables, "raw" rescans telemetry
+STATS_SOURCE = os.getenv("TELEMETRY_STATS_SOURCE", "rollup")
+
+# Default cap on points returned by the series endpoint
+SERIES_MAX_POINTS = int(os.getenv("TELEMETRY_SERIES_MAX_POINTS", "1500"))
+
+# Arbitrary namespace for the per-device advisory locks taken while updating rollups
+ADVISORY_LOCK_CLASS = 7401
+
+EPOCH = datetime(1970, 1, 1)
+
+@dataclass(frozen=True)
+class Granularity:
+    name: str
+    width: timedelta
+    model: type
+
+# Ordered finest first; each level is rebuilt from the one before it
+GRANULARITIES = [
+    Granularity("1m", timedelta(minutes=1), TelemetryRollupMinute),
+    Granularity("1h", timedelta(hours=1), TelemetryRollupHour),
+    Granularity("1d", timedelta(days=1), TelemetryRollupDay),
+]
+RESOLUTIONS = {granularity.name: granularity for granularity in GRANULARITIES}
+
+def floor_time(value: datetime, width: timedelta) -> datetime:
+    return EPOCH + ((value - EPOCH) // width) * width
+
+def ceil_time(value: datetime, width: timedelta) -> datetime:
+    floored = floor_time(value, width)
+    return floored if floored == value else floored + width
+
+def _segment_energy(t1: datetime, w1: float, t2: datetime, w2: float) -> float:
+    return (w1 + w2) / 2 * (t2 - t1).total_seconds() / 3600
+
+@dataclass
+class Summary:
+    """Mergeable aggregate of a contiguous run of readings."""
+    count: int
+    sum_energy_watts: float
+    min_energy_watts: float
+    max_energy_watts: float
+    first_timestamp: datetime
+    first_energy_watts: float
+    last_timestamp: datetime
+    last_energy_watts: float
+    energy_watt_hours: float
+
+    @classmethod
+    def from_points(cls, points: Sequence[Tuple[datetime, float]]) -> "Summary":
+        """Summarize readings already sorted by timestamp."""
+        watts = [w for _, w in points]
+        energy = sum(
+            _segment_energy(t1, w1, t2, w2)
+            for (t1, w1), (t2, w2) in zip(points[:-1], points[1:])
+        )
+        return cls(
+            count=len(points),
+            sum_energy_watts=sum(watts),
+            min_energy_watts=min(watts),
+            max_energy_watts=max(watts),
+            first_timestamp=points[0][0],
+            first_energy_watts=points[0][1],
+            last_timestamp=points[-1][0],
+            last_energy_watts=points[-1][1],
+            energy_watt_hours=energy,
+        )
+
+    @classmethod
+    def from_rollup(cls, row) -> "Summary":
+        return cls(
+            count=row.count,
+            sum_energy_watts=row.sum_energy_watts,
+            min_energy_watts=row.min_energy_watts,
+            max_energy_watts=row.max_energy_watts,
+            first_timestamp=to_utc_naive(row.first_timestamp),
+            first_energy_watts=row.first_energy_watts,
+            last_timestamp=to_utc_naive(row.last_timestamp),
+            last_energy_watts=row.last_energy_watts,
+            energy_watt_hours=row.energy_watt_hours,
+        )
+
+    def then(self, other: "Summary") -> "Summary":
+        """Combine with a summary whose readings all come after this one's."""
+        bridge = _segment_energy(
+            self.last_timestamp, self.last_energy_watts,
+            other.first_timestamp, other.first_energy_watts
+        )
+        return Summary(
+            count=self.count + other.count,
+            sum_energy_watts=self.sum_energy_watts + other.sum_energy_watts,
+            min_energy_watts=min(self.min_energy_watts, other.min_energy_watts),
+            max_energy_watts=max(self.max_energy_watts, other.max_energy_watts),
+            first_timestamp=self.first_timestamp,
+            first_energy_watts=self.first_energy_watts,
+            last_timestamp=other.last_timestamp,
+            last_energy_watts=other.last_energy_watts,
+            energy_watt_hours=self.energy_watt_hours + bridge + other.energy_watt_hours,
+        )
+
+    def to_stats(self) -> Dict[str, float]:
+        return {
+            "avg_energy_watts": self.sum_energy_watts / self.count,
+            "max_energy_watts": self.max_energy_watts,
+            "min_energy_watts": self.min_energy_watts,
+            "total_energy_watt_hours": self.energy_watt_hours,
+        }
+
+def combine(summaries: Iterable[Summary]) -> Optional[Summary]:
+    """Merge summaries of non-overlapping time ranges."""
+    merged = None
+    for summary in sorted(summaries, key=lambda s: s.first_timestamp):
+        merged = summary if merged is None else merged.then(summary)
+    return merged
+
+def apply_readings(db: Session, readings: Iterable[Tuple[int, datetime, float]]) -> None:
+    """Fold newly written ``(device_id, timestamp, energy_watts)`` readings into the rollups.
+
+    Must run in the writing transaction after the raw rows are flushed. Readings
+    that extend a bucket at either end are merged in place; readings landing in
+    the middle of a bucket trigger a rebuild of that bucket from the finer level.
+    """
+    by_device = defaultdict(list)
+    for device_id, timestamp, energy_watts in readings:
+        by_device[device_id].append((to_utc_naive(timestamp), float(energy_watts)))
+    if not by_device:
+        return
+
+    _lock_devices(db, sorted(by_device))
+    for device_id, points in by_device.items():
+        points.sort(key=lambda point: point[0])
+        for granularity in GRANULARITIES:
+            _apply_level(db, granularity, device_id, points)
+
+def _lock_devices(db: Session, device_ids: List[int]) -> None:
+    # Serialize rollup read-modify-write per device; sorted to avoid deadlocks
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for device_id in device_ids:
+        db.execute(select(func.pg_advisory_xact_lock(ADVISORY_LOCK_CLASS, device_id)))
+
+def _apply_level(
+    db: Session,
+    granularity: Granularity,
+    device_id: int,
+    points: List[Tuple[datetime, float]]
+) -> None:
+    model = granularity.model
+    buckets = defaultdict(list)
+    for point in points:
+        buckets[floor_time(point[0], granularity.width)].append(point)
+
+    existing = {
+        to_utc_naive(row.bucket_start): row
+        for row in db.query(model).filter(
+            model.device_id == device_id,
+            model.bucket_start.in_(list(buckets))
+        )
+    }
+
+    for bucket_start, bucket_points in buckets.items():
+        incoming = Summary.from_points(bucket_points)
+        row = existing.get(bucket_start)
+        if row is None:
+            db.add(model(device_id=device_id, bucket_start=bucket_start, **asdict(incoming)))
+            continue
+
+        current = Summary.from_rollup(row)
+        if incoming.first_timestamp >= current.last_timestamp:
+            merged = current.then(incoming)
+        elif incoming.last_timestamp < current.first_timestamp:
+            merged = incoming.then(current)
+        else:
+            merged = _rebuild_bucket(db, granularity, device_id, bucket_start)
+        for field, value in asdict(merged).items():
+            setattr(row, field, value)
+
+    db.flush()
+
+def _rebuild_bucket(
+    db: Session,
+    granularity: Granularity,
+    device_id: int,
+    bucket_start: datetime
+) -> Summary:
+    bucket_end = bucket_start + granularity.width
+    level = GRANULARITIES.index(granularity)
+    if level == 0:
+        rows = db.query(Telemetry.timestamp, Telemetry.energy_watts).filter(
+            Telemetry.device_id == device_id,
+            Telemetry.timestamp >= bucket_start,
+            Telemetry.timestamp < bucket_end
+        ).order_by(Telemetry.timestamp, Telemetry.id).all()
+        return Summary.from_points([(to_utc_naive(r.timestamp), r.energy_watts) for r in rows])
+
+    child = GRANULARITIES[level - 1].model
+    rows = db.query(child).filter(
+        child.device_id == device_id,
+        child.bucket_start >= bucket_start,
+        child.bucket_start < bucket_end
+    ).all()
+    return combine(Summary.from_rollup(row) for row in rows)
+
+def rebuild_rollups(db: Session, device_id: int, chunk_size: int = 10000) -> None:
+    """Recompute every rollup of a device from raw telemetry (backfill/repair)."""
+    for granularity in GRANULARITIES:
+        db.query(granularity.model).filter(granularity.model.device_id == device_id).delete()
+    db.flush()
+
+    rows = db.query(Telemetry.timestamp, Telemetry.energy_watts).filter(
+        Telemetry.device_id == device_id
+    ).order_by(Telemetry.timestamp, Telemetry.id).yield_per(chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append((device_id, row.timestamp, row.energy_watts))
+        if len(chunk) >= chunk_size:
+            apply_readings(db, chunk)
+            chunk = []
+    apply_readings(db, chunk)
+
+def summarize_range(
+    db: Session,
+    device_ids: Sequence[int],
+    start_time: datetime,
+    end_time: datetime
+) -> Dict[int, Summary]:
+    """Summarize ``start_time <= timestamp <= end_time`` for each device.
+
+    The range is covered by the coarsest rollup buckets that fit entirely
+    inside it, finer buckets towards the edges and raw readings for the
+    sub-minute remainder, so the cost does not depend on the sampling rate.
+    """
+    start = to_utc_naive(start_time)
+    end = to_utc_naive(end_time) + timedelta(microseconds=1)
+    pieces = defaultdict(list)
+
+    for granularity, segment_start, segment_end in _plan(start, end, len(GRANULARITIES) - 1):
+        if granularity is None:
+            rows = db.query(Telemetry.device_id, Telemetry.timestamp, Telemetry.energy_watts).filter(
+                Telemetry.device_id.in_(device_ids),
+                Telemetry.timestamp >= segment_start,
+                Telemetry.timestamp < segment_end
+            ).order_by(Telemetry.device_id, Telemetry.timestamp, Telemetry.id).all()
+            points = defaultdict(list)
+            for row in rows:
+                points[row.device_id].append((to_utc_naive(row.timestamp), row.energy_watts))
+            for device_id, device_points in points.items():
+                pieces[device_id].append(Summary.from_points(device_points))
+        else:
+            model = granularity.model
+            rows = db.query(model).filter(
+                model.device_id.in_(device_ids),
+                model.bucket_start >= segment_start,
+                model.bucket_start < segment_end
+            ).all()
+            for row in rows:
+                pieces[row.device_id].append(Summary.from_rollup(row))
+
+    return {device_id: combine(summaries) for device_id, summaries in pieces.items()}
+
+def _plan(start: datetime, end: datetime, level: int) -> List[Tuple[Optional[Granularity], datetime, datetime]]:
+    """Split ``[start, end)`` into rollup-aligned segments, coarsest in the middle."""
+    if start >= end:
+        return []
+    if level < 0:
+        return [(None, start, end)]
+
+    granularity = GRANULARITIES[level]
+    first = ceil_time(start, granularity.width)
+    last = floor_time(end, granularity.width)
+    if first >= last:
+        return _plan(start, end, level - 1)
+    return (
+        _plan(start, first, level - 1)
+        + [(granularity, first, last)]
+        + _plan(last, end, level - 1)
+    )
+
+def pick_resolution(start_time: datetime, end_time: datetime, max_points: int) -> Granularity:
+    """Finest rollup whose bucket count over the range stays within ``max_points``."""
+    span = end_time - start_time
+    for granularity in GRANULARITIES:
+        if span / granularity.width <= max_points:
+            return granularity
+    return GRANULARITIES[-1]
+
+def rollup_series(
+    db: Session,
+    device_ids: Sequence[int],
+    granularity: Granularity,
+    start_time: datetime,
+    end_time: datetime
+) -> Dict[int, list]:
+    """Rollup rows per device for every bucket overlapping the range, oldest first."""
+    model = granularity.model
+    rows = db.query(model).filter(
+        model.device_id.in_(device_ids),
+        model.bucket_start >= floor_time(to_utc_naive(start_time), granularity.width),
+        model.bucket_start <= to_utc_naive(end_time)
+    ).order_by(model.device_id, model.bucket_start).all()
+
+    series = defaultdict(list)
+    for row in rows:
+        series[row.device_id].append(row)
+    return series
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Telemetry rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--device-id", type=int, help="Only rebuild this device")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        device_ids = [args.device_id] if args.device_id else [d.id for d in db.query(Device.id)]
+        for device_id in device_ids:
+            rebuild_rollups(db, device_id)
+            db.commit()
+            print(f"Rebuilt rollups for device {device_id}")
+    finally:
+        db.close()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class DeviceBase(BaseModel):
     name: str
@@ -33,10 +33,47 @@ class TelemetryResponse(TelemetryBase):
     class Config:
         from_attributes = True
 
+class TelemetryBatchCreate(BaseModel):
+    # Rows are validated one by one so a bad reading only rejects itself
+    readings: List[Dict[str, Any]]
+
+class TelemetryReject(BaseModel):
+    index: int
+    device_id: Optional[int] = None
+    detail: str
+
+class TelemetryBatchResponse(BaseModel):
+    accepted: int
+    rejected: List[TelemetryReject]
+
 class TelemetryStats(BaseModel):
     device_id: int
     period: str
     avg_energy_watts: float
     max_energy_watts: float
     min_energy_watts: float
-    total_energy_watt_hours: float 
\ No newline at end of file
+    total_energy_watt_hours: float
+
+class TelemetrySeriesPoint(BaseModel):
+    timestamp: datetime
+    energy_watts: float
+    min_energy_watts: float
+    max_energy_watts: float
+    count: int
+    # Only set for plain rollup buckets, not for downsampled points
+    energy_watt_hours: Optional[float] = None
+
+class TelemetrySeries(BaseModel):
+    device_id: int
+    resolution: str  # Rollup the points come from, or "raw"
+    method: Optional[str] = None  # Downsampling method when max_points was given
+    points: List[TelemetrySeriesPoint]
+
+class DeviceSummary(BaseModel):
+    device: DeviceResponse
+    stats: TelemetryStats
+    series: TelemetrySeries
+
+class DashboardSummary(BaseModel):
+    period: str
+    devices: List[DeviceSummary]
@@ -0,0 +1,362 @@
+"""Synthetic telemetry for capacity tests, generated and loaded in bulk.
+
+Readings are generated a whole device-day at a time as NumPy arrays, with
+the load profiles of ``scripts/simulate_telemetry.py`` (night reduction, AC
+peak, appliance usage windows) and an RNG seeded per device-day, so the
+same arguments always produce the same data however the work is split.
+
+``--format postgres`` creates ``--devices`` devices for ``--user-id``,
+makes sure monthly partitions cover the range, and COPYs the readings in
+PostgreSQL's binary format, built straight from the arrays. The minute,
+hour and day rollups are computed from the same arrays and copied along,
+so the stats endpoints answer for the seeded data at once. ``csv`` and
+``parquet`` (needs pyarrow) write the readings to files instead, using
+device ids from ``--first-device-id``; rollups for those are rebuilt after
+loading with ``python -m app.rollups rebuild``.
+
+    python -m app.seed --devices 1000 --days 70 --user-id 1 --jobs 4
+    python -m app.seed --devices 100 --days 7 --format csv --output /tmp/seed
+
+``--jobs`` splits the devices between processes, each with its own
+connection or file.
+"""
+import argparse
+import io
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from .rollups import GRANULARITIES
+
+SECONDS_PER_DAY = 86400
+US_PER_SECOND = 1_000_000
+# PostgreSQL timestamps count microseconds from 2000-01-01 UTC
+PG_EPOCH_US = 946_684_800 * US_PER_SECOND
+
+# Readings per COPY transaction or file write, rounded up to whole device-days
+CHUNK_ROWS = 1_000_000
+
+FORMATS = ("postgres", "csv", "parquet")
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    device_type: str
+    base_load: float
+    variance: float
+
+# Same profiles as scripts/simulate_telemetry.py; devices take them in turn
+PROFILES = [
+    Profile("Refrigerator", "Refrigerator", 100, 20),
+    Profile("Air Conditioner", "Air Conditioner", 1500, 500),
+    Profile("Washing Machine", "Washing Machine", 500, 200),
+    Profile("Dishwasher", "Dishwasher", 1200, 300),
+    Profile("Water Heater", "Water Heater", 4000, 1000),
+]
+
+def generate_device_day(
+    profile: Profile,
+    day: date,
+    interval_seconds: int,
+    rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray]:
+    """One day of readings: microseconds since the Unix epoch and watts."""
+    offsets = np.arange(0, SECONDS_PER_DAY, interval_seconds, dtype=np.int64)
+    hours = offsets // 3600
+    energy = profile.base_load + rng.uniform(-profile.variance, profile.variance, len(offsets))
+
+    # Night-time reduction for most devices
+    energy[(hours >= 23) | (hours <= 5)] *= 0.5
+
+    # Peak hours for AC
+    if profile.device_type == "Air Conditioner":
+        energy[(hours >= 12) & (hours <= 18)] *= 1.5
+
+    # Washing machine and dishwasher typically used at specific times, standby otherwise
+    if profile.device_type in ("Washing Machine", "Dishwasher"):
+        energy *= np.where(np.isin(hours, (7, 8, 19, 20)), 2.0, 0.1)
+
+    day_start = int((datetime(day.year, day.month, day.day) - datetime(1970, 1, 1)).total_seconds())
+    timestamps = (day_start + offsets) * US_PER_SECOND
+    return timestamps, np.maximum(energy, 0.0)
+
+def day_rng(seed: int, device_index: int, day_index: int) -> np.random.Generator:
+    return np.random.default_rng([seed, device_index, day_index])
+
+def summarize_buckets(timestamps: np.ndarray, watts: np.ndarray, width: timedelta) -> Dict[str, np.ndarray]:
+    """Rollup columns for sorted readings, one entry per ``width`` bucket with readings.
+
+    Matches ``rollups.Summary``: energy is the trapezoid between consecutive
+    readings, counted in a bucket only when both readings fall inside it.
+    """
+    width_us = int(width.total_seconds()) * US_PER_SECOND
+    buckets = timestamps // width_us
+    boundary = buckets[1:] != buckets[:-1]
+    starts = np.flatnonzero(np.concatenate(([True], boundary)))
+    ends = np.concatenate((starts[1:], [len(timestamps)])) - 1
+    segments = (watts[:-1] + watts[1:]) / 2 * np.diff(timestamps) / (3600 * US_PER_SECOND)
+    inner = np.concatenate((np.where(boundary, 0.0, segments), [0.0]))
+    return {
+        "bucket_start": buckets[starts] * width_us,
+        "count": ends - starts + 1,
+        "sum_energy_watts": np.add.reduceat(watts, starts),
+        "min_energy_watts": np.minimum.reduceat(watts, starts),
+        "max_energy_watts": np.maximum.reduceat(watts, starts),
+        "first_timestamp": timestamps[starts],
+        "first_energy_watts": watts[starts],
+        "last_timestamp": timestamps[ends],
+        "last_energy_watts": watts[ends],
+        "energy_watt_hours": np.add.reduceat(inner, starts),
+    }
+
+# Binary COPY encodings of the column types used here
+PG_TYPES = {"int4": ">i4", "int8": ">i8", "float8": ">f8", "timestamptz": ">i8"}
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+
+def binary_copy_data(columns: Sequence[Tuple[str, np.ndarray]]) -> bytes:
+    """Rows of ``(pg_type, values)`` columns in PostgreSQL's binary COPY format.
+
+    Every column is fixed width and NOT NULL, so a row is a fixed-size record
+    and the whole payload is one structured array. ``timestamptz`` values are
+    microseconds since the Unix epoch.
+    """
+    fields = [("field_count", ">i2")]
+    for i, (pg_type, _) in enumerate(columns):
+        fields += [(f"length{i}", ">i4"), (f"value{i}", PG_TYPES[pg_type])]
+    records = np.empty(len(columns[0][1]), dtype=np.dtype(fields))
+    records["field_count"] = len(columns)
+    for i, (pg_type, values) in enumerate(columns):
+        records[f"length{i}"] = records.dtype[f"value{i}"].itemsize
+        records[f"value{i}"] = values - PG_EPOCH_US if pg_type == "timestamptz" else values
+    return COPY_HEADER + records.tobytes() + COPY_TRAILER
+
+ROLLUP_COLUMNS = [
+    ("bucket_start", "timestamptz"),
+    ("count", "int4"),
+    ("sum_energy_watts", "float8"),
+    ("min_energy_watts", "float8"),
+    ("max_energy_watts", "float8"),
+    ("first_timestamp", "timestamptz"),
+    ("first_energy_watts", "float8"),
+    ("last_timestamp", "timestamptz"),
+    ("last_energy_watts", "float8"),
+    ("energy_watt_hours", "float8"),
+]
+
+@dataclass
+class Chunk:
+    """Readings of several device-days, concatenated."""
+    device_ids: np.ndarray
+    timestamps: np.ndarray
+    watts: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+def generate_chunks(
+    devices: Sequence[Tuple[int, int]],
+    days: Sequence[date],
+    interval_seconds: int,
+    seed: int
+) -> Iterator[Chunk]:
+    """Readings of ``(device_index, device_id)`` devices over ``days``, about ``CHUNK_ROWS`` at a time."""
+    parts: List[Tuple[int, np.ndarray, np.ndarray]] = []
+    rows = 0
+    for device_index, device_id in devices:
+        profile = PROFILES[device_index % len(PROFILES)]
+        for day_index, day in enumerate(days):
+            timestamps, watts = generate_device_day(
+                profile, day, interval_seconds, day_rng(seed, device_index, day_index)
+            )
+            parts.append((device_id, timestamps, watts))
+            rows += len(timestamps)
+            if rows >= CHUNK_ROWS:
+                yield _concatenate(parts)
+                parts, rows = [], 0
+    if parts:
+        yield _concatenate(parts)
+
+def _concatenate(parts: List[Tuple[int, np.ndarray, np.ndarray]]) -> Chunk:
+    return Chunk(
+        device_ids=np.concatenate([np.full(len(t), device_id, dtype=np.int32) for device_id, t, _ in parts]),
+        timestamps=np.concatenate([t for _, t, _ in parts]),
+        watts=np.concatenate([w for _, _, w in parts]),
+    )
+
+def rollup_rows(chunk: Chunk, width: timedelta) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Rollups of a chunk; its device-days are whole, so no bucket spans two chunks."""
+    # Buckets never span devices: readings of one device are contiguous and time-ordered
+    device_change = np.flatnonzero(chunk.device_ids[1:] != chunk.device_ids[:-1]) + 1
+    pieces = np.split(np.arange(len(chunk)), device_change)
+    summaries = [summarize_buckets(chunk.timestamps[p], chunk.watts[p], width) for p in pieces]
+    device_ids = np.concatenate([
+        np.full(len(s["count"]), chunk.device_ids[p[0]], dtype=np.int32) for s, p in zip(summaries, pieces)
+    ])
+    return device_ids, {name: np.concatenate([s[name] for s in summaries]) for name, _ in ROLLUP_COLUMNS}
+
+def copy_chunk(cursor, chunk: Chunk) -> int:
+    """COPY a chunk's readings and rollups; returns the number of rollup rows."""
+    cursor.copy_expert(
+        "COPY telemetry (device_id, timestamp, energy_watts) FROM STDIN WITH (FORMAT binary)",
+        io.BytesIO(binary_copy_data([
+            ("int4", chunk.device_ids), ("timestamptz", chunk.timestamps), ("float8", chunk.watts)
+        ]))
+    )
+    rollups = 0
+    for granularity in GRANULARITIES:
+        device_ids, columns = rollup_rows(chunk, granularity.width)
+        names = ", ".join(["device_id"] + [name for name, _ in ROLLUP_COLUMNS])
+        cursor.copy_expert(
+            f"COPY {granularity.model.__tablename__} ({names}) FROM STDIN WITH (FORMAT binary)",
+            io.BytesIO(binary_copy_data(
+                [("int4", device_ids)] + [(pg_type, columns[name]) for name, pg_type in ROLLUP_COLUMNS]
+            ))
+        )
+        rollups += len(device_ids)
+    return rollups
+
+def write_csv(path: str, chunk: Chunk, first: bool) -> None:
+    stamps = np.datetime_as_string(chunk.timestamps.astype("datetime64[us]"), unit="s")
+    # The first chunk replaces any file from an earlier run
+    with open(path, "w" if first else "a") as out:
+        if first:
+            out.write("device_id,timestamp,energy_watts\n")
+        out.write("".join(
+            f"{device_id},{stamp}Z,{watts:.3f}\n"
+            for device_id, stamp, watts in zip(chunk.device_ids.tolist(), stamps, chunk.watts.tolist())
+        ))
+
+def load_devices(
+    job: int,
+    devices: Sequence[Tuple[int, int]],
+    days: Sequence[date],
+    args: argparse.Namespace
+) -> Tuple[int, int]:
+    """Generate and write the readings of ``devices``; returns (readings, rollup rows)."""
+    readings = rollups = 0
+    chunks = generate_chunks(devices, days, args.interval, args.seed)
+    if args.format == "postgres":
+        from .database import engine
+
+        # A fresh pool per process; connections are not shared across fork
+        engine.dispose(close=False)
+        connection = engine.raw_connection()
+        try:
+            for chunk in chunks:
+                with connection.cursor() as cursor:
+                    rollups += copy_chunk(cursor, chunk)
+                connection.commit()
+                readings += len(chunk)
+        finally:
+            connection.close()
+    elif args.format == "csv":
+        path = os.path.join(args.output, f"telemetry-{job:02d}.csv")
+        for chunk in chunks:
+            write_csv(path, chunk, first=readings == 0)
+            readings += len(chunk)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([
+            ("device_id", pa.int32()),
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+            ("energy_watts", pa.float64()),
+        ])
+        with pq.ParquetWriter(os.path.join(args.output, f"telemetry-{job:02d}.parquet"), schema) as writer:
+            for chunk in chunks:
+                writer.write_table(pa.table(
+                    [chunk.device_ids, pa.array(chunk.timestamps, pa.timestamp("us", tz="UTC")), chunk.watts],
+                    schema=schema
+                ))
+                readings += len(chunk)
+    return readings, rollups
+
+def create_devices(user_id: int, count: int) -> List[int]:
+    from .database import SessionLocal
+    from .models import Device
+
+    db = SessionLocal()
+    try:
+        devices = [
+            Device(
+                name=f"{PROFILES[i % len(PROFILES)].name} {i + 1}",
+                device_type=PROFILES[i % len(PROFILES)].device_type,
+                user_id=user_id
+            )
+            for i in range(count)
+        ]
+        db.add_all(devices)
+        db.commit()
+        return [device.id for device in devices]
+    finally:
+        db.close()
+
+def ensure_month_partitions(days: Sequence[date]) -> None:
+    """Give the seeded range its own monthly partitions rather than the default one."""
+    from .database import engine
+    from .partitions import create_partition, is_partitioned, list_partitions, month_start
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return
+        existing = set(list_partitions(conn))
+        for month in sorted({month_start(datetime(day.year, day.month, 1)) for day in days}):
+            if month not in existing:
+                create_partition(conn, month)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, required=True)
+    parser.add_argument("--days", type=int, required=True, help="Days of readings, ending yesterday")
+    parser.add_argument("--interval", type=int, default=60, help="Seconds between readings of a device")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=FORMATS, default="postgres")
+    parser.add_argument("--user-id", type=int, default=1, help="Owner of the created devices (postgres)")
+    parser.add_argument("--first-device-id", type=int, default=1, help="Device ids in files (csv, parquet)")
+    parser.add_argument("--output", default=".", help="Directory for csv and parquet files")
+    parser.add_argument("--jobs", type=int, default=1, help="Processes sharing the devices")
+    args = parser.parse_args()
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("parquet output needs pyarrow: pip install pyarrow")
+
+    today = datetime.utcnow().date()
+    days = [today - timedelta(days=args.days - i) for i in range(args.days)]
+    if args.format == "postgres":
+        device_ids = create_devices(args.user_id, args.devices)
+        ensure_month_partitions(days)
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        device_ids = list(range(args.first_device_id, args.first_device_id + args.devices))
+    devices = list(enumerate(device_ids))
+    slices = [devices[job::args.jobs] for job in range(args.jobs)]
+
+    started = time.perf_counter()
+    if args.jobs == 1:
+        results = [load_devices(0, devices, days, args)]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(load_devices, range(args.jobs), slices, [days] * args.jobs, [args] * args.jobs))
+    elapsed = time.perf_counter() - started
+
+    readings = sum(r for r, _ in results)
+    rollups = sum(r for _, r in results)
+    print(
+        f"{readings} readings for {args.devices} devices x {args.days} days "
+        f"to {args.format} in {elapsed:.1f}s: {readings / elapsed:,.0f} readings/s"
+    )
+    if args.format == "postgres":
+        print(f"{rollups} rollup rows; device ids {device_ids[0]}-{device_ids[-1]} for user {args.user_id}")
+
+if __name__ == "__main__":
+    main()
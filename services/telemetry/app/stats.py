@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import Telemetry
+
+# Supported stats periods and the window each one covers
+PERIODS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+
+def resolve_period(period: str, end_time: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """Turn a period name into a (start, end) range ending at ``end_time`` or now."""
+    if period not in PERIODS:
+        raise ValueError(f"Invalid period. Supported values: {', '.join(PERIODS)}")
+    end_time = end_time or datetime.utcnow()
+    return end_time - PERIODS[period], end_time
+
+def to_utc_naive(value: datetime) -> datetime:
+    """Normalize a datetime to naive UTC, the convention used throughout the service."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def empty_stats() -> Dict[str, float]:
+    return {
+        "avg_energy_watts": 0,
+        "max_energy_watts": 0,
+        "min_energy_watts": 0,
+        "total_energy_watt_hours": 0,
+    }
+
+def compute_stats(
+    db: Session,
+    device_id: int,
+    start_time: datetime,
+    end_time: datetime
+) -> Dict[str, float]:
+    """Return avg/min/max power and the trapezoidal energy total for a time range.
+
+    PostgreSQL does the whole aggregation in one statement; other dialects
+    fetch the two needed columns and integrate with NumPy.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return _sql_stats(db, device_id, start_time, end_time)
+    return _numpy_stats(db, device_id, start_time, end_time)
+
+def _sql_stats(db: Session, device_id: int, start_time: datetime, end_time: datetime) -> Dict[str, float]:
+    ordering = (Telemetry.timestamp, Telemetry.id)
+    readings = select(
+        Telemetry.timestamp,
+        Telemetry.energy_watts,
+        func.lag(Telemetry.timestamp).over(order_by=ordering).label("prev_timestamp"),
+        func.lag(Telemetry.energy_watts).over(order_by=ordering).label("prev_energy_watts"),
+    ).where(
+        Telemetry.device_id == device_id,
+        Telemetry.timestamp >= start_time,
+        Telemetry.timestamp <= end_time
+    ).subquery()
+
+    interval_hours = func.extract(
+        "epoch", readings.c.timestamp - readings.c.prev_timestamp
+    ) / 3600
+    segment_energy = (readings.c.energy_watts + readings.c.prev_energy_watts) / 2 * interval_hours
+
+    row = db.execute(select(
+        func.count(),
+        func.avg(readings.c.energy_watts),
+        func.max(readings.c.energy_watts),
+        func.min(readings.c.energy_watts),
+        func.coalesce(func.sum(segment_energy), 0),
+    )).one()
+
+    count, avg_energy, max_energy, min_energy, total_energy = row
+    if not count:
+        return empty_stats()
+
+    return {
+        "avg_energy_watts": float(avg_energy),
+        "max_energy_watts": float(max_energy),
+        "min_energy_watts": float(min_energy),
+        "total_energy_watt_hours": float(total_energy),
+    }
+
+def _numpy_stats(db: Session, device_id: int, start_time: datetime, end_time: datetime) -> Dict[str, float]:
+    rows = db.query(Telemetry.timestamp, Telemetry.energy_watts).filter(
+        Telemetry.device_id == device_id,
+        Telemetry.timestamp >= start_time,
+        Telemetry.timestamp <= end_time
+    ).order_by(Telemetry.timestamp, Telemetry.id).all()
+
+    if not rows:
+        return empty_stats()
+
+    timestamps = np.array([to_utc_naive(row.timestamp) for row in rows], dtype="datetime64[us]")
+    watts = np.fromiter((row.energy_watts for row in rows), dtype=float, count=len(rows))
+    hours = (timestamps - timestamps[0]).astype(np.int64) / 3.6e9
+
+    return {
+        "avg_energy_watts": float(watts.mean()),
+        "max_energy_watts": float(watts.max()),
+        "min_energy_watts": float(watts.min()),
+        "total_energy_watt_hours": float(np.trapz(watts, hours)),
+    }
@@ -0,0 +1,279 @@
+"""Cache of per-device range summaries behind the stats endpoints.
+
+Entries are keyed by ``(device_id, period, end_time)`` with ``end_time``
+rounded up to ``TELEMETRY_STATS_CACHE_ALIGN_SECONDS``, so every request in
+the same alignment window shares one entry. Lookups go to an in-process
+LRU first and then to an optional shared tier (any Redis-protocol server,
+configured with ``REDIS_URL``).
+
+Every device has a generation number that write paths bump after commit.
+An entry is only served while its generation is current, which also makes
+writers racing with a cache fill harmless: the fill is stored under the
+generation it started from and is never read. Readings that land after the
+newest reading of a local entry are folded into it and carried over to the
+new generation instead of dropping it; anything else inside the window
+invalidates the entry.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from shared.metrics import Counter
+
+from .rollups import Summary, ceil_time, summarize_range
+from .stats import PERIODS, resolve_period, to_utc_naive
+
+# 0 disables the in-process tier
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("TELEMETRY_STATS_CACHE_MAX_ENTRIES", "10000"))
+STATS_CACHE_TTL_SECONDS = float(os.getenv("TELEMETRY_STATS_CACHE_TTL_SECONDS", "120"))
+STATS_CACHE_ALIGN = timedelta(seconds=int(os.getenv("TELEMETRY_STATS_CACHE_ALIGN_SECONDS", "60")))
+# Optional shared tier so workers and replicas see each other's entries and writes
+REDIS_URL = os.getenv("REDIS_URL")
+
+KEY_PREFIX = "telemetry:stats"
+
+HITS = {
+    tier: Counter("telemetry_stats_cache_hits_total", "Stats served from the cache", {"tier": tier})
+    for tier in ("local", "shared")
+}
+MISSES = Counter("telemetry_stats_cache_misses_total", "Stats computed because no current entry existed")
+PATCHES = Counter("telemetry_stats_cache_patches_total", "Cached entries updated in place by new readings")
+INVALIDATIONS = Counter("telemetry_stats_cache_invalidations_total", "Cached entries dropped by new readings")
+
+Key = Tuple[int, str, datetime]
+
+@dataclass
+class _Entry:
+    generation: int
+    summary: Optional[Summary]
+    expires_at: float
+
+def _encode(summary: Optional[Summary]) -> str:
+    if summary is None:
+        return "null"
+    fields = asdict(summary)
+    fields["first_timestamp"] = summary.first_timestamp.isoformat()
+    fields["last_timestamp"] = summary.last_timestamp.isoformat()
+    return json.dumps(fields)
+
+def _decode(raw: Any) -> Optional[Summary]:
+    fields = json.loads(raw)
+    if fields is None:
+        return None
+    fields["first_timestamp"] = datetime.fromisoformat(fields["first_timestamp"])
+    fields["last_timestamp"] = datetime.fromisoformat(fields["last_timestamp"])
+    return Summary(**fields)
+
+def _patch(
+    summary: Optional[Summary],
+    points: List[Tuple[datetime, float]],
+    start: datetime,
+    end: datetime
+) -> Tuple[bool, Optional[Summary]]:
+    """Apply sorted new readings to a cached window; (False, None) if it must be dropped."""
+    inside = [point for point in points if start <= point[0] <= end]
+    if not inside:
+        return True, summary
+    # Only readings strictly after everything summarized can be appended; a
+    # reading at or before last_timestamp may already be part of the entry
+    if summary is not None and inside[0][0] <= summary.last_timestamp:
+        return False, None
+    appended = Summary.from_points(inside)
+    return True, appended if summary is None else summary.then(appended)
+
+class StatsCache:
+    def __init__(
+        self,
+        max_entries: int = STATS_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = STATS_CACHE_TTL_SECONDS,
+        align: timedelta = STATS_CACHE_ALIGN,
+        shared: Any = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.align = align
+        # Needs mget/set(ex=)/incr, e.g. redis.Redis
+        self.shared = shared
+        self._entries: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._device_keys: Dict[int, Set[Key]] = defaultdict(set)
+        self._generations: Dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def window_end(self, now: Optional[datetime] = None) -> datetime:
+        """End of the current cache window; requests in the same window share entries."""
+        return ceil_time(now or datetime.utcnow(), self.align)
+
+    def get_many(
+        self,
+        device_ids: Sequence[int],
+        period: str,
+        end_time: datetime
+    ) -> Tuple[Dict[int, Optional[Summary]], Dict[int, int]]:
+        """Cached summaries by device, plus the generations to pass to ``put_many`` for the rest."""
+        generations = self._current_generations(device_ids)
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for device_id in device_ids:
+                key = (device_id, period, end_time)
+                entry = self._entries.get(key)
+                if entry and entry.generation == generations[device_id] and entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    found[device_id] = entry.summary
+                    HITS["local"].inc()
+                else:
+                    missing.append(device_id)
+
+        if missing and self.shared is not None:
+            values = self.shared.mget([
+                self._shared_key((device_id, period, end_time), generations[device_id])
+                for device_id in missing
+            ])
+            for device_id, raw in zip(missing, values):
+                if raw is not None:
+                    found[device_id] = _decode(raw)
+                    self._store_local((device_id, period, end_time), generations[device_id], found[device_id])
+                    HITS["shared"].inc()
+
+        MISSES.inc(len(device_ids) - len(found))
+        return found, generations
+
+    def put_many(
+        self,
+        period: str,
+        end_time: datetime,
+        summaries: Dict[int, Optional[Summary]],
+        generations: Dict[int, int]
+    ) -> None:
+        for device_id, summary in summaries.items():
+            key = (device_id, period, end_time)
+            self._store_local(key, generations[device_id], summary)
+            if self.shared is not None:
+                self.shared.set(
+                    self._shared_key(key, generations[device_id]),
+                    _encode(summary),
+                    ex=max(int(self.ttl_seconds), 1)
+                )
+
+    def summarize(
+        self,
+        db: Session,
+        device_ids: Sequence[int],
+        period: str,
+        end_time: datetime
+    ) -> Dict[int, Optional[Summary]]:
+        """``summarize_range`` over ``period`` ending at ``end_time``, computing only cache misses.
+
+        ``end_time`` should come from ``window_end`` so requests share entries.
+        """
+        summaries, generations = self.get_many(device_ids, period, end_time)
+        missing = [device_id for device_id in device_ids if device_id not in summaries]
+        if missing:
+            start_time, _ = resolve_period(period, end_time)
+            computed = summarize_range(db, missing, start_time, end_time)
+            computed = {device_id: computed.get(device_id) for device_id in missing}
+            self.put_many(period, end_time, computed, generations)
+            summaries.update(computed)
+        return summaries
+
+    def record_readings(self, readings: Iterable[Tuple[int, datetime, float]]) -> None:
+        """Bump generations for freshly committed readings and patch or drop local entries."""
+        by_device = defaultdict(list)
+        for device_id, timestamp, energy_watts in readings:
+            by_device[device_id].append((to_utc_naive(timestamp), float(energy_watts)))
+
+        for device_id, points in by_device.items():
+            points.sort(key=lambda point: point[0])
+            if self.shared is not None:
+                generation = self.shared.incr(self._generation_key(device_id))
+            else:
+                with self._lock:
+                    self._generations[device_id] += 1
+                    generation = self._generations[device_id]
+
+            patched = []
+            with self._lock:
+                for key in list(self._device_keys.get(device_id, ())):
+                    entry = self._entries[key]
+                    _, period, end_time = key
+                    # An entry from before an interleaved write is stale regardless
+                    if entry.generation == generation - 1:
+                        keep, summary = _patch(entry.summary, points, end_time - PERIODS[period], end_time)
+                    else:
+                        keep, summary = False, None
+                    if keep:
+                        entry.generation = generation
+                        entry.summary = summary
+                        patched.append((key, summary))
+                        PATCHES.inc()
+                    else:
+                        self._remove(key)
+                        INVALIDATIONS.inc()
+
+            if self.shared is not None:
+                for key, summary in patched:
+                    self.shared.set(
+                        self._shared_key(key, generation), _encode(summary), ex=max(int(self.ttl_seconds), 1)
+                    )
+
+    async def record_readings_async(self, readings: Iterable[Tuple[int, datetime, float]]) -> None:
+        if self.shared is None:
+            self.record_readings(readings)
+        else:
+            await asyncio.to_thread(self.record_readings, list(readings))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._device_keys.clear()
+            self._generations.clear()
+
+    def _current_generations(self, device_ids: Sequence[int]) -> Dict[int, int]:
+        if self.shared is None:
+            with self._lock:
+                return {device_id: self._generations[device_id] for device_id in device_ids}
+        values = self.shared.mget([self._generation_key(device_id) for device_id in device_ids])
+        return {device_id: int(value or 0) for device_id, value in zip(device_ids, values)}
+
+    def _store_local(self, key: Key, generation: int, summary: Optional[Summary]) -> None:
+        with self._lock:
+            self._entries[key] = _Entry(generation, summary, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            self._device_keys[key[0]].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Key) -> None:
+        # Caller holds the lock
+        self._entries.pop(key, None)
+        keys = self._device_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._device_keys[key[0]]
+
+    def _shared_key(self, key: Key, generation: int) -> str:
+        device_id, period, end_time = key
+        return f"{KEY_PREFIX}:{device_id}:{period}:{end_time:%Y%m%dT%H%M%S}:{generation}"
+
+    def _generation_key(self, device_id: int) -> str:
+        return f"{KEY_PREFIX}:generation:{device_id}"
+
+def create_stats_cache() -> StatsCache:
+    shared = None
+    if REDIS_URL:
+        import redis
+
+        shared = redis.Redis.from_url(REDIS_URL)
+    return StatsCache(shared=shared)
+
+stats_cache = create_stats_cache()
@@ -0,0 +1,234 @@
+"""Write-behind ingestion: acknowledge readings first, write them in micro-batches.
+
+With ``TELEMETRY_INGEST_MODE=write_behind`` the ingest endpoints validate and
+ownership-check readings, hand them to ``ingest_queue`` and answer 202 right
+away. A background task writes the queue out with one transaction per batch
+of up to ``TELEMETRY_INGEST_BATCH_SIZE`` readings, or sooner once the oldest
+waiting reading is ``TELEMETRY_INGEST_MAX_DELAY_MS`` old, so devices posting
+one reading at a time no longer cost a commit each.
+
+The queue holds at most ``TELEMETRY_INGEST_QUEUE_SIZE`` readings; a request
+that does not fit is refused whole (429) for the client to retry. Readings
+are only in memory until their batch commits: they are not visible to
+queries for up to the flush delay, and a crashed process loses them (a
+clean shutdown drains the queue first). A batch that still fails after
+``TELEMETRY_INGEST_FLUSH_RETRIES`` is split until the rows that fail on their
+own are found; only those are dropped.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from shared.metrics import Counter, Gauge, Histogram
+
+from .database import AsyncSessionLocal
+from .ingest import BATCH_MAX_ROWS, insert_telemetry_rows_async
+from .realtime import realtime
+from .rollups import apply_readings
+from .stats_cache import stats_cache
+
+# sync: commit inside the request; write_behind: queue and answer 202
+INGEST_MODE = os.getenv("TELEMETRY_INGEST_MODE", "sync")
+INGEST_QUEUE_SIZE = int(os.getenv("TELEMETRY_INGEST_QUEUE_SIZE", "50000"))
+INGEST_BATCH_SIZE = int(os.getenv("TELEMETRY_INGEST_BATCH_SIZE", "1000"))
+INGEST_MAX_DELAY_SECONDS = float(os.getenv("TELEMETRY_INGEST_MAX_DELAY_MS", "200")) / 1000
+INGEST_DRAIN_TIMEOUT_SECONDS = float(os.getenv("TELEMETRY_INGEST_DRAIN_TIMEOUT_SECONDS", "30"))
+# A failed batch is retried with exponential backoff before it is split to find the bad rows
+INGEST_FLUSH_RETRIES = int(os.getenv("TELEMETRY_INGEST_FLUSH_RETRIES", "3"))
+INGEST_RETRY_BACKOFF_SECONDS = 0.5
+
+logger = logging.getLogger(__name__)
+
+DEPTH = Gauge("telemetry_ingest_queue_depth", "Readings accepted but not yet written")
+FLUSH_SECONDS = Histogram("telemetry_ingest_flush_seconds", "Time to write one micro-batch, commit included")
+BATCH_SIZE = Histogram(
+    "telemetry_ingest_batch_size",
+    "Readings written per micro-batch",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, BATCH_MAX_ROWS)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "telemetry_ingest_queue_wait_seconds",
+    "Time from acceptance to the start of the write, per batch's oldest reading"
+)
+REJECTED = Counter("telemetry_ingest_rejected_total", "Readings refused with 429 because the queue was full")
+FAILED = Counter("telemetry_ingest_failed_total", "Accepted readings dropped because writing them kept failing")
+
+Row = Dict[str, Any]
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        max_size: int = INGEST_QUEUE_SIZE,
+        batch_size: int = INGEST_BATCH_SIZE,
+        max_delay_seconds: float = INGEST_MAX_DELAY_SECONDS,
+        session_factory: Callable = AsyncSessionLocal
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_delay_seconds = max_delay_seconds
+        self.session_factory = session_factory
+        # (accepted at, row), oldest first
+        self._pending: Deque[Tuple[float, Row]] = deque()
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def offer(self, rows: List[Row]) -> bool:
+        """Queue all of ``rows``, or none of them if they do not fit."""
+        with self._lock:
+            if self._closing or len(self._pending) + len(rows) > self.max_size:
+                REJECTED.inc(len(rows))
+                return False
+            accepted_at = time.monotonic()
+            self._pending.extend((accepted_at, row) for row in rows)
+            depth = len(self._pending)
+        DEPTH.set(depth)
+        # An idle writer has no deadline until the first reading arrives; a full batch is due at once
+        if (depth == len(rows) or depth >= self.batch_size) and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        if self._task is None:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            self._task.add_done_callback(self._task_done)
+
+    async def close(self, timeout: float = INGEST_DRAIN_TIMEOUT_SECONDS) -> None:
+        """Stop accepting readings and write out everything already accepted."""
+        self._closing = True
+        if self._task is None:
+            await self.drain()
+            return
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error("Gave up draining the ingest queue with %d readings left", len(self))
+        except Exception:
+            # Already logged by _task_done; shutdown goes on
+            pass
+        self._task = None
+
+    async def drain(self) -> None:
+        while len(self):
+            await self.flush(self._take())
+
+    async def flush(self, rows: List[Row]) -> None:
+        """Write one batch, then update caches and live subscribers for what was written."""
+        if not rows:
+            return
+        started = time.perf_counter()
+        for attempt in range(INGEST_FLUSH_RETRIES + 1):
+            try:
+                written = await self._write(rows)
+                break
+            except Exception:
+                logger.exception("Failed to write %d queued readings (attempt %d)", len(rows), attempt + 1)
+                if attempt < INGEST_FLUSH_RETRIES:
+                    await asyncio.sleep(INGEST_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+        else:
+            # One bad row (e.g. its device was deleted after acceptance) should not cost the batch
+            written = await self._write_split(rows)
+            FAILED.inc(len(rows) - len(written))
+            logger.error(
+                "Dropped %d of %d queued readings that could not be written", len(rows) - len(written), len(rows)
+            )
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        BATCH_SIZE.observe(len(rows))
+        if not written:
+            return
+
+        # The readings are committed whatever happens next; cached stats catch up
+        # when their entries expire and live updates are best effort
+        readings = self._readings(written)
+        try:
+            await stats_cache.record_readings_async(readings)
+        except Exception:
+            logger.exception("Failed to record %d readings in the stats cache", len(readings))
+        try:
+            await realtime.publish(readings)
+        except Exception:
+            logger.exception("Failed to publish %d readings", len(readings))
+
+    async def _write(self, rows: List[Row]) -> List[Row]:
+        """Write ``rows`` and their rollups in one transaction."""
+        async with self.session_factory() as db:
+            await insert_telemetry_rows_async(db, rows)
+            await db.run_sync(apply_readings, self._readings(rows))
+            await db.commit()
+        return rows
+
+    async def _write_split(self, rows: List[Row]) -> List[Row]:
+        """The rows of a failed batch that can be written, found by halving it; one attempt per half."""
+        if len(rows) == 1:
+            return []
+        middle = len(rows) // 2
+        written = []
+        for half in (rows[:middle], rows[middle:]):
+            try:
+                written += await self._write(half)
+            except Exception:
+                written += await self._write_split(half)
+        return written
+
+    @staticmethod
+    def _readings(rows: List[Row]) -> List[Tuple[int, Any, float]]:
+        return [(row["device_id"], row["timestamp"], row["energy_watts"]) for row in rows]
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _take(self) -> List[Row]:
+        with self._lock:
+            count = min(self.batch_size, len(self._pending))
+            if count:
+                QUEUE_WAIT_SECONDS.observe(time.monotonic() - self._pending[0][0])
+            rows = [self._pending.popleft()[1] for _ in range(count)]
+            depth = len(self._pending)
+        DEPTH.set(depth)
+        return rows
+
+    def _due_in(self) -> Optional[float]:
+        """Seconds until the next batch is due; None while the queue is empty."""
+        with self._lock:
+            if not self._pending:
+                return None
+            if len(self._pending) >= self.batch_size:
+                return 0.0
+            return self._pending[0][0] + self.max_delay_seconds - time.monotonic()
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Ingest queue writer stopped with %d readings pending", len(self), exc_info=task.exception()
+            )
+
+    async def _run(self) -> None:
+        while True:
+            # Cleared before looking, so an offer made meanwhile still wakes us
+            self._wakeup.clear()
+            try:
+                if self._closing:
+                    await self.drain()
+                    return
+                due = self._due_in()
+                if due is not None and due <= 0:
+                    await self.flush(self._take())
+                    continue
+            except Exception:
+                # Keep writing later batches; whatever failed here is already out of the queue
+                logger.exception("Ingest queue writer failed")
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), due)
+            except asyncio.TimeoutError:
+                pass
+
+ingest_queue = WriteBehindQueue()
@@ -0,0 +1,139 @@
+"""Requests/sec and latency of the device and telemetry endpoints under load.
+
+Drives a running telemetry service with many concurrent clients, each one
+looping over a mix of reads (device list, latest page of readings) and
+single-reading writes for its own device, and reports throughput and
+latency percentiles per endpoint.
+
+    uvicorn main:app --port 8001 --workers 1
+    python -m benchmarks.bench_async_db --url http://localhost:8001 --concurrency 500
+
+``--mix writes`` sends only single-reading writes, e.g. to compare
+TELEMETRY_INGEST_MODE=sync with write_behind (429s count as errors).
+
+Tokens are signed locally with JWT_SECRET, so the auth service is not needed.
+"""
+import argparse
+import asyncio
+import random
+import ssl
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+from jose import jwt
+
+from app.auth import ALGORITHM, SECRET_KEY
+
+# Relative weights of the request mix
+MIX = (("list_devices", 2), ("read_page", 5), ("write_reading", 3))
+MIXES = {
+    "default": MIX,
+    "writes": (("write_reading", 1),),
+}
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def auth_headers(user_id):
+    token = jwt.encode(
+        {"sub": f"bench{user_id}@example.com", "user_id": user_id,
+         "exp": datetime.utcnow() + timedelta(hours=1)},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+async def setup_client(client, user_id, semaphore):
+    headers = auth_headers(user_id)
+    async with semaphore:
+        response = await client.post(
+            "/api/devices", json={"name": "Bench", "device_type": "Bench"}, headers=headers
+        )
+    response.raise_for_status()
+    return headers, response.json()["id"]
+
+async def run_client(client, headers, device_id, deadline, latencies, errors, mix=MIX):
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    while time.perf_counter() < deadline:
+        name = random.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            if name == "list_devices":
+                response = await client.get("/api/devices", headers=headers)
+            elif name == "read_page":
+                response = await client.get(
+                    f"/api/telemetry/{device_id}", params={"limit": 100}, headers=headers
+                )
+            else:
+                response = await client.post("/api/telemetry", headers=headers, json={
+                    "device_id": device_id,
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "energy_watts": random.uniform(0, 2000),
+                })
+            response.raise_for_status()
+        except httpx.HTTPError:
+            errors[name] += 1
+            continue
+        latencies[name].append((time.perf_counter() - started) * 1000)
+
+async def run(args):
+    # One connection per simulated client, like independent devices and browsers;
+    # a single shared pool gets slow to schedule with hundreds of connections
+    limits = httpx.Limits(max_connections=1)
+    ssl_context = ssl.create_default_context()  # built once, not per client
+    clients = [
+        httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60, verify=ssl_context)
+        for _ in range(args.concurrency)
+    ]
+    try:
+        # One user and device per client so ownership checks are realistic
+        # (created a few at a time; setup is not part of the measurement)
+        first_user = random.randint(100000, 10000000)
+        semaphore = asyncio.Semaphore(10)
+        sessions = await asyncio.gather(*(
+            setup_client(client, first_user + i, semaphore) for i, client in enumerate(clients)
+        ))
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            run_client(client, headers, device_id, deadline, latencies, errors, MIXES[args.mix])
+            for client, (headers, device_id) in zip(clients, sessions)
+        ))
+        elapsed = time.perf_counter() - started
+    finally:
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+    print(f"url={args.url} mix={args.mix} concurrency={args.concurrency} duration={elapsed:.1f}s")
+    print(f"{'endpoint':>14} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50':>9} {'p99':>9}")
+    for name in [name for name, _ in MIXES[args.mix]] + ["total"]:
+        samples = (
+            [value for values in latencies.values() for value in values]
+            if name == "total" else latencies[name]
+        )
+        failed = sum(errors.values()) if name == "total" else errors[name]
+        if not samples:
+            print(f"{name:>14} {0:>9} {failed:>7}")
+            continue
+        print(
+            f"{name:>14} {len(samples):>9} {failed:>7} {len(samples) / elapsed:>8.0f} "
+            f"{statistics.median(samples):>7.1f}ms {percentile(samples, 0.99):>7.1f}ms"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default", help="Request mix")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
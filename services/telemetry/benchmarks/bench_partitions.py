@@ -0,0 +1,163 @@
+"""Range query latency as the telemetry table grows.
+
+Seeds a scratch schema with a probe device holding one week of minute data
+plus background readings from other devices spread over a year, then times
+the per-device 24h queries used by the API at each table size.
+
+    python -m benchmarks.bench_partitions --rows 1000000,10000000,100000000
+    python -m benchmarks.bench_partitions --layout plain   # pre-partitioning schema
+
+Needs a PostgreSQL DATABASE_URL; everything is created in the
+``telemetry_bench`` schema and dropped afterwards.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.models import Telemetry
+from app.partitions import add_months, create_partition, create_schema, month_start
+from app.stats import compute_stats
+
+SCHEMA = "telemetry_bench"
+PROBE_DEVICE_ID = 1
+BACKGROUND_DEVICES = 1000
+SPAN_DAYS = 365
+
+PLAIN_SCHEMA_SQL = """
+CREATE TABLE devices (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    device_type VARCHAR NOT NULL,
+    user_id INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+CREATE TABLE telemetry (
+    id SERIAL PRIMARY KEY,
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+    energy_watts DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def setup(engine, layout, now):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.exec_driver_sql(f"CREATE SCHEMA {SCHEMA}")
+        conn.exec_driver_sql(f"SET search_path TO {SCHEMA}")
+        if layout == "plain":
+            conn.exec_driver_sql(PLAIN_SCHEMA_SQL)
+        else:
+            create_schema(conn)
+            month = month_start(now - timedelta(days=SPAN_DAYS))
+            while month <= month_start(now):
+                create_partition(conn, month)
+                month = add_months(month, 1)
+
+        conn.execute(text("""
+            INSERT INTO devices (id, name, device_type, user_id)
+            SELECT g, 'Device ' || g, 'Bench', 1 FROM generate_series(1, :count) g
+        """), {"count": BACKGROUND_DEVICES + 1})
+        # Probe device: one week of minute data, identical at every table size
+        conn.execute(text("""
+            INSERT INTO telemetry (device_id, timestamp, energy_watts)
+            SELECT :device_id, :now - g * interval '1 minute', 100 + random() * 50
+            FROM generate_series(0, 7 * 24 * 60 - 1) g
+        """), {"device_id": PROBE_DEVICE_ID, "now": now})
+
+def grow(engine, current_rows, target_rows, now):
+    # Background readings scattered across the whole year, not appended
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"SET search_path TO {SCHEMA}")
+        conn.execute(text("""
+            INSERT INTO telemetry (device_id, timestamp, energy_watts)
+            SELECT
+                2 + g % :devices,
+                :now - ((g * 2654435761) % (:span_days * 86400)) * interval '1 second',
+                random() * 2000
+            FROM generate_series(:start, :stop) g
+        """), {
+            "devices": BACKGROUND_DEVICES,
+            "now": now,
+            "span_days": SPAN_DAYS,
+            "start": current_rows + 1,
+            "stop": target_rows,
+        })
+        conn.exec_driver_sql("ANALYZE telemetry")
+
+def time_queries(session_factory, now, queries):
+    raw_latencies = []
+    stats_latencies = []
+    db = session_factory()
+    try:
+        for _ in range(queries):
+            end_time = now - timedelta(minutes=random.randint(0, 6 * 24 * 60))
+            start_time = end_time - timedelta(hours=24)
+
+            started = time.perf_counter()
+            db.query(Telemetry.timestamp, Telemetry.energy_watts).filter(
+                Telemetry.device_id == PROBE_DEVICE_ID,
+                Telemetry.timestamp >= start_time,
+                Telemetry.timestamp <= end_time
+            ).order_by(Telemetry.timestamp.desc()).all()
+            raw_latencies.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            compute_stats(db, PROBE_DEVICE_ID, start_time, end_time)
+            stats_latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        db.close()
+    return raw_latencies, stats_latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000000,10000000,100000000",
+                        help="Comma-separated table sizes to measure at")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--layout", choices=["partitioned", "plain"], default="partitioned")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"options": f"-csearch_path={SCHEMA}"}
+    )
+    session_factory = sessionmaker(bind=engine)
+    now = datetime.utcnow().replace(microsecond=0)
+
+    setup(engine, args.layout, now)
+    current_rows = 7 * 24 * 60
+
+    print(f"layout={args.layout} queries={args.queries} (24h window, one device)")
+    print(f"{'rows':>12} {'seed s':>8} {'raw p50':>9} {'raw p95':>9} {'stats p50':>10} {'stats p95':>10}")
+    try:
+        for target_rows in (int(value) for value in args.rows.split(",")):
+            started = time.perf_counter()
+            grow(engine, current_rows, target_rows, now)
+            seed_seconds = time.perf_counter() - started
+            current_rows = max(current_rows, target_rows)
+
+            raw, stats = time_queries(session_factory, now, args.queries)
+            print(
+                f"{current_rows:>12,} {seed_seconds:>8.1f} "
+                f"{statistics.median(raw):>7.2f}ms {percentile(raw, 0.95):>7.2f}ms "
+                f"{statistics.median(stats):>8.2f}ms {percentile(stats, 0.95):>8.2f}ms"
+            )
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+if __name__ == "__main__":
+    main()
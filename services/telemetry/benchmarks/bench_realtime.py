@@ -0,0 +1,87 @@
+"""Cost of fanning new readings out to live subscribers, in process.
+
+Subscribes ``--subscribers`` clients spread over ``--devices`` devices,
+publishes ``--readings`` readings through the in-memory broker, and reports
+time per publish and per delivered message. A share of the subscribers
+(``--slow``) never read, to show their queues staying bounded by dropping
+the oldest readings instead of slowing the publisher down:
+
+    python -m benchmarks.bench_realtime --subscribers 1000 --devices 100 --readings 50000
+
+Without push, each dashboard re-fetches its summary (one stats and series
+query per device) on every poll; here a reading costs one publish.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from app.realtime import MemoryBroker, Realtime
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args):
+    realtime = Realtime(broker=MemoryBroker())
+    realtime.hub.queue_size = args.queue_size
+    await realtime.start()
+    subscriptions = [
+        realtime.hub.subscribe([i % args.devices])
+        for i in range(args.subscribers)
+    ]
+    readers = subscriptions[int(len(subscriptions) * args.slow):]
+    received = 0
+
+    async def read(subscription):
+        nonlocal received
+        while True:
+            await subscription.get()
+            received += 1
+
+    tasks = [asyncio.create_task(read(subscription)) for subscription in readers]
+    samples = []
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    for i in range(args.readings):
+        before = time.perf_counter()
+        await realtime.publish([(i % args.devices, now, 100.0)])
+        samples.append((time.perf_counter() - before) * 1e6)
+        if i % args.yield_every == 0:
+            # Let the readers drain, as the event loop would between requests
+            await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return samples, elapsed, received, subscriptions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--readings", type=int, default=50000)
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--slow", type=float, default=0.1, help="Fraction of subscribers that never read")
+    parser.add_argument("--yield-every", type=int, default=10, help="Publishes between event loop turns")
+    args = parser.parse_args()
+
+    samples, elapsed, received, subscriptions = asyncio.run(run(args))
+    per_device = args.subscribers / args.devices
+    queued = sum(len(subscription) for subscription in subscriptions)
+    dropped = sum(subscription.dropped for subscription in subscriptions)
+    print(
+        f"subscribers={args.subscribers} devices={args.devices} (~{per_device:g} per device) "
+        f"readings={args.readings} queue={args.queue_size} slow={args.slow:.0%}"
+    )
+    print(
+        f"publish        mean {statistics.mean(samples):.1f}us p50 {statistics.median(samples):.1f}us "
+        f"p99 {percentile(samples, 0.99):.1f}us  ({args.readings / elapsed:.0f} readings/s)"
+    )
+    print(f"delivered      {received} messages, {elapsed / max(received, 1) * 1e6:.2f}us each")
+    print(f"slow clients   {queued} readings queued (bound {args.queue_size} each), {dropped} dropped")
+
+if __name__ == "__main__":
+    main()
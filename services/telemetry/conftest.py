@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Make the service root importable so tests can use `app.*` and `main`,
+# and its parent so `shared.*` resolves as it does in the container
+SERVICE_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SERVICE_ROOT))
+sys.path.insert(0, SERVICE_ROOT)
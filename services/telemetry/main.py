@@ -1,20 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Response, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from typing import List, Optional
-import pandas as pd
+from pydantic import ValidationError
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 
-from app.database import get_db, init_db
+from app.database import async_engine, engine, get_async_db, get_db, init_db
 from app.models import Device, Telemetry
 from app.schemas import (
     DeviceCreate,
     DeviceResponse,
     TelemetryCreate,
     TelemetryResponse,
-    TelemetryStats
+    TelemetryBatchCreate,
+    TelemetryBatchResponse,
+    TelemetryReject,
+    TelemetryStats,
+    TelemetrySeries,
+    TelemetrySeriesPoint,
+    DeviceSummary,
+    DashboardSummary
 )
-from app.auth import get_current_user, User
+from app.ingest import BATCH_MAX_ROWS, insert_telemetry_rows_async
+from app.ownership import device_ownership
+from app.stats import compute_stats, empty_stats, resolve_period, to_utc_naive
+from app.rollups import (
+    RESOLUTIONS,
+    SERIES_MAX_POINTS,
+    STATS_SOURCE,
+    apply_readings,
+    pick_resolution,
+    rollup_series,
+    summarize_range
+)
+from app.stats_cache import stats_cache
+from app.downsample import METHODS, downsample_series, pick_source
+from app.partitions import maintenance_loop
+from app.realtime import realtime
+from app.write_behind import INGEST_MODE, ingest_queue
+from app.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    STREAM_CHUNK_SIZE,
+    before_cursor,
+    encode_cursor
+)
+from app.auth import get_current_user, revocations, verify_token, User
+from shared.metrics import render_metrics
 
 app = FastAPI(
     title="Smart Home Telemetry Service",
@@ -31,15 +68,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+maintenance_task: Optional[asyncio.Task] = None
+
 @app.on_event("startup")
 async def startup_event():
+    global maintenance_task
     init_db()
+    if engine.dialect.name == "postgresql":
+        # Keep monthly partitions created ahead of time and apply retention
+        maintenance_task = asyncio.create_task(maintenance_loop(engine))
+    # Subscribe to the broker before the first write so no reading is missed
+    await realtime.start()
+    if INGEST_MODE == "write_behind":
+        ingest_queue.start()
+    revocations.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    global maintenance_task
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+        await asyncio.gather(maintenance_task, return_exceptions=True)
+        maintenance_task = None
+    # Write out accepted readings while the database and broker are still there
+    await ingest_queue.close()
+    await realtime.close()
+    await revocations.close()
+    await async_engine.dispose()
 
 @app.post("/api/devices", response_model=DeviceResponse)
-def create_device(
+async def create_device(
     device: DeviceCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     db_device = Device(
         name=device.name,
@@ -47,152 +108,466 @@ def create_device(
         user_id=current_user.id
     )
     db.add(db_device)
-    db.commit()
-    db.refresh(db_device)
+    await db.commit()
+    device_ownership.device_created(current_user.id)
+    await db.refresh(db_device)
     return db_device
 
 @app.get("/api/devices", response_model=List[DeviceResponse])
-def get_user_devices(
+async def get_user_devices(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return db.query(Device).filter(Device.user_id == current_user.id).all()
+    return (await db.scalars(select(Device).where(Device.user_id == current_user.id))).all()
+
+def queue_readings(rows: List[Dict[str, Any]], rejected: List[TelemetryReject]) -> JSONResponse:
+    if not ingest_queue.offer(rows):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Ingest queue is full, retry later",
+            headers={"Retry-After": "1"}
+        )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=jsonable_encoder(TelemetryBatchResponse(accepted=len(rows), rejected=rejected))
+    )
 
-@app.post("/api/telemetry", response_model=TelemetryResponse)
-def create_telemetry(
+@app.post(
+    "/api/telemetry",
+    response_model=TelemetryResponse,
+    responses={202: {"model": TelemetryBatchResponse, "description": "Queued (write-behind mode)"}}
+)
+async def create_telemetry(
     telemetry: TelemetryCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify device belongs to user
-    device = db.query(Device).filter(
-        Device.id == telemetry.device_id,
-        Device.user_id == current_user.id
-    ).first()
-    
-    if not device:
+    if not await device_ownership.is_owned_async(db, current_user.id, telemetry.device_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Device not found or not owned by user"
         )
     
+    if INGEST_MODE == "write_behind":
+        return queue_readings([telemetry.model_dump()], [])
+    
     db_telemetry = Telemetry(
         device_id=telemetry.device_id,
         timestamp=telemetry.timestamp,
         energy_watts=telemetry.energy_watts
     )
     db.add(db_telemetry)
-    db.commit()
-    db.refresh(db_telemetry)
+    await db.flush()
+    # Rollup maintenance is shared with the sync code paths
+    await db.run_sync(
+        apply_readings,
+        [(db_telemetry.device_id, db_telemetry.timestamp, db_telemetry.energy_watts)]
+    )
+    await db.commit()
+    reading = (db_telemetry.device_id, db_telemetry.timestamp, db_telemetry.energy_watts)
+    await stats_cache.record_readings_async([reading])
+    await realtime.publish([reading])
+    await db.refresh(db_telemetry)
     return db_telemetry
 
+@app.post(
+    "/api/telemetry/batch",
+    response_model=TelemetryBatchResponse,
+    responses={202: {"model": TelemetryBatchResponse, "description": "Queued (write-behind mode)"}}
+)
+async def create_telemetry_batch(
+    batch: TelemetryBatchCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if len(batch.readings) > BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch too large. Maximum {BATCH_MAX_ROWS} readings per request"
+        )
+    
+    rejected = []
+    readings = []
+    for index, raw in enumerate(batch.readings):
+        try:
+            readings.append((index, TelemetryCreate.model_validate(raw)))
+        except ValidationError as e:
+            device_id = raw.get("device_id")
+            rejected.append(TelemetryReject(
+                index=index,
+                device_id=device_id if isinstance(device_id, int) else None,
+                detail="; ".join(err["msg"] for err in e.errors())
+            ))
+    
+    # Verify ownership of every referenced device with a single query
+    owned_device_ids = await device_ownership.owned_async(
+        db, current_user.id, {reading.device_id for _, reading in readings}
+    )
+    
+    rows = []
+    for index, reading in readings:
+        if reading.device_id not in owned_device_ids:
+            rejected.append(TelemetryReject(
+                index=index,
+                device_id=reading.device_id,
+                detail="Device not found or not owned by user"
+            ))
+            continue
+        rows.append(reading.model_dump())
+    
+    rejected.sort(key=lambda reject: reject.index)
+    if INGEST_MODE == "write_behind":
+        return queue_readings(rows, rejected)
+    
+    await insert_telemetry_rows_async(db, rows)
+    readings = [(row["device_id"], row["timestamp"], row["energy_watts"]) for row in rows]
+    await db.run_sync(apply_readings, readings)
+    await db.commit()
+    await stats_cache.record_readings_async(readings)
+    await realtime.publish(readings)
+    
+    return TelemetryBatchResponse(accepted=len(rows), rejected=rejected)
+
+def resolve_stats_window(
+    period: Optional[str],
+    start_time: Optional[datetime],
+    end_time: Optional[datetime]
+) -> Tuple[datetime, datetime]:
+    if start_time is None:
+        # Aligned end so repeated requests share a cache entry
+        return resolve_period(period, stats_cache.window_end())
+    start_time = to_utc_naive(start_time)
+    end_time = to_utc_naive(end_time) if end_time else datetime.utcnow()
+    if end_time <= start_time:
+        raise ValueError("end_time must be after start_time")
+    return start_time, end_time
+
+def summarize_stats(
+    db: Session,
+    device_ids: List[int],
+    period: Optional[str],
+    start_time: datetime,
+    end_time: datetime
+) -> Dict[int, Dict[str, float]]:
+    """Stats for the devices with readings in the range; named periods (``period``) go through the cache."""
+    if STATS_SOURCE == "raw":
+        # Aggregate in the database rather than loading every reading
+        return {device_id: compute_stats(db, device_id, start_time, end_time) for device_id in device_ids}
+    if period is None:
+        summaries = summarize_range(db, device_ids, start_time, end_time)
+    else:
+        summaries = stats_cache.summarize(db, device_ids, period, end_time)
+    return {device_id: summary.to_stats() for device_id, summary in summaries.items() if summary}
+
+# Declared before the /api/telemetry/{device_id} routes so "stats" is not taken for an id
+@app.get("/api/telemetry/stats", response_model=List[TelemetryStats])
+def get_devices_stats(
+    device_ids: Optional[List[int]] = Query(None),  # All of the user's devices if omitted
+    period: str = "24h",  # Supports: 24h, 7d, 30d; ignored when start_time is given
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if device_ids:
+        device_ids = sorted(set(device_ids))
+        # Verify devices belong to user
+        if device_ownership.owned(db, current_user.id, device_ids) != set(device_ids):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Device not found or not owned by user"
+            )
+    else:
+        device_ids = [
+            device_id for device_id, in
+            db.query(Device.id).filter(Device.user_id == current_user.id).order_by(Device.id)
+        ]
+    
+    if start_time is not None:
+        period = None
+    try:
+        start_time, end_time = resolve_stats_window(period, start_time, end_time)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    # One grouped query for every device rather than one request per device
+    stats = summarize_stats(db, device_ids, period, start_time, end_time)
+    return [
+        TelemetryStats(device_id=device_id, period=period or "custom", **stats.get(device_id, empty_stats()))
+        for device_id in device_ids
+    ]
+
+@app.websocket("/api/telemetry/live")
+async def live_telemetry(
+    websocket: WebSocket,
+    token: str,  # Browsers cannot set headers on a WebSocket, so the bearer token comes as a parameter
+    device_ids: Optional[List[int]] = Query(None),  # All of the user's devices if omitted
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        current_user = verify_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    if device_ids:
+        owned = await device_ownership.owned_async(db, current_user.id, device_ids) == set(device_ids)
+    else:
+        device_ids = (await db.scalars(select(Device.id).where(Device.user_id == current_user.id))).all()
+        owned = True
+    # The socket may stay open for hours; give the connection back to the pool now
+    await db.close()
+    if not owned:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await realtime.start()
+    subscription = realtime.hub.subscribe(device_ids)
+
+    async def send_readings():
+        while True:
+            await websocket.send_json(await subscription.get())
+
+    async def wait_for_disconnect():
+        # Clients send nothing; reading is only how a closed socket is noticed
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(send_readings()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        realtime.hub.unsubscribe(subscription)
+
 @app.get("/api/telemetry/{device_id}", response_model=List[TelemetryResponse])
-def get_device_telemetry(
+async def get_device_telemetry(
+    response: Response,
     device_id: int,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
+    # One page at a time; /api/telemetry/{device_id}/stream returns a whole range
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,  # X-Next-Cursor from the previous page
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify device belongs to user
-    device = db.query(Device).filter(
-        Device.id == device_id,
-        Device.user_id == current_user.id
-    ).first()
-    
-    if not device:
+    if not await device_ownership.is_owned_async(db, current_user.id, device_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Device not found or not owned by user"
         )
     
-    query = db.query(Telemetry).filter(Telemetry.device_id == device_id)
+    statement = select(Telemetry).where(Telemetry.device_id == device_id)
     
     if start_time:
-        query = query.filter(Telemetry.timestamp >= start_time)
+        statement = statement.where(Telemetry.timestamp >= start_time)
     if end_time:
-        query = query.filter(Telemetry.timestamp <= end_time)
+        statement = statement.where(Telemetry.timestamp <= end_time)
+    if cursor:
+        try:
+            statement = statement.where(before_cursor(cursor))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
     
-    return query.order_by(Telemetry.timestamp.desc()).all()
+    # Keyset pagination: newest first, one extra row tells us if there is more
+    statement = statement.order_by(Telemetry.timestamp.desc(), Telemetry.id.desc()).limit(limit + 1)
+    rows = (await db.scalars(statement)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return rows
+
+@app.get("/api/telemetry/{device_id}/stream")
+def stream_device_telemetry(
+    device_id: int,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Verify device belongs to user
+    if not device_ownership.is_owned(db, current_user.id, device_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device not found or not owned by user"
+        )
+    
+    statement = select(
+        Telemetry.id,
+        Telemetry.device_id,
+        Telemetry.timestamp,
+        Telemetry.energy_watts,
+        Telemetry.created_at
+    ).where(Telemetry.device_id == device_id)
+    if start_time:
+        statement = statement.where(Telemetry.timestamp >= start_time)
+    if end_time:
+        statement = statement.where(Telemetry.timestamp <= end_time)
+    statement = statement.order_by(Telemetry.timestamp.desc(), Telemetry.id.desc())
+    
+    def generate_ndjson():
+        # yield_per streams from a server-side cursor, so memory stays at one chunk
+        result = db.execute(statement.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        for partition in result.partitions():
+            yield "".join(
+                TelemetryResponse.model_validate(row).model_dump_json() + "\n"
+                for row in partition
+            )
+    
+    return StreamingResponse(generate_ndjson(), media_type="application/x-ndjson")
 
 @app.get("/api/telemetry/{device_id}/stats", response_model=TelemetryStats)
 def get_device_stats(
     device_id: int,
-    period: str = "24h",  # Supports: 24h, 7d, 30d
+    period: str = "24h",  # Supports: 24h, 7d, 30d; ignored when start_time is given
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Verify device belongs to user
-    device = db.query(Device).filter(
-        Device.id == device_id,
-        Device.user_id == current_user.id
-    ).first()
-    
-    if not device:
+    if not device_ownership.is_owned(db, current_user.id, device_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Device not found or not owned by user"
         )
     
-    # Calculate time range
-    end_time = datetime.utcnow()
-    if period == "24h":
-        start_time = end_time - timedelta(hours=24)
-    elif period == "7d":
-        start_time = end_time - timedelta(days=7)
-    elif period == "30d":
-        start_time = end_time - timedelta(days=30)
-    else:
+    if start_time is not None:
+        period = None
+    try:
+        start_time, end_time = resolve_stats_window(period, start_time, end_time)
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid period. Supported values: 24h, 7d, 30d"
+            detail=str(e)
         )
     
-    # Get telemetry data
-    telemetry_data = db.query(Telemetry).filter(
-        Telemetry.device_id == device_id,
-        Telemetry.timestamp >= start_time,
-        Telemetry.timestamp <= end_time
-    ).all()
+    stats = summarize_stats(db, [device_id], period, start_time, end_time).get(device_id, empty_stats())
+    return TelemetryStats(device_id=device_id, period=period or "custom", **stats)
+
+@app.get("/api/telemetry/{device_id}/series", response_model=TelemetrySeries)
+def get_device_series(
+    device_id: int,
+    period: str = "24h",  # Ignored when start_time is given
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    resolution: Optional[str] = None,  # 1m, 1h or 1d; picked from the range if omitted
+    max_points: Optional[int] = Query(None, ge=3, le=SERIES_MAX_POINTS),
+    method: str = "lttb",  # lttb or bucket (per-bucket avg/min/max); used with max_points
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Verify device belongs to user
+    if not device_ownership.is_owned(db, current_user.id, device_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device not found or not owned by user"
+        )
     
-    if not telemetry_data:
-        return TelemetryStats(
+    try:
+        if start_time is None:
+            start_time, end_time = resolve_period(period, end_time)
+        end_time = end_time or datetime.utcnow()
+        if resolution is not None and resolution not in RESOLUTIONS:
+            raise ValueError(f"Invalid resolution. Supported values: {', '.join(RESOLUTIONS)}")
+        if method not in METHODS:
+            raise ValueError(f"Invalid method. Supported values: {', '.join(METHODS)}")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if max_points is not None:
+        source = RESOLUTIONS[resolution] if resolution else pick_source(start_time, end_time, max_points)
+        points = downsample_series(
+            db, [device_id], start_time, end_time, max_points, method, source
+        ).get(device_id, [])
+        return TelemetrySeries(
             device_id=device_id,
-            period=period,
-            avg_energy_watts=0,
-            max_energy_watts=0,
-            min_energy_watts=0,
-            total_energy_watt_hours=0
+            resolution=source.name if source else "raw",
+            method=method,
+            points=points
         )
     
-    # Convert to pandas DataFrame for easy calculations
-    df = pd.DataFrame([{
-        'timestamp': t.timestamp,
-        'energy_watts': t.energy_watts
-    } for t in telemetry_data])
-    
-    # Calculate statistics
-    avg_energy = df['energy_watts'].mean()
-    max_energy = df['energy_watts'].max()
-    min_energy = df['energy_watts'].min()
-    
-    # Calculate total energy (watt-hours) using trapezoidal integration
-    df = df.sort_values('timestamp')
-    total_energy = 0
-    if len(df) > 1:
-        time_diff_hours = [(t2 - t1).total_seconds() / 3600 
-                          for t1, t2 in zip(df['timestamp'][:-1], df['timestamp'][1:])]
-        avg_power = [(p1 + p2) / 2 
-                    for p1, p2 in zip(df['energy_watts'][:-1], df['energy_watts'][1:])]
-        total_energy = sum(t * p for t, p in zip(time_diff_hours, avg_power))
-    
-    return TelemetryStats(
+    if resolution is None:
+        granularity = pick_resolution(start_time, end_time, SERIES_MAX_POINTS)
+    else:
+        granularity = RESOLUTIONS[resolution]
+    rows = rollup_series(db, [device_id], granularity, start_time, end_time).get(device_id, [])
+    return TelemetrySeries(
         device_id=device_id,
+        resolution=granularity.name,
+        points=[
+            TelemetrySeriesPoint(
+                timestamp=row.bucket_start,
+                energy_watts=row.sum_energy_watts / row.count,
+                min_energy_watts=row.min_energy_watts,
+                max_energy_watts=row.max_energy_watts,
+                count=row.count,
+                energy_watt_hours=row.energy_watt_hours
+            )
+            for row in rows
+        ]
+    )
+
+@app.get("/api/dashboard/summary", response_model=DashboardSummary)
+def get_dashboard_summary(
+    period: str = "24h",  # Supports: 24h, 7d, 30d
+    max_points: int = Query(200, ge=3, le=SERIES_MAX_POINTS),
+    method: str = "lttb",  # lttb or bucket
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        start_time, end_time = resolve_period(period, stats_cache.window_end())
+        if method not in METHODS:
+            raise ValueError(f"Invalid method. Supported values: {', '.join(METHODS)}")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    devices = db.query(Device).filter(Device.user_id == current_user.id).order_by(Device.id).all()
+    device_ids = [device.id for device in devices]
+    
+    # Stats and series for every device come from grouped queries, not one per device
+    stats = summarize_stats(db, device_ids, period, start_time, end_time)
+    source = pick_source(start_time, end_time, max_points)
+    series = downsample_series(db, device_ids, start_time, end_time, max_points, method, source)
+    
+    return DashboardSummary(
         period=period,
-        avg_energy_watts=avg_energy,
-        max_energy_watts=max_energy,
-        min_energy_watts=min_energy,
-        total_energy_watt_hours=total_energy
+        devices=[
+            DeviceSummary(
+                device=device,
+                stats=TelemetryStats(
+                    device_id=device.id,
+                    period=period,
+                    **stats.get(device.id, empty_stats())
+                ),
+                series=TelemetrySeries(
+                    device_id=device.id,
+                    resolution=source.name if source else "raw",
+                    method=method,
+                    points=series.get(device.id, [])
+                )
+            )
+            for device in devices
+        ]
     )
 
 @app.get("/health")
@@ -207,6 +582,11 @@ def health_check(db: Session = Depends(get_db)):
             detail=f"Service unhealthy: {str(e)}"
         )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text format: connection pool checkout wait, in use, overflow
+    return render_metrics()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
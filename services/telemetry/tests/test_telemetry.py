@@ -0,0 +1,738 @@
+import asyncio
+import json
+import struct
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from app.auth import SECRET_KEY, ALGORITHM, revocations, token_cache
+from app.database import Base, get_async_db, get_db
+from app.downsample import pick_source
+from app.ownership import device_ownership
+from app.realtime import Hub
+from app.rollups import GRANULARITIES, Summary
+from app.seed import PROFILES, binary_copy_data, day_rng, generate_device_day, summarize_buckets
+from app.stats_cache import HITS, MISSES, StatsCache, stats_cache
+from app import write_behind
+from app.write_behind import BATCH_SIZE, WriteBehindQueue
+import main
+from main import app
+from shared.revocation import EMPTY_SNAPSHOT, RevocationSnapshot
+
+# Create test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+# Async handlers share the same file; NullPool keeps connections off the test client's loop
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+
+def auth_headers(user_id=1, email="test@example.com"):
+    token = jwt.encode(
+        {"sub": email, "user_id": user_id, "exp": datetime.utcnow() + timedelta(hours=1)},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def client():
+    Base.metadata.create_all(bind=engine)
+    # Device ids restart with every test database
+    stats_cache.clear()
+    device_ownership.clear()
+    yield TestClient(app)
+    Base.metadata.drop_all(bind=engine)
+
+def create_device(client, name="Refrigerator", user_id=1):
+    response = client.post(
+        "/api/devices",
+        json={"name": name, "device_type": name},
+        headers=auth_headers(user_id)
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def test_create_telemetry(client):
+    device_id = create_device(client)
+    response = client.post(
+        "/api/telemetry",
+        json={
+            "device_id": device_id,
+            "timestamp": "2024-01-01T00:00:00",
+            "energy_watts": 120.5
+        },
+        headers=auth_headers()
+    )
+    assert response.status_code == 200
+    assert response.json()["energy_watts"] == 120.5
+
+def test_create_telemetry_batch(client):
+    device_id = create_device(client)
+    other_device_id = create_device(client, name="Heater", user_id=2)
+    start = datetime(2024, 1, 1)
+    readings = [
+        {
+            "device_id": device_id,
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+            "energy_watts": 100 + i
+        }
+        for i in range(50)
+    ]
+    readings.insert(10, {"device_id": other_device_id, "timestamp": start.isoformat(), "energy_watts": 5})
+    readings.insert(20, {"device_id": device_id, "timestamp": start.isoformat(), "energy_watts": -1})
+
+    response = client.post(
+        "/api/telemetry/batch",
+        json={"readings": readings},
+        headers=auth_headers()
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["accepted"] == 50
+    assert [reject["index"] for reject in data["rejected"]] == [10, 20]
+    assert data["rejected"][0]["device_id"] == other_device_id
+
+    response = client.get(f"/api/telemetry/{device_id}", headers=auth_headers())
+    assert len(response.json()) == 50
+
+def test_device_stats(client):
+    device_id = create_device(client)
+    now = datetime.utcnow().replace(microsecond=0)
+    readings = [
+        (now - timedelta(hours=3), 100.0),
+        (now - timedelta(hours=2), 300.0),
+        (now - timedelta(hours=1), 200.0),
+        (now - timedelta(days=3), 1000.0),  # Outside the 24h window
+    ]
+    client.post(
+        "/api/telemetry/batch",
+        json={"readings": [
+            {"device_id": device_id, "timestamp": ts.isoformat(), "energy_watts": watts}
+            for ts, watts in readings
+        ]},
+        headers=auth_headers()
+    )
+
+    response = client.get(
+        f"/api/telemetry/{device_id}/stats",
+        params={"period": "24h"},
+        headers=auth_headers()
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["avg_energy_watts"] == pytest.approx(200.0)
+    assert data["max_energy_watts"] == 300.0
+    assert data["min_energy_watts"] == 100.0
+    # (100 + 300) / 2 * 1h + (300 + 200) / 2 * 1h
+    assert data["total_energy_watt_hours"] == pytest.approx(450.0)
+
+    # An explicit window, e.g. a calendar day, replaces the trailing period
+    response = client.get(
+        f"/api/telemetry/{device_id}/stats",
+        params={
+            "start_time": (now - timedelta(hours=2, minutes=30)).isoformat(),
+            "end_time": (now - timedelta(minutes=30)).isoformat()
+        },
+        headers=auth_headers()
+    )
+    data = response.json()
+    assert data["period"] == "custom"
+    assert data["avg_energy_watts"] == pytest.approx(250.0)
+    assert data["total_energy_watt_hours"] == pytest.approx(250.0)
+
+    response = client.get(
+        "/api/telemetry/stats",
+        params={"start_time": (now - timedelta(days=4)).isoformat(), "end_time": (now - timedelta(days=2)).isoformat()},
+        headers=auth_headers()
+    )
+    assert response.json()[0]["max_energy_watts"] == 1000.0
+
+def test_device_stats_invalid_period(client):
+    device_id = create_device(client)
+    response = client.get(
+        f"/api/telemetry/{device_id}/stats",
+        params={"period": "1y"},
+        headers=auth_headers()
+    )
+    assert response.status_code == 400
+
+def test_rollup_stats_match_raw(client):
+    from app.stats import compute_stats
+    from app.rollups import summarize_range
+
+    device_id = create_device(client)
+    start = datetime(2024, 1, 1)
+    readings = [
+        {
+            "device_id": device_id,
+            "timestamp": (start + timedelta(seconds=37 * i)).isoformat(),
+            "energy_watts": 100 + (i * 7) % 50
+        }
+        for i in range(0, 6000, 2)
+    ]
+    client.post("/api/telemetry/batch", json={"readings": readings}, headers=auth_headers())
+    # Out-of-order readings landing inside existing buckets
+    for i in range(1, 6000, 400):
+        client.post(
+            "/api/telemetry",
+            json={
+                "device_id": device_id,
+                "timestamp": (start + timedelta(seconds=37 * i)).isoformat(),
+                "energy_watts": 42
+            },
+            headers=auth_headers()
+        )
+
+    db = TestingSessionLocal()
+    try:
+        for range_start, range_end in [
+            (start, start + timedelta(days=3)),
+            (start + timedelta(minutes=61, seconds=5), start + timedelta(hours=30, seconds=17)),
+            (start + timedelta(seconds=10), start + timedelta(seconds=50)),
+        ]:
+            raw = compute_stats(db, device_id, range_start, range_end)
+            rolled = summarize_range(db, [device_id], range_start, range_end)[device_id].to_stats()
+            for key, value in raw.items():
+                assert rolled[key] == pytest.approx(value)
+    finally:
+        db.close()
+
+def test_device_series(client):
+    device_id = create_device(client)
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    readings = [
+        {
+            "device_id": device_id,
+            "timestamp": (now - timedelta(hours=3) + timedelta(minutes=10 * i)).isoformat(),
+            "energy_watts": 60 * (i // 6 + 1)
+        }
+        for i in range(18)
+    ]
+    client.post("/api/telemetry/batch", json={"readings": readings}, headers=auth_headers())
+
+    response = client.get(
+        f"/api/telemetry/{device_id}/series",
+        params={"period": "24h", "resolution": "1h"},
+        headers=auth_headers()
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["resolution"] == "1h"
+    assert [point["energy_watts"] for point in data["points"]] == [60, 120, 180]
+    assert [point["count"] for point in data["points"]] == [6, 6, 6]
+
+    response = client.get(
+        f"/api/telemetry/{device_id}/series",
+        params={"resolution": "5m"},
+        headers=auth_headers()
+    )
+    assert response.status_code == 400
+
+def test_telemetry_keyset_pagination(client):
+    device_id = create_device(client)
+    start = datetime(2024, 1, 1)
+    readings = [
+        {
+            "device_id": device_id,
+            # Pairs of identical timestamps exercise the id tie-breaker
+            "timestamp": (start + timedelta(minutes=i // 2)).isoformat(),
+            "energy_watts": i
+        }
+        for i in range(25)
+    ]
+    client.post("/api/telemetry/batch", json={"readings": readings}, headers=auth_headers())
+
+    seen = []
+    params = {"limit": 10}
+    while True:
+        response = client.get(f"/api/telemetry/{device_id}", params=params, headers=auth_headers())
+        assert response.status_code == 200
+        seen.extend(row["energy_watts"] for row in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 10, "cursor": cursor}
+    assert seen == [float(i) for i in reversed(range(25))]
+
+    response = client.get(
+        f"/api/telemetry/{device_id}",
+        params={"cursor": "not-a-cursor"},
+        headers=auth_headers()
+    )
+    assert response.status_code == 400
+
+def test_stream_device_telemetry(client):
+    device_id = create_device(client)
+    start = datetime(2024, 1, 1)
+    readings = [
+        {"device_id": device_id, "timestamp": (start + timedelta(minutes=i)).isoformat(), "energy_watts": i}
+        for i in range(5000)
+    ]
+    client.post("/api/telemetry/batch", json={"readings": readings}, headers=auth_headers())
+
+    response = client.get(f"/api/telemetry/{device_id}/stream", headers=auth_headers())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    assert len(lines) == 5000
+    assert json.loads(lines[0])["energy_watts"] == 4999
+
+def test_device_series_downsampled(client):
+    device_id = create_device(client)
+    end = datetime.utcnow().replace(microsecond=0)
+    readings = [
+        {
+            "device_id": device_id,
+            "timestamp": (end - timedelta(seconds=20 * i)).isoformat(),
+            # Flat load with a single spike that must survive downsampling
+            "energy_watts": 5000 if i == 777 else 100 + i % 3
+        }
+        for i in range(2000)
+    ]
+    client.post("/api/telemetry/batch", json={"readings": readings}, headers=auth_headers())
+
+    for method in ("lttb", "bucket"):
+        response = client.get(
+            f"/api/telemetry/{device_id}/series",
+            params={"period": "24h", "end_time": end.isoformat(), "max_points": 100, "method": method},
+            headers=auth_headers()
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["method"] == method
+        assert 0 < len(data["points"]) <= 100
+        assert max(point["max_energy_watts"] for point in data["points"]) == 5000
+        assert sum(point["count"] for point in data["points"]) <= 2000
+
+    response = client.get(
+        f"/api/telemetry/{device_id}/series",
+        params={"max_points": 100, "method": "spline"},
+        headers=auth_headers()
+    )
+    assert response.status_code == 400
+
+    # More points than minutes in the range still reads the minute rollup, not raw rows
+    response = client.get(
+        f"/api/telemetry/{device_id}/series",
+        params={"period": "24h", "end_time": end.isoformat(), "max_points": 1500},
+        headers=auth_headers()
+    )
+    assert response.json()["resolution"] == "1m"
+    assert pick_source(end - timedelta(seconds=30), end, 100) is None
+
+def test_dashboard_summary(client):
+    fridge_id = create_device(client, name="Refrigerator")
+    heater_id = create_device(client, name="Heater")
+    create_device(client, name="Other user's device", user_id=2)
+    idle_id = create_device(client, name="Idle")
+    now = datetime.utcnow().replace(microsecond=0)
+    readings = [
+        {
+            "device_id": device_id,
+            "timestamp": (now - timedelta(minutes=5 * i)).isoformat(),
+            "energy_watts": watts
+        }
+        for device_id, watts in [(fridge_id, 100), (heater_id, 2000)]
+        for i in range(100)
+    ]
+    client.post("/api/telemetry/batch", json={"readings": readings}, headers=auth_headers())
+
+    response = client.get(
+        "/api/dashboard/summary",
+        params={"period": "24h", "max_points": 50},
+        headers=auth_headers()
+    )
+    assert response.status_code == 200
+    devices = {entry["device"]["id"]: entry for entry in response.json()["devices"]}
+    assert set(devices) == {fridge_id, heater_id, idle_id}
+    assert devices[fridge_id]["stats"]["avg_energy_watts"] == pytest.approx(100)
+    assert devices[heater_id]["stats"]["max_energy_watts"] == 2000
+    assert 0 < len(devices[heater_id]["series"]["points"]) <= 50
+    assert devices[idle_id]["stats"]["total_energy_watt_hours"] == 0
+    assert devices[idle_id]["series"]["points"] == []
+
+def test_grouped_device_stats(client):
+    fridge_id = create_device(client, name="Refrigerator")
+    heater_id = create_device(client, name="Heater")
+    idle_id = create_device(client, name="Idle")
+    other_id = create_device(client, name="Other user's device", user_id=2)
+    now = datetime.utcnow().replace(microsecond=0)
+    readings = [
+        {
+            "device_id": device_id,
+            "timestamp": (now - timedelta(minutes=5 * i)).isoformat(),
+            "energy_watts": watts
+        }
+        for device_id, watts in [(fridge_id, 100), (heater_id, 2000)]
+        for i in range(12)
+    ]
+    client.post("/api/telemetry/batch", json={"readings": readings}, headers=auth_headers())
+
+    # Every device of the user when none are named
+    response = client.get("/api/telemetry/stats", params={"period": "24h"}, headers=auth_headers())
+    assert response.status_code == 200
+    stats = {entry["device_id"]: entry for entry in response.json()}
+    assert set(stats) == {fridge_id, heater_id, idle_id}
+    assert stats[heater_id]["avg_energy_watts"] == pytest.approx(2000)
+    assert stats[idle_id]["total_energy_watt_hours"] == 0
+    assert stats[heater_id] == get_stats(client, heater_id)
+
+    response = client.get(
+        "/api/telemetry/stats",
+        params={"period": "7d", "device_ids": [heater_id, fridge_id]},
+        headers=auth_headers()
+    )
+    assert response.status_code == 200
+    assert [entry["device_id"] for entry in response.json()] == sorted([fridge_id, heater_id])
+
+    response = client.get(
+        "/api/telemetry/stats",
+        params={"device_ids": [fridge_id, other_id]},
+        headers=auth_headers()
+    )
+    assert response.status_code == 404
+
+def test_live_telemetry(client):
+    fridge = create_device(client, "Refrigerator")
+    washer = create_device(client, "Washing Machine")
+    token = auth_headers()["Authorization"].split()[1]
+
+    with client.websocket_connect(f"/api/telemetry/live?token={token}&device_ids={fridge}") as websocket:
+        for device_id, watts in ((washer, 500.0), (fridge, 120.0)):
+            response = client.post(
+                "/api/telemetry",
+                json={"device_id": device_id, "timestamp": "2024-01-01T00:00:00", "energy_watts": watts},
+                headers=auth_headers()
+            )
+            assert response.status_code == 200
+        # Only the subscribed device's reading arrives
+        assert websocket.receive_json() == {
+            "device_id": fridge, "timestamp": "2024-01-01T00:00:00", "energy_watts": 120.0
+        }
+
+def test_live_telemetry_requires_owned_devices(client):
+    other = create_device(client, "Refrigerator", user_id=2)
+    token = auth_headers()["Authorization"].split()[1]
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/api/telemetry/live?token={token}&device_ids={other}"):
+            pass
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/telemetry/live?token=invalid"):
+            pass
+
+def test_live_subscription_drops_oldest():
+    async def scenario():
+        hub = Hub(queue_size=2)
+        subscription = hub.subscribe([1])
+        for watts in (1.0, 2.0, 3.0):
+            hub.deliver({"device_id": 1, "energy_watts": watts})
+        hub.deliver({"device_id": 2, "energy_watts": 4.0})
+        received = [(await subscription.get())["energy_watts"] for _ in range(len(subscription))]
+        hub.unsubscribe(subscription)
+        return received, subscription.dropped
+
+    assert asyncio.run(scenario()) == ([2.0, 3.0], 1)
+
+def test_write_behind_ingest(client, monkeypatch):
+    device_id = create_device(client)
+    queue = WriteBehindQueue(max_size=2, batch_size=10, session_factory=TestingAsyncSessionLocal)
+    monkeypatch.setattr(main, "INGEST_MODE", "write_behind")
+    monkeypatch.setattr(main, "ingest_queue", queue)
+
+    response = client.post(
+        "/api/telemetry",
+        json={"device_id": device_id, "timestamp": "2024-01-01T00:00:00", "energy_watts": 100.0},
+        headers=auth_headers()
+    )
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 1, "rejected": []}
+    # Acknowledged but not written yet
+    assert client.get(f"/api/telemetry/{device_id}", headers=auth_headers()).json() == []
+
+    response = client.post(
+        "/api/telemetry/batch",
+        json={"readings": [
+            {"device_id": device_id, "timestamp": f"2024-01-01T00:0{minute}:00", "energy_watts": 100.0}
+            for minute in (1, 2)
+        ]},
+        headers=auth_headers()
+    )
+    assert response.status_code == 429
+    assert len(queue) == 1
+
+    batches = BATCH_SIZE.count
+    asyncio.run(queue.close())
+    assert BATCH_SIZE.count == batches + 1
+    assert len(client.get(f"/api/telemetry/{device_id}", headers=auth_headers()).json()) == 1
+    # Closed queues refuse new readings
+    assert not queue.offer([{"device_id": device_id}])
+
+def test_write_behind_flushes_by_age(client):
+    device_id = create_device(client)
+    rows = [
+        {"device_id": device_id, "timestamp": datetime(2024, 1, 1, 0, minute), "energy_watts": 50.0}
+        for minute in range(3)
+    ]
+
+    async def scenario():
+        queue = WriteBehindQueue(batch_size=100, max_delay_seconds=0.05, session_factory=TestingAsyncSessionLocal)
+        queue.start()
+        # Let the writer go idle on an empty queue first
+        await asyncio.sleep(0.05)
+        assert queue.offer(rows)
+        await asyncio.sleep(0.3)
+        # Written as one batch by the background task, well before the size limit
+        pending = len(queue)
+        await queue.close()
+        return pending
+
+    assert asyncio.run(scenario()) == 0
+    assert len(client.get(f"/api/telemetry/{device_id}", headers=auth_headers()).json()) == 3
+
+def test_write_behind_drops_only_failing_rows(client, monkeypatch):
+    device_id = create_device(client)
+    monkeypatch.setattr(write_behind, "INGEST_FLUSH_RETRIES", 0)
+    rows = [
+        {"device_id": device_id, "timestamp": datetime(2024, 1, 1, 0, minute), "energy_watts": 50.0}
+        for minute in range(7)
+    ]
+    # Violates NOT NULL, so every batch holding it fails
+    rows[4]["energy_watts"] = None
+
+    async def fail(readings):
+        raise ConnectionError("stats cache is down")
+    monkeypatch.setattr(write_behind.stats_cache, "record_readings_async", fail)
+
+    async def scenario():
+        queue = WriteBehindQueue(batch_size=100, max_delay_seconds=0.01, session_factory=TestingAsyncSessionLocal)
+        queue.start()
+        assert queue.offer(rows)
+        await asyncio.sleep(0.3)
+        # The writer survives the failing cache and keeps taking readings
+        assert queue.offer([{**rows[0], "timestamp": datetime(2024, 1, 1, 1)}])
+        await queue.close()
+
+    failed = write_behind.FAILED.value
+    asyncio.run(scenario())
+    assert write_behind.FAILED.value == failed + 1
+    assert len(client.get(f"/api/telemetry/{device_id}", headers=auth_headers()).json()) == 7
+
+def test_metrics_endpoint(client):
+    create_device(client)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Service pools are registered at import time, whether or not the tests use them
+    assert '# TYPE db_pool_checkout_seconds histogram' in response.text
+    assert 'db_pool_checked_out{pool="sync"}' in response.text
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands the stats cache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+def post_reading(client, device_id, timestamp, watts):
+    response = client.post(
+        "/api/telemetry",
+        json={"device_id": device_id, "timestamp": timestamp.isoformat(), "energy_watts": watts},
+        headers=auth_headers()
+    )
+    assert response.status_code == 200
+
+def get_stats(client, device_id):
+    response = client.get(
+        f"/api/telemetry/{device_id}/stats",
+        params={"period": "24h"},
+        headers=auth_headers()
+    )
+    assert response.status_code == 200
+    return response.json()
+
+def test_stats_cache_hits_and_write_through(client):
+    device_id = create_device(client)
+    now = datetime.utcnow().replace(microsecond=0)
+    post_reading(client, device_id, now - timedelta(hours=2), 100)
+    post_reading(client, device_id, now - timedelta(hours=1), 300)
+
+    hits, misses = HITS["local"].value, MISSES.value
+    first = get_stats(client, device_id)
+    assert get_stats(client, device_id) == first
+    assert (HITS["local"].value - hits, MISSES.value - misses) == (1, 1)
+
+    # A newer reading is folded into the cached entry
+    post_reading(client, device_id, now - timedelta(minutes=30), 500)
+    patched = get_stats(client, device_id)
+    assert HITS["local"].value - hits == 2
+    assert patched["max_energy_watts"] == 500
+    assert patched["avg_energy_watts"] == pytest.approx(300)
+    # (100 + 300) / 2 * 1h + (300 + 500) / 2 * 0.5h
+    assert patched["total_energy_watt_hours"] == pytest.approx(400)
+
+    # A reading in the middle of the window invalidates it
+    post_reading(client, device_id, now - timedelta(minutes=90), 0)
+    recomputed = get_stats(client, device_id)
+    assert MISSES.value - misses == 2
+    assert recomputed["min_energy_watts"] == 0
+    assert recomputed["avg_energy_watts"] == pytest.approx(225)
+
+def test_stats_cache_shared_tier(client):
+    device_id = create_device(client)
+    now = datetime.utcnow().replace(microsecond=0)
+    post_reading(client, device_id, now - timedelta(hours=1), 100)
+
+    redis = FakeRedis()
+    worker_a, worker_b = StatsCache(shared=redis), StatsCache(shared=redis)
+    end_time = worker_a.window_end()
+    db = TestingSessionLocal()
+    try:
+        summary = worker_a.summarize(db, [device_id], "24h", end_time)[device_id]
+        assert summary.count == 1
+
+        # Filled by worker A, served to worker B from the shared tier
+        shared_hits = HITS["shared"].value
+        assert worker_b.summarize(db, [device_id], "24h", end_time)[device_id] == summary
+        assert HITS["shared"].value - shared_hits == 1
+
+        # A write recorded by worker B retires worker A's local copy
+        post_reading(client, device_id, now - timedelta(minutes=2), 300)
+        worker_b.record_readings([(device_id, now - timedelta(minutes=2), 300)])
+        assert worker_a.summarize(db, [device_id], "24h", end_time)[device_id].count == 2
+    finally:
+        db.close()
+
+def test_ownership_cache_sees_new_devices(client):
+    first_id = create_device(client)
+    other_id = create_device(client, name="Heater", user_id=2)
+    now = datetime.utcnow().replace(microsecond=0)
+    post_reading(client, first_id, now, 100)  # Loads user 1's devices into the cache
+
+    response = client.post(
+        "/api/telemetry",
+        json={"device_id": other_id, "timestamp": now.isoformat(), "energy_watts": 1},
+        headers=auth_headers()
+    )
+    assert response.status_code == 404
+
+    # create_device drops the cached set, so the new device is usable at once
+    second_id = create_device(client, name="Oven")
+    post_reading(client, second_id, now, 200)
+
+def test_verified_token_cache(client):
+    token_cache.clear()
+    headers = auth_headers()
+    token = headers["Authorization"].split()[1]
+    assert client.get("/api/devices", headers=headers).status_code == 200
+    assert token_cache.get(token).id == 1
+
+    tampered = token[:-2] + ("AA" if token[-2:] != "AA" else "BB")
+    response = client.get("/api/devices", headers={"Authorization": f"Bearer {tampered}"})
+    assert response.status_code == 401
+    assert token_cache.get(tampered) is None
+
+    expired = jwt.encode(
+        {"sub": "test@example.com", "user_id": 1, "exp": datetime.utcnow() - timedelta(seconds=1)},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    response = client.get("/api/devices", headers={"Authorization": f"Bearer {expired}"})
+    assert response.status_code == 401
+
+    # Issued before tokens carried user claims
+    legacy = jwt.encode(
+        {"sub": "test@example.com", "exp": datetime.utcnow() + timedelta(hours=1)},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    response = client.get("/api/devices", headers={"Authorization": f"Bearer {legacy}"})
+    assert response.status_code == 401
+
+def test_revoked_token_refused(client):
+    def token(jti, user_id=1, version=0):
+        return jwt.encode(
+            {"sub": "test@example.com", "user_id": user_id, "ver": version, "jti": jti,
+             "exp": datetime.utcnow() + timedelta(hours=1)},
+            SECRET_KEY,
+            algorithm=ALGORITHM
+        )
+
+    logged_out, other = token("logged-out"), token("other")
+    old_version, new_version = token("a", user_id=2, version=0), token("b", user_id=2, version=1)
+    # Accepted and cached before the snapshot arrives
+    assert client.get("/api/devices", headers={"Authorization": f"Bearer {logged_out}"}).status_code == 200
+    try:
+        revocations.snapshot = RevocationSnapshot.build(["logged-out"], {2: 1})
+        for revoked in (logged_out, old_version):
+            assert client.get("/api/devices", headers={"Authorization": f"Bearer {revoked}"}).status_code == 401
+        for valid in (other, new_version):
+            assert client.get("/api/devices", headers={"Authorization": f"Bearer {valid}"}).status_code == 200
+    finally:
+        revocations.snapshot = EMPTY_SNAPSHOT
+
+def test_seed_device_day_follows_profile():
+    washer = next(p for p in PROFILES if p.device_type == "Washing Machine")
+    timestamps, watts = generate_device_day(washer, datetime(2024, 3, 1).date(), 60, day_rng(7, 2, 0))
+    assert len(timestamps) == 1440
+    assert datetime.utcfromtimestamp(timestamps[0] / 1e6) == datetime(2024, 3, 1)
+    hours = (timestamps // 3_600_000_000) % 24
+    # Used mornings and evenings, on standby (halved at night) otherwise
+    assert watts[hours == 7].min() >= 2 * (washer.base_load - washer.variance)
+    assert watts[hours == 3].max() <= 0.1 * 0.5 * (washer.base_load + washer.variance)
+    # Seeded per device-day
+    again = generate_device_day(washer, datetime(2024, 3, 1).date(), 60, day_rng(7, 2, 0))[1]
+    assert (again == watts).all()
+
+def test_seed_rollups_match_summary():
+    # 7 minutes does not divide an hour, so buckets hold uneven numbers of readings
+    timestamps, watts = generate_device_day(PROFILES[1], datetime(2024, 3, 1).date(), 420, day_rng(0, 1, 0))
+    points = [(datetime.utcfromtimestamp(t / 1e6), w) for t, w in zip(timestamps.tolist(), watts.tolist())]
+    for granularity in GRANULARITIES:
+        columns = summarize_buckets(timestamps, watts, granularity.width)
+        for i, bucket_start in enumerate(columns["bucket_start"].tolist()):
+            start = datetime.utcfromtimestamp(bucket_start / 1e6)
+            expected = Summary.from_points([p for p in points if start <= p[0] < start + granularity.width])
+            assert columns["count"][i] == expected.count
+            assert columns["energy_watt_hours"][i] == pytest.approx(expected.energy_watt_hours)
+            assert columns["sum_energy_watts"][i] == pytest.approx(expected.sum_energy_watts)
+            assert columns["max_energy_watts"][i] == expected.max_energy_watts
+            assert datetime.utcfromtimestamp(columns["last_timestamp"][i] / 1e6) == expected.last_timestamp
+
+def test_seed_binary_copy_layout():
+    data = binary_copy_data([("int4", np.array([5])), ("timestamptz", np.array([946_684_800_000_001])),
+                             ("float8", np.array([1.5]))])
+    assert data.startswith(b"PGCOPY\n\xff\r\n\x00")
+    assert struct.unpack(">hiiiqid", data[19:-2]) == (3, 4, 5, 8, 1, 8, 1.5)
+    assert data[-2:] == b"\xff\xff"